@@ -5,8 +5,14 @@ from sqlmodel import select, Session
 from src.models.cities import Cities
 from src.core.database import create_db_and_tables
 from src.routes import router
-from src.core.database import engine
-from src.core.middleware import log_middleware
+from src.core.database import engine, async_engine
+from src.core.security import shutdown_password_hashing
+from src.core.middleware import RequestLoggingMiddleware, start_request_logging, stop_request_logging
+from src.core.replicas import PrimaryPinMiddleware, replica_router
+from src.services.catalog_cache import start_catalog_cache
+from src.services.chat_hub import start_chat_hub, stop_chat_hub
+from src.services.message_writer import message_writer
+from src.services.token_revocations import revocation_sync
 
 KZ_CITIES = [
     {"en": "Almaty",      "ru": "Алматы",      "kz": "Алматы"},
@@ -31,6 +37,7 @@ KZ_CITIES = [
 async def lifespan(app: FastAPI):
     # Startup code here
     print("Starting up...")
+    start_request_logging()
     create_db_and_tables()
 
     with Session(engine) as session:
@@ -46,13 +53,28 @@ async def lifespan(app: FastAPI):
                 session.add(city_instance)
 
             session.commit()
+
+    start_catalog_cache()
+    revocation_sync.subscribe()
+    await start_chat_hub()
+    await revocation_sync.start()
+    await message_writer.start()
+    await replica_router.start()
     yield
     print("Shutting down...")
     # Shutdown code here
+    await message_writer.stop()
+    await revocation_sync.stop()
+    await stop_chat_hub()
+    await replica_router.stop()
+    await async_engine.dispose()
+    shutdown_password_hashing()
+    stop_request_logging()
 
 
 app = FastAPI(lifespan=lifespan)
-app.middleware("http")(log_middleware)
+app.add_middleware(RequestLoggingMiddleware)
+app.add_middleware(PrimaryPinMiddleware)
 
 app.include_router(router)
 
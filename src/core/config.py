@@ -14,6 +14,63 @@ class Settings(BaseSettings):
     AWS_REGION: str
     S3_BUCKET_NAME: str
 
+    DB_ECHO: bool = False
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int = 0
+
+    DB_REPLICA_HOSTS: str = ""
+    DB_REPLICA_MAX_LAG_SECONDS: float = 5.0
+    DB_REPLICA_CHECK_SECONDS: float = 2.0
+    DB_PRIMARY_PIN_SECONDS: int = 10
+
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_MAX_QUEUE: int = 64
+    PASSWORD_HASH_TIME_COST: int = 3
+    PASSWORD_HASH_MEMORY_COST: int = 65536
+    PASSWORD_HASH_PARALLELISM: int = 4
+
+    AUTH_CACHE_TTL_SECONDS: int = 30
+    AUTH_CACHE_MAX_ENTRIES: int = 10000
+    JWT_CACHE_MAX_ENTRIES: int = 50000
+    JWT_REVOCATION_RELOAD_SECONDS: int = 60
+    JWT_REVOCATION_MAX_ENTRIES: int = 100000
+
+    CHAT_BROKER: str = "memory"
+    CHAT_SEND_QUEUE_SIZE: int = 256
+    CHAT_SLOW_CONSUMER_POLICY: str = "drop"
+    CHAT_WRITE_BATCH_SIZE: int = 500
+    CHAT_WRITE_MAX_DELAY_MS: int = 5
+    CHAT_WRITE_QUEUE_SIZE: int = 10000
+
+    STOCK_SHARD_COUNT: int = 8
+    ORDER_STATS_SHARD_COUNT: int = 8
+
+    BULK_ORDER_MAX_ROWS: int = 10000
+    BULK_ORDER_BATCH_SIZE: int = 50
+    BULK_PRODUCT_MAX_ROWS: int = 100000
+    BULK_PRODUCT_BATCH_SIZE: int = 1000
+    PRODUCT_BATCH_MAX_IDS: int = 500
+
+    STREAM_YIELD_PER: int = 1000
+
+    CATALOG_CACHE_MAX_ENTRIES: int = 500
+    CATALOG_VERSION_TTL_SECONDS: int = 60
+
+    EXPORT_CHUNK_ROWS: int = 20000
+    EXPORT_POLL_SECONDS: float = 2.0
+    EXPORT_STALE_SECONDS: int = 300
+    EXPORT_URL_EXPIRES_SECONDS: int = 3600
+
+    LOG_BODY_SAMPLE_RATE: float = 0.0
+    LOG_BODY_MAX_BYTES: int = 2048
+    LOG_REDACT_FIELDS: str = "password,hashed_password,access_token,refresh_token,token"
+
+    METRICS_TOKEN: str = ""
+
     class Config:
         env_file = ".env"
 
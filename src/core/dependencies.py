@@ -0,0 +1,59 @@
+from dataclasses import dataclass
+
+from fastapi import Depends, HTTPException
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.core.cache import user_cache, company_cache
+from src.core.database import get_async_session
+from src.core.security import check_access_token
+from src.cruds.company import get_company_by_id
+from src.cruds.user import get_user_by_email, get_user_by_id
+from src.models.companies import Companies
+from src.models.users import Users
+
+
+@dataclass(frozen=True)
+class CurrentUser:
+    user: Users
+    company: Companies
+
+
+async def resolve_current_user(session: AsyncSession, claims: dict) -> CurrentUser:
+    """
+    Resolve the user and company behind decoded access token claims.
+    Tokens carry user_id, so warm requests are served from the in-process
+    cache without a query; older tokens only have the email in `sub`.
+    """
+    user_id = claims.get("user_id")
+    user = user_cache.get(user_id) if user_id is not None else None
+
+    if user is None:
+        if user_id is not None:
+            user = await get_user_by_id(session, user_id)
+        else:
+            user = await get_user_by_email(session, claims.get("sub"))
+
+        if not user:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        # Cached rows are shared between requests, keep them out of any session
+        session.expunge(user)
+        user_cache.set(user.user_id, user)
+
+    company = company_cache.get(user.company_id)
+
+    if company is None:
+        company = await get_company_by_id(session, user.company_id)
+
+        if not company:
+            raise HTTPException(status_code=404, detail="Company not found")
+
+        session.expunge(company)
+        company_cache.set(company.company_id, company)
+
+    return CurrentUser(user=user, company=company)
+
+
+async def get_current_user(claims: dict = Depends(check_access_token), session: AsyncSession = Depends(get_async_session)) -> CurrentUser:
+    return await resolve_current_user(session, claims)
+
@@ -1,9 +1,26 @@
+import hashlib
+import time
 import jwt
 from datetime import datetime, timedelta, timezone
 from typing import Optional
 
+from src.core.cache import TTLCache
 from src.core.config import settings
 
+# Verified claims keyed by token digest, each entry lives until the token's exp
+decoded_token_cache = TTLCache(maxsize=settings.JWT_CACHE_MAX_ENTRIES, ttl=0)
+
+# Refresh tokens are the longest-lived tokens issued
+REFRESH_TOKEN_LIFETIME = timedelta(days=7)
+
+# Denylist: individual tokens by digest (until their exp) and whole users
+# (suspended). Filled from the database and kept current across workers by
+# src.services.token_revocations. Tokens are held to JWT_REVOCATION_MAX_ENTRIES;
+# only a revoked token nearest to expiring is dropped to make room.
+_revoked_tokens: dict[bytes, float] = {}
+_revoked_user_ids: set[int] = set()
+_revoked_subjects: set[str] = set()
+
 def create_token(data: dict, expires_delta: Optional[timedelta] = None, refresh: Optional[bool] = False) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -11,7 +28,7 @@ def create_token(data: dict, expires_delta: Optional[timedelta] = None, refresh:
     else:
         expire = datetime.now(timezone.utc) + timedelta(minutes=15)
     to_encode.update({"exp": expire})
-    
+
     if refresh:
         to_encode.update({"type": "refresh"})
     else:
@@ -20,19 +37,71 @@ def create_token(data: dict, expires_delta: Optional[timedelta] = None, refresh:
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def decode_token(token: str, refresh: Optional[bool] = False) -> dict:
-    try:
-        decoded_jwt = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        email: str = decoded_jwt.get("sub")
-        if email is None:
-            raise ValueError("Invalid token: missing subject")
-        if refresh and decoded_jwt.get("type") != "refresh":
-            raise ValueError("Invalid token: not a refresh token")
-        if not refresh and decoded_jwt.get("type") != "access":
-            raise ValueError("Invalid token: not an access token")
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
 
+def _verify_token(token: str, digest: bytes) -> dict:
+    decoded_jwt = decoded_token_cache.get(digest)
+    if decoded_jwt is not None:
         return decoded_jwt
+
+    try:
+        decoded_jwt = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
     except jwt.ExpiredSignatureError:
         raise Exception("Token has expired")
     except jwt.InvalidTokenError:
         raise Exception("Invalid token")
+
+    remaining = decoded_jwt.get("exp", 0) - time.time()
+    if remaining > 0:
+        decoded_token_cache.set(digest, decoded_jwt, ttl=remaining)
+
+    return decoded_jwt
+
+def decode_token(token: str, refresh: Optional[bool] = False) -> dict:
+    digest = token_digest(token)
+    if _revoked_tokens.get(digest, 0) > time.time():
+        raise Exception("Token has been revoked")
+
+    decoded_jwt = dict(_verify_token(token, digest))
+
+    email: str = decoded_jwt.get("sub")
+    if email is None:
+        raise ValueError("Invalid token: missing subject")
+    if email in _revoked_subjects or decoded_jwt.get("user_id") in _revoked_user_ids:
+        raise Exception("Token has been revoked")
+    if refresh and decoded_jwt.get("type") != "refresh":
+        raise ValueError("Invalid token: not a refresh token")
+    if not refresh and decoded_jwt.get("type") != "access":
+        raise ValueError("Invalid token: not an access token")
+
+    return decoded_jwt
+
+def deny_token(digest: bytes, expires_at: float) -> None:
+    """Reject the token with this digest in this worker until expires_at"""
+    decoded_token_cache.pop(digest)
+    if digest not in _revoked_tokens and len(_revoked_tokens) >= settings.JWT_REVOCATION_MAX_ENTRIES:
+        prune_denied_tokens()
+        if len(_revoked_tokens) >= settings.JWT_REVOCATION_MAX_ENTRIES:
+            del _revoked_tokens[min(_revoked_tokens, key=_revoked_tokens.get)]
+    if expires_at > _revoked_tokens.get(digest, 0):
+        _revoked_tokens[digest] = expires_at
+
+def deny_user(user_id: int, email: str | None = None) -> None:
+    """Reject every token issued to a user in this worker"""
+    _revoked_user_ids.add(user_id)
+    if email:
+        _revoked_subjects.add(email)
+
+def prune_denied_tokens() -> None:
+    """Forget revoked tokens that have expired anyway"""
+    now = time.time()
+    for digest in [digest for digest, expires_at in _revoked_tokens.items() if expires_at <= now]:
+        del _revoked_tokens[digest]
+
+def get_token_cache_stats() -> dict:
+    return {
+        **decoded_token_cache.stats(),
+        "revoked_tokens": len(_revoked_tokens),
+        "revoked_users": len(_revoked_user_ids),
+    }
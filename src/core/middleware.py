@@ -1,45 +1,108 @@
-from fastapi import Request, Response
-
-async def log_middleware(request: Request, call_next):
-    print(f"\n{'='*20} START REQUEST {'='*20}")
-    print(f"METHOD: {request.method}")
-    print(f"URL: {request.url}")
-    
-    # Read and log request body
-    try:
-        body = await request.body()
-        if body:
-            print(f"BODY: {body.decode()}")
-    except Exception as e:
-        print(f"Could not read body: {e}")
-        body = b""
-
-    # Restore request body for the actual handler
-    async def receive():
-        return {"type": "http.request", "body": body}
-    request._receive = receive
-
-    response = await call_next(request)
-
-    print(f"{'-'*20} RESPONSE {'-'*20}")
-    print(f"STATUS: {response.status_code}")
-
-    # Read and log response body
-    res_body = b""
-    async for chunk in response.body_iterator:
-        res_body += chunk
-    
-    try:
-        print(f"BODY: {res_body.decode()}")
-    except Exception as e:
-        print(f"Could not read response body: {e}")
-
-    print(f"{'='*20} END REQUEST {'='*20}\n")
-
-    # Reconstruct response
-    return Response(
-        content=res_body,
-        status_code=response.status_code,
-        headers=dict(response.headers),
-        media_type=response.media_type
-    )
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import re
+import time
+
+from src.core.config import settings
+
+logger = logging.getLogger("scp.requests")
+
+_listener: logging.handlers.QueueListener | None = None
+
+
+def start_request_logging():
+    """Route request log records through a queue so handlers never write on the event loop"""
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(logging.Formatter("%(message)s"))
+
+    logger.addHandler(logging.handlers.QueueHandler(log_queue))
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+    _listener.start()
+
+
+def stop_request_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def _redact(body: bytes) -> str:
+    text = body[:settings.LOG_BODY_MAX_BYTES].decode("utf-8", errors="replace")
+    for field in settings.LOG_REDACT_FIELDS.split(","):
+        field = field.strip()
+        if field:
+            # The sample may be cut inside the value, so a value also runs to
+            # the end of the text; escaped quotes don't end it
+            text = re.sub(rf'("{re.escape(field)}"\s*:\s*)"(?:[^"\\]|\\.)*(?:"|\\?$)', r'\1"***"', text)
+    return text
+
+
+class RequestLoggingMiddleware:
+    """
+    Emits one JSON log line per HTTP request with method, path, status,
+    duration and body sizes. Bodies are streamed through untouched; only
+    when a request is sampled (LOG_BODY_SAMPLE_RATE) is a bounded, redacted
+    prefix of each body kept for the log line.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        sample_body = settings.LOG_BODY_SAMPLE_RATE > 0 and random.random() < settings.LOG_BODY_SAMPLE_RATE
+        state = {"status": None, "request_bytes": 0, "response_bytes": 0}
+        request_sample = bytearray()
+        response_sample = bytearray()
+
+        async def receive_wrapper():
+            message = await receive()
+            if message["type"] == "http.request":
+                chunk = message.get("body", b"")
+                state["request_bytes"] += len(chunk)
+                if sample_body and len(request_sample) < settings.LOG_BODY_MAX_BYTES:
+                    request_sample.extend(chunk[:settings.LOG_BODY_MAX_BYTES - len(request_sample)])
+            return message
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                state["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                state["response_bytes"] += len(chunk)
+                if sample_body and len(response_sample) < settings.LOG_BODY_MAX_BYTES:
+                    response_sample.extend(chunk[:settings.LOG_BODY_MAX_BYTES - len(response_sample)])
+            await send(message)
+
+        try:
+            await self.app(scope, receive_wrapper, send_wrapper)
+        finally:
+            record = {
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": state["status"] or 500,
+                "duration_ms": round((time.perf_counter() - started) * 1000, 2),
+                "request_bytes": state["request_bytes"],
+                "response_bytes": state["response_bytes"],
+            }
+            if sample_body:
+                record["request_body"] = _redact(bytes(request_sample))
+                record["response_body"] = _redact(bytes(response_sample))
+
+            logger.info(json.dumps(record, ensure_ascii=False))
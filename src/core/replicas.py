@@ -0,0 +1,191 @@
+import asyncio
+import logging
+import random
+import time
+
+from fastapi import Request
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.core.config import settings
+from src.core.database import async_session_maker, create_replica_engine, get_pool_stats
+
+logger = logging.getLogger("scp.replicas")
+
+# Clients send this header to read from the primary; responses to writes set
+# the cookie so the same client reads its own writes for a while
+PRIMARY_HEADER = "x-read-primary"
+PRIMARY_COOKIE = "read_primary_until"
+
+# Seconds the replica is behind the primary; 0 when it has replayed all WAL
+# it received, so an idle primary doesn't look like lag. NULL when it is not
+# streaming from the primary, since it may then have replayed everything it
+# got long ago. (Without pg_read_all_stats only the receiver's pid is
+# visible, which still tells whether one is running.)
+_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN NOT EXISTS (
+            SELECT 1 FROM pg_stat_wal_receiver WHERE COALESCE(status, 'streaming') = 'streaming'
+        ) THEN NULL
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+
+
+class Replica:
+    def __init__(self, host: str):
+        self.host = host
+        self.engine = create_replica_engine(host)
+        self.session_maker = async_sessionmaker(self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.lag: float | None = None
+        self.checked_at = 0.0
+
+    def usable(self, now: float) -> bool:
+        # A check that is overdue means the replica (or the checker) is stuck
+        fresh = now - self.checked_at <= settings.DB_REPLICA_CHECK_SECONDS * 3
+        return fresh and self.lag is not None and self.lag <= settings.DB_REPLICA_MAX_LAG_SECONDS
+
+
+class ReplicaRouter:
+    """
+    Picks the engine read-only requests are served from. Replication lag of
+    every replica in DB_REPLICA_HOSTS is measured every
+    DB_REPLICA_CHECK_SECONDS; reads go to a random replica that is less than
+    DB_REPLICA_MAX_LAG_SECONDS behind, and to the primary when none is (or
+    no replicas are configured, or the check hasn't run yet).
+    """
+
+    def __init__(self, hosts: str):
+        self.replicas = [Replica(host.strip()) for host in hosts.split(",") if host.strip()]
+        self._task: asyncio.Task | None = None
+        self.primary_reads = 0
+        self.replica_reads = 0
+
+    async def start(self):
+        if self.replicas and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    async def _run(self):
+        while True:
+            await asyncio.gather(*(self._check(replica) for replica in self.replicas))
+            await asyncio.sleep(settings.DB_REPLICA_CHECK_SECONDS)
+
+    @staticmethod
+    async def _lag(replica: Replica) -> float | None:
+        async with replica.engine.connect() as conn:
+            lag = (await conn.execute(_LAG_QUERY)).scalar()
+        return None if lag is None else float(lag)
+
+    async def _check(self, replica: Replica):
+        try:
+            lag = await asyncio.wait_for(self._lag(replica), settings.DB_REPLICA_CHECK_SECONDS)
+        except Exception as e:
+            if replica.lag is not None:
+                logger.warning("Replica %s is unreachable, reading from the primary: %s", replica.host, e)
+            lag = None
+        else:
+            if lag is None:
+                if replica.lag is not None:
+                    logger.warning("Replica %s is not streaming from the primary, reading from the primary", replica.host)
+            elif lag > settings.DB_REPLICA_MAX_LAG_SECONDS:
+                logger.warning("Replica %s is %.1fs behind, reading from the primary", replica.host, lag)
+        replica.lag = lag
+        replica.checked_at = time.monotonic()
+
+    def pick(self) -> Replica | None:
+        now = time.monotonic()
+        usable = [replica for replica in self.replicas if replica.usable(now)]
+        return random.choice(usable) if usable else None
+
+    def session_maker(self, primary: bool = False) -> async_sessionmaker:
+        replica = None if primary else self.pick()
+        if replica is None:
+            self.primary_reads += 1
+            return async_session_maker
+        self.replica_reads += 1
+        return replica.session_maker
+
+    def stats(self) -> dict:
+        return {
+            "primary_reads": self.primary_reads,
+            "replica_reads": self.replica_reads,
+            "replicas": [
+                {
+                    "host": replica.host,
+                    "lag_seconds": replica.lag,
+                    "usable": replica.usable(time.monotonic()),
+                    "pool": get_pool_stats(replica.engine.pool),
+                }
+                for replica in self.replicas
+            ],
+        }
+
+
+replica_router = ReplicaRouter(settings.DB_REPLICA_HOSTS)
+
+
+def pinned_to_primary(request: Request) -> bool:
+    if request.headers.get(PRIMARY_HEADER, "").lower() in ("1", "true", "yes"):
+        return True
+    try:
+        return float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def read_session_maker(request: Request) -> async_sessionmaker:
+    """Session maker for a read-only request: a healthy replica, or the primary when pinned"""
+    return replica_router.session_maker(primary=pinned_to_primary(request))
+
+
+async def get_read_session(request: Request):
+    """
+    Session for endpoints that only read. Their data may be up to
+    DB_REPLICA_MAX_LAG_SECONDS old, unless the request is pinned to the
+    primary. Anything that writes, or must see a write made earlier in the
+    same request, uses get_async_session.
+    """
+    async with read_session_maker(request)() as session:
+        yield session
+
+
+class PrimaryPinMiddleware:
+    """
+    Pins a client's reads to the primary for DB_PRIMARY_PIN_SECONDS after
+    each successful write it makes (any non-GET request), through a cookie,
+    so it reads its own writes even when the replicas lag. Clients that
+    don't keep cookies can send the X-Read-Primary: 1 header instead.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] in ("GET", "HEAD", "OPTIONS") or not replica_router.replicas:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_pin(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                cookie = (
+                    f"{PRIMARY_COOKIE}={time.time() + settings.DB_PRIMARY_PIN_SECONDS:.0f}; "
+                    f"Max-Age={settings.DB_PRIMARY_PIN_SECONDS}; Path=/; HttpOnly; SameSite=Lax"
+                )
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", cookie.encode())]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
@@ -1,16 +1,53 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
 from fastapi import Depends, HTTPException
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from src.core.config import settings
 from src.core.jwt import decode_token
 
 from pwdlib  import PasswordHash
+from pwdlib.hashers.argon2 import Argon2Hasher
+
+# Changing these parameters makes existing hashes get upgraded on next login
+password_hash = PasswordHash((
+    Argon2Hasher(
+        time_cost=settings.PASSWORD_HASH_TIME_COST,
+        memory_cost=settings.PASSWORD_HASH_MEMORY_COST,
+        parallelism=settings.PASSWORD_HASH_PARALLELISM,
+    ),
+))
+
+# argon2 takes tens of milliseconds per call, so it runs off the event loop
+# on a small dedicated pool. Callers beyond the queue limit are rejected
+# instead of piling up behind a login storm.
+_hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_hash_jobs_pending = 0
+
+async def _run_hash_job(func, *args):
+    global _hash_jobs_pending
+
+    if _hash_jobs_pending >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE:
+        raise HTTPException(status_code=503, detail="Too many concurrent password operations, try again later")
+
+    _hash_jobs_pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _hash_jobs_pending -= 1
+
+async def hash_password(password: str) -> str:
+    return await _run_hash_job(password_hash.hash, password)
 
-password_hash = PasswordHash.recommended()
+async def verify_password(password: str, hashed_password: str) -> bool:
+    return await _run_hash_job(password_hash.verify, password, hashed_password)
 
-def hash_password(password: str) -> str:
-    return password_hash.hash(password)
+async def verify_and_update_password(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    """Verify a password and return a fresh hash if the stored one uses outdated parameters"""
+    return await _run_hash_job(password_hash.verify_and_update, password, hashed_password)
 
-def verify_password(password: str, hashed_password: str) -> bool:
-    return password_hash.verify(password, hashed_password)
+def shutdown_password_hashing():
+    _hash_executor.shutdown(wait=False, cancel_futures=True)
 
 security = HTTPBearer()
 
@@ -0,0 +1,43 @@
+import json
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.core.config import settings
+from src.core.database import async_session_maker
+
+NDJSON = "application/x-ndjson"
+
+
+def wants_stream(request: Request, stream: bool = False) -> bool:
+    """Streaming is asked for with ?stream=true or Accept: application/x-ndjson"""
+    return stream or NDJSON in request.headers.get("accept", "")
+
+
+def ndjson_response(statement, scalars: bool = True, session_maker: async_sessionmaker = async_session_maker) -> StreamingResponse:
+    """
+    Stream the results of statement as NDJSON, one object per line.
+
+    Rows are read from a server-side cursor STREAM_YIELD_PER at a time and
+    each batch is encoded and sent before the next one is fetched, so memory
+    stays flat however many rows match. The query runs in its own session:
+    the request's session is closed once the endpoint returns, while the
+    body is still being sent; pass read_session_maker(request) as
+    session_maker to run it on a replica. Use scalars=False for
+    multi-column selects; each row is then sent as an object keyed by
+    column label.
+    """
+    async def lines():
+        async with session_maker() as session:
+            streamed = statement.execution_options(yield_per=settings.STREAM_YIELD_PER)
+            if scalars:
+                result = await session.stream_scalars(streamed)
+            else:
+                result = (await session.stream(streamed)).mappings()
+
+            async for batch in result.partitions():
+                yield "".join(json.dumps(jsonable_encoder(item)) + "\n" for item in batch)
+
+    return StreamingResponse(lines(), media_type=NDJSON)
@@ -1,34 +1,51 @@
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 from src.models.users import Users
 from src.models.companies import Companies
 from src.schemas.authentication import UserCompanySchema
-from src.core.security import hash_password, verify_password
+from src.core.cache import user_cache
+from src.core.security import hash_password, verify_and_update_password
 from src.cruds.user import get_user_by_email
 
-def create_company_with_owner(session: Session, data: UserCompanySchema) -> Users:
+async def create_company_with_owner(session: AsyncSession, data: UserCompanySchema) -> Users:
     company_data = data.company
     owner_data = data.user
 
+    # Hash before writing anything: the hash can wait behind other password
+    # jobs, and no transaction should hold locks meanwhile
+    hashed_password = await hash_password(owner_data.password)
+
     # Create company instance
     company = Companies(**company_data.model_dump())
     session.add(company)
-    session.flush()
+    await session.flush()
 
     # Create owner user instance linked to the company
     owner_user = Users(company_id=company.company_id, 
                        **owner_data.model_dump(exclude={'password'}),
-                       hashed_password=hash_password(owner_data.password))
+                       hashed_password=hashed_password)
     session.add(owner_user)
-    session.commit()
-    session.refresh(owner_user)
+    await session.commit()
+    await session.refresh(owner_user)
 
     return owner_user
 
 
-def authenticate_user(session: Session, email: str, password: str) -> Users | None:
-    user = get_user_by_email(session, email)
-    if user and verify_password(password, user.hashed_password):
-        return user
-    return None
+async def authenticate_user(session: AsyncSession, email: str, password: str) -> Users | None:
+    user = await get_user_by_email(session, email)
+    if not user:
+        return None
+
+    valid, updated_hash = await verify_and_update_password(password, user.hashed_password)
+    if not valid:
+        return None
+
+    # Hash parameters changed since this password was stored, upgrade it transparently
+    if updated_hash:
+        user.hashed_password = updated_hash
+        session.add(user)
+        await session.commit()
+        user_cache.pop(user.user_id)
+
+    return user
 
 
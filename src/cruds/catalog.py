@@ -0,0 +1,58 @@
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.models.catalog import CatalogVersions
+from src.models.products import Products
+
+
+async def bump_catalog_version(session: AsyncSession, company_id: int) -> int:
+    """
+    Move a company's catalog to a new version in the caller's transaction
+    and return it. The new version is remembered on the session and
+    announced to every worker once the transaction commits (see
+    src.services.catalog_cache).
+    """
+    version = (await session.exec(
+        insert(CatalogVersions)
+        .values(company_id=company_id, version=1)
+        .on_conflict_do_update(
+            index_elements=["company_id"],
+            set_={"version": CatalogVersions.version + 1, "updated_at": func.now()},
+        )
+        .returning(CatalogVersions.version)
+    )).scalar_one()
+
+    session.info.setdefault("catalog_versions", {})[company_id] = version
+    return version
+
+
+async def get_catalog_version(session: AsyncSession, company_id: int) -> int:
+    version = (await session.exec(
+        select(CatalogVersions.version).where(CatalogVersions.company_id == company_id)
+    )).first()
+    return version or 0
+
+
+async def get_product_with_catalog_version(session: AsyncSession, product_id: int) -> tuple[Products, int] | None:
+    """A product and its company's catalog version, read in one statement so they belong together"""
+    row = (await session.exec(
+        select(Products, CatalogVersions.version)
+        .outerjoin(CatalogVersions, CatalogVersions.company_id == Products.company_id)
+        .where(Products.product_id == product_id)
+    )).first()
+    if row is None:
+        return None
+    product, version = row
+    return product, version or 0
+
+
+async def get_products_with_catalog_versions(session: AsyncSession, product_ids) -> list[tuple[Products, int]]:
+    """get_product_with_catalog_version for several products, in one statement"""
+    rows = (await session.exec(
+        select(Products, CatalogVersions.version)
+        .outerjoin(CatalogVersions, CatalogVersions.company_id == Products.company_id)
+        .where(Products.product_id.in_(product_ids))
+    )).all()
+    return [(product, version or 0) for product, version in rows]
@@ -1,4 +1,5 @@
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime
 
 from src.models.chats import Chats
@@ -8,10 +9,10 @@ from src.models.orders import Orders
 from src.models.users import Users, UserRole
 
 
-def get_or_create_chat_for_linking(session: Session, linking_id: int) -> Chats:
-    chat = session.exec(
+async def get_or_create_chat_for_linking(session: AsyncSession, linking_id: int) -> Chats:
+    chat = (await session.exec(
         select(Chats).where(Chats.linking_id == linking_id, Chats.order_id.is_(None))
-    ).first()
+    )).first()
     
     if not chat:
         chat = Chats(
@@ -19,22 +20,29 @@ def get_or_create_chat_for_linking(session: Session, linking_id: int) -> Chats:
             order_id=None
         )
         session.add(chat)
-        session.commit()
-        session.refresh(chat)
+        await session.commit()
+        await session.refresh(chat)
     
     return chat
 
 
-def get_chat_for_order(session: Session, order_id: int) -> Chats | None:
+async def get_chat_for_linking(session: AsyncSession, linking_id: int) -> Chats | None:
+    """Get the general (non-order) chat of a linking, without creating it"""
+    return (await session.exec(
+        select(Chats).where(Chats.linking_id == linking_id, Chats.order_id.is_(None))
+    )).first()
+
+
+async def get_chat_for_order(session: AsyncSession, order_id: int) -> Chats | None:
     """Get the chat for a specific order"""
-    chat = session.exec(
+    chat = (await session.exec(
         select(Chats).where(Chats.order_id == order_id)
-    ).first()
+    )).first()
     return chat
 
 
-def create_message(
-    session: Session,
+async def create_message(
+    session: AsyncSession,
     chat_id: int,
     sender_id: int,
     body: str,
@@ -47,24 +55,41 @@ def create_message(
         body=body
     )
     session.add(message)
-    session.commit()
-    session.refresh(message)
+    await session.commit()
+    await session.refresh(message)
     return message
 
 
-def get_messages_for_chat(session: Session, chat_id: int, limit: int = 100, offset: int = 0):
-    statement = (
-        select(Messages)
-        .where(Messages.chat_id == chat_id)
-        .order_by(Messages.sent_at.desc())
-        .limit(limit)
-        .offset(offset)
-    )
-    return session.exec(statement).all()
-
-
-def check_user_can_chat(session: Session, user_id: int, linking_id: int) -> bool:
-    linking = session.get(Linkings, linking_id)
+async def get_messages_for_chat(
+    session: AsyncSession,
+    chat_id: int,
+    limit: int = 100,
+    offset: int = 0,
+    before_id: int | None = None,
+    after_id: int | None = None
+):
+    """
+    Newest-first page of a chat's messages. before_id/after_id page by
+    message_id over the (chat_id, message_id) index, so a page costs the same
+    however far back it is; offset is only applied when no cursor is given.
+    """
+    statement = select(Messages).where(Messages.chat_id == chat_id)
+
+    if after_id is not None:
+        statement = statement.where(Messages.message_id > after_id).order_by(Messages.message_id.asc()).limit(limit)
+        return list(reversed((await session.exec(statement)).all()))
+
+    if before_id is not None:
+        statement = statement.where(Messages.message_id < before_id)
+    elif offset:
+        statement = statement.offset(offset)
+
+    statement = statement.order_by(Messages.message_id.desc()).limit(limit)
+    return (await session.exec(statement)).all()
+
+
+async def check_user_can_chat(session: AsyncSession, user_id: int, linking_id: int) -> bool:
+    linking = await session.get(Linkings, linking_id)
     if not linking:
         return False
 
@@ -80,17 +105,17 @@ def check_user_can_chat(session: Session, user_id: int, linking_id: int) -> bool
     return False
 
 
-def check_user_can_access_order_chat(session: Session, user_id: int, order_id: int) -> bool:
+async def check_user_can_access_order_chat(session: AsyncSession, user_id: int, order_id: int) -> bool:
     """Check if user can access order chat"""
-    order = session.get(Orders, order_id)
+    order = await session.get(Orders, order_id)
     if not order:
         return False
     
-    linking = session.get(Linkings, order.linking_id)
+    linking = await session.get(Linkings, order.linking_id)
     if not linking:
         return False
     
-    user = session.get(Users, user_id)
+    user = await session.get(Users, user_id)
     if not user:
         return False
     
@@ -110,8 +135,8 @@ def check_user_can_access_order_chat(session: Session, user_id: int, order_id: i
     return False
 
 
-def create_system_message(
-    session: Session,
+async def create_system_message(
+    session: AsyncSession,
     order_id: int,
     user_id: int,
     message_type: MessageType,
@@ -121,7 +146,7 @@ def create_system_message(
     import json
     
     # Get the chat for this order
-    chat = get_chat_for_order(session, order_id)
+    chat = await get_chat_for_order(session, order_id)
     if not chat:
         # If chat doesn't exist (shouldn't happen for orders), try to create/get it
         # But get_chat_for_order doesn't create. 
@@ -135,6 +160,6 @@ def create_system_message(
         body=json.dumps(body_data)
     )
     session.add(message)
-    session.commit()
-    session.refresh(message)
+    await session.commit()
+    await session.refresh(message)
     return message
@@ -1,6 +1,7 @@
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from src.models.cities import Cities
 from typing import List
 
-def get_all_cities(session: Session) -> List[Cities] | None:
-    return session.exec(select(Cities)).all()
+async def get_all_cities(session: AsyncSession) -> List[Cities] | None:
+    return (await session.exec(select(Cities))).all()
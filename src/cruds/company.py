@@ -1,15 +1,17 @@
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.core.cache import company_cache
 from src.models.companies import Companies
 from src.schemas.company import UpdateCompany
 
-def get_company_by_id(session: Session, id: int) -> Companies | None:
-    return session.exec(select(Companies).where(Companies.company_id == id)).first()
+async def get_company_by_id(session: AsyncSession, id: int) -> Companies | None:
+    return (await session.exec(select(Companies).where(Companies.company_id == id))).first()
 
-def get_all_companies(session: Session): 
-    return session.exec(select(Companies).where(Companies.company_type == "supplier")).all()
+async def get_all_companies(session: AsyncSession): 
+    return (await session.exec(select(Companies).where(Companies.company_type == "supplier"))).all()
 
-def update_company(session: Session, company_id: int, update_data: UpdateCompany) -> Companies | None:
-    company = get_company_by_id(session, company_id)
+async def update_company(session: AsyncSession, company_id: int, update_data: UpdateCompany) -> Companies | None:
+    company = await get_company_by_id(session, company_id)
     
     if not company:
         return None
@@ -20,7 +22,8 @@ def update_company(session: Session, company_id: int, update_data: UpdateCompany
         setattr(company, key, value)
     
     session.add(company)
-    session.commit()
-    session.refresh(company)
+    await session.commit()
+    await session.refresh(company)
+    company_cache.pop(company_id)
     
     return company
\ No newline at end of file
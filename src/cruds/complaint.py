@@ -1,16 +1,18 @@
-from sqlmodel import Session, select
-from datetime import datetime
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import datetime, timezone
 
 from src.models.complaints import Complaints, ComplaintStatus
 from src.models.complaint_history import ComplaintHistory
 from src.models.orders import Orders, OrderStatus
+from src.cruds.order import apply_order_status
 from src.models.linkings import Linkings
 from src.models.users import Users, UserRole
 from src.schemas.complaint import CreateComplaint
 
 
-def create_complaint(
-    session: Session,
+async def create_complaint(
+    session: AsyncSession,
     order_id: int,
     consumer_staff_id: int,
     complaint_data: CreateComplaint
@@ -20,12 +22,12 @@ def create_complaint(
     from src.models.messages import MessageType
 
     # Get the order to find the assigned salesman
-    order = session.get(Orders, order_id)
+    order = await session.get(Orders, order_id)
     if not order:
         raise ValueError("Order not found")
     
     # Get the linking to find assigned salesman
-    linking = session.get(Linkings, order.linking_id)
+    linking = await session.get(Linkings, order.linking_id)
     if not linking or not linking.assigned_salesman_user_id:
         raise ValueError("No salesman assigned to this linking")
     
@@ -35,12 +37,12 @@ def create_complaint(
         assigned_to_salesman_id=linking.assigned_salesman_user_id,
         status=ComplaintStatus.open,
         description=complaint_data.description,
-        created_at=str(datetime.now()),
-        updated_at=str(datetime.now())
+        created_at=datetime.now(timezone.utc),
+        updated_at=datetime.now(timezone.utc)
     )
     session.add(complaint)
-    session.commit()
-    session.refresh(complaint)
+    await session.commit()
+    await session.refresh(complaint)
     
     # Create initial history entry
     history = ComplaintHistory(
@@ -48,13 +50,13 @@ def create_complaint(
         changed_by_user_id=consumer_staff_id,
         new_status=ComplaintStatus.open,
         notes="Complaint created",
-        updated_at=str(datetime.now())
+        updated_at=datetime.now(timezone.utc)
     )
     session.add(history)
-    session.commit()
+    await session.commit()
     
     # Create system message
-    message = create_system_message(
+    message = await create_system_message(
         session,
         order_id,
         consumer_staff_id,
@@ -71,8 +73,8 @@ def create_complaint(
     return complaint, message
 
 
-def escalate_complaint(
-    session: Session,
+async def escalate_complaint(
+    session: AsyncSession,
     complaint_id: int,
     salesman_id: int,
     notes: str | None = None
@@ -81,7 +83,7 @@ def escalate_complaint(
     from src.cruds.chat import create_system_message
     from src.models.messages import MessageType
 
-    complaint = session.get(Complaints, complaint_id)
+    complaint = await session.get(Complaints, complaint_id)
     if not complaint:
         raise ValueError("Complaint not found")
     
@@ -90,7 +92,7 @@ def escalate_complaint(
     
     old_status = complaint.status
     complaint.status = ComplaintStatus.escalated
-    complaint.updated_at = str(datetime.now())
+    complaint.updated_at = datetime.now(timezone.utc)
     session.add(complaint)
     
     # Add history entry
@@ -99,14 +101,14 @@ def escalate_complaint(
         changed_by_user_id=salesman_id,
         new_status=ComplaintStatus.escalated,
         notes=notes or "Escalated to manager",
-        updated_at=str(datetime.now())
+        updated_at=datetime.now(timezone.utc)
     )
     session.add(history)
-    session.commit()
-    session.refresh(complaint)
+    await session.commit()
+    await session.refresh(complaint)
     
     # Create system message
-    message = create_system_message(
+    message = await create_system_message(
         session,
         complaint.order_id,
         salesman_id,
@@ -123,8 +125,8 @@ def escalate_complaint(
     return complaint, message
 
 
-def claim_complaint(
-    session: Session,
+async def claim_complaint(
+    session: AsyncSession,
     complaint_id: int,
     manager_id: int
 ):
@@ -132,7 +134,7 @@ def claim_complaint(
     from src.cruds.chat import create_system_message
     from src.models.messages import MessageType
 
-    complaint = session.get(Complaints, complaint_id)
+    complaint = await session.get(Complaints, complaint_id)
     if not complaint:
         raise ValueError("Complaint not found")
     
@@ -145,7 +147,7 @@ def claim_complaint(
     old_status = complaint.status
     complaint.status = ComplaintStatus.in_progress
     complaint.escalated_to_manager_id = manager_id
-    complaint.updated_at = str(datetime.now())
+    complaint.updated_at = datetime.now(timezone.utc)
     session.add(complaint)
     
     # Add history entry
@@ -154,14 +156,14 @@ def claim_complaint(
         changed_by_user_id=manager_id,
         new_status=ComplaintStatus.in_progress,
         notes="Manager claimed complaint",
-        updated_at=str(datetime.now())
+        updated_at=datetime.now(timezone.utc)
     )
     session.add(history)
-    session.commit()
-    session.refresh(complaint)
+    await session.commit()
+    await session.refresh(complaint)
     
     # Create system message
-    message = create_system_message(
+    message = await create_system_message(
         session,
         complaint.order_id,
         manager_id,
@@ -178,8 +180,8 @@ def claim_complaint(
     return complaint, message
 
 
-def resolve_complaint(
-    session: Session,
+async def resolve_complaint(
+    session: AsyncSession,
     complaint_id: int,
     user_id: int,
     resolution_notes: str,
@@ -189,7 +191,7 @@ def resolve_complaint(
     from src.cruds.chat import create_system_message
     from src.models.messages import MessageType
 
-    complaint = session.get(Complaints, complaint_id)
+    complaint = await session.get(Complaints, complaint_id)
     if not complaint:
         raise ValueError("Complaint not found")
     
@@ -199,16 +201,14 @@ def resolve_complaint(
     old_status = complaint.status
     complaint.status = ComplaintStatus.resolved
     complaint.resolution_notes = resolution_notes
-    complaint.updated_at = str(datetime.now())
+    complaint.updated_at = datetime.now(timezone.utc)
     session.add(complaint)
     
     # If manager wants to cancel the order
     if cancel_order:
-        order = session.get(Orders, complaint.order_id)
+        order = await session.get(Orders, complaint.order_id)
         if order:
-            order.status = OrderStatus.rejected
-            order.updated_at = str(datetime.now())
-            session.add(order)
+            await apply_order_status(order, OrderStatus.rejected, session)
     
     # Add history entry
     history = ComplaintHistory(
@@ -216,14 +216,14 @@ def resolve_complaint(
         changed_by_user_id=user_id,
         new_status=ComplaintStatus.resolved,
         notes=f"Resolved: {resolution_notes}" + (" (Order cancelled)" if cancel_order else ""),
-        updated_at=str(datetime.now())
+        updated_at=datetime.now(timezone.utc)
     )
     session.add(history)
-    session.commit()
-    session.refresh(complaint)
+    await session.commit()
+    await session.refresh(complaint)
     
     # Create system message
-    message = create_system_message(
+    message = await create_system_message(
         session,
         complaint.order_id,
         user_id,
@@ -240,8 +240,8 @@ def resolve_complaint(
     return complaint, message
 
 
-def close_complaint(
-    session: Session,
+async def close_complaint(
+    session: AsyncSession,
     complaint_id: int,
     manager_id: int,
     notes: str | None = None,
@@ -251,7 +251,7 @@ def close_complaint(
     from src.cruds.chat import create_system_message
     from src.models.messages import MessageType
 
-    complaint = session.get(Complaints, complaint_id)
+    complaint = await session.get(Complaints, complaint_id)
     if not complaint:
         raise ValueError("Complaint not found")
     
@@ -261,16 +261,14 @@ def close_complaint(
     old_status = complaint.status
     complaint.status = ComplaintStatus.closed
     complaint.resolution_notes = notes or "Complaint closed"
-    complaint.updated_at = str(datetime.now())
+    complaint.updated_at = datetime.now(timezone.utc)
     session.add(complaint)
     
     # If manager wants to cancel the order
     if cancel_order:
-        order = session.get(Orders, complaint.order_id)
+        order = await session.get(Orders, complaint.order_id)
         if order:
-            order.status = OrderStatus.rejected
-            order.updated_at = str(datetime.now())
-            session.add(order)
+            await apply_order_status(order, OrderStatus.rejected, session)
     
     # Add history entry
     history = ComplaintHistory(
@@ -278,14 +276,14 @@ def close_complaint(
         changed_by_user_id=manager_id,
         new_status=ComplaintStatus.closed,
         notes=notes or "Complaint closed" + (" (Order cancelled)" if cancel_order else ""),
-        updated_at=str(datetime.now())
+        updated_at=datetime.now(timezone.utc)
     )
     session.add(history)
-    session.commit()
-    session.refresh(complaint)
+    await session.commit()
+    await session.refresh(complaint)
     
     # Create system message
-    message = create_system_message(
+    message = await create_system_message(
         session,
         complaint.order_id,
         manager_id,
@@ -302,12 +300,12 @@ def close_complaint(
     return complaint, message
 
 
-def get_complaint_by_id(session: Session, complaint_id: int) -> Complaints | None:
+async def get_complaint_by_id(session: AsyncSession, complaint_id: int) -> Complaints | None:
     """Get a complaint by ID"""
-    return session.get(Complaints, complaint_id)
+    return await session.get(Complaints, complaint_id)
 
 
-def get_complaints_for_consumer(session: Session, user_id: int):
+async def get_complaints_for_consumer(session: AsyncSession, user_id: int):
     """Get all complaints created by a consumer"""
     statement = (
         select(Complaints)
@@ -315,10 +313,10 @@ def get_complaints_for_consumer(session: Session, user_id: int):
         .where(Orders.consumer_staff_id == user_id)
         .order_by(Complaints.created_at.desc())
     )
-    return session.exec(statement).all()
+    return (await session.exec(statement)).all()
 
 
-def get_complaints_for_salesman(session: Session, salesman_id: int):
+async def get_complaints_for_salesman(session: AsyncSession, salesman_id: int):
     """Get all complaints assigned to a salesman"""
     statement = (
         select(Complaints)
@@ -326,10 +324,10 @@ def get_complaints_for_salesman(session: Session, salesman_id: int):
         .where(Complaints.status.in_([ComplaintStatus.open]))
         .order_by(Complaints.created_at.desc())
     )
-    return session.exec(statement).all()
+    return (await session.exec(statement)).all()
 
 
-def get_escalated_complaints(session: Session):
+async def get_escalated_complaints(session: AsyncSession):
     """Get all escalated complaints that haven't been claimed by a manager"""
     statement = (
         select(Complaints)
@@ -337,10 +335,10 @@ def get_escalated_complaints(session: Session):
         .where(Complaints.escalated_to_manager_id.is_(None))
         .order_by(Complaints.created_at.desc())
     )
-    return session.exec(statement).all()
+    return (await session.exec(statement)).all()
 
 
-def get_complaints_for_manager(session: Session, manager_id: int):
+async def get_complaints_for_manager(session: AsyncSession, manager_id: int):
     """Get all complaints assigned to a specific manager"""
     statement = (
         select(Complaints)
@@ -348,12 +346,11 @@ def get_complaints_for_manager(session: Session, manager_id: int):
         .where(Complaints.status == ComplaintStatus.in_progress)
         .order_by(Complaints.created_at.desc())
     )
-    return session.exec(statement).all()
+    return (await session.exec(statement)).all()
 
 
-def get_all_complaints_for_company(session: Session, company_id: int):
-    """Get all complaints for a company (for owners)"""
-    statement = (
+def company_complaints_statement(company_id: int):
+    return (
         select(Complaints)
         .join(Orders)
         .join(Linkings)
@@ -363,17 +360,21 @@ def get_all_complaints_for_company(session: Session, company_id: int):
         )
         .order_by(Complaints.created_at.desc())
     )
-    return session.exec(statement).all()
 
 
-def escalate_complaint(
-    session: Session,
+async def get_all_complaints_for_company(session: AsyncSession, company_id: int):
+    """Get all complaints for a company (for owners)"""
+    return (await session.exec(company_complaints_statement(company_id))).all()
+
+
+async def escalate_complaint(
+    session: AsyncSession,
     complaint_id: int,
     salesman_id: int,
     notes: str | None = None
 ) -> Complaints:
     """Escalate a complaint from salesman to manager"""
-    complaint = session.get(Complaints, complaint_id)
+    complaint = await session.get(Complaints, complaint_id)
     if not complaint:
         raise ValueError("Complaint not found")
     
@@ -381,7 +382,7 @@ def escalate_complaint(
         raise ValueError("Only open complaints can be escalated")
     
     complaint.status = ComplaintStatus.escalated
-    complaint.updated_at = str(datetime.now())
+    complaint.updated_at = datetime.now(timezone.utc)
     session.add(complaint)
     
     # Add history entry
@@ -390,22 +391,22 @@ def escalate_complaint(
         changed_by_user_id=salesman_id,
         new_status=ComplaintStatus.escalated,
         notes=notes or "Escalated to manager",
-        updated_at=str(datetime.now())
+        updated_at=datetime.now(timezone.utc)
     )
     session.add(history)
-    session.commit()
-    session.refresh(complaint)
+    await session.commit()
+    await session.refresh(complaint)
     
     return complaint
 
 
-def claim_complaint(
-    session: Session,
+async def claim_complaint(
+    session: AsyncSession,
     complaint_id: int,
     manager_id: int
 ) -> Complaints:
     """Manager claims an escalated complaint"""
-    complaint = session.get(Complaints, complaint_id)
+    complaint = await session.get(Complaints, complaint_id)
     if not complaint:
         raise ValueError("Complaint not found")
     
@@ -417,7 +418,7 @@ def claim_complaint(
     
     complaint.status = ComplaintStatus.in_progress
     complaint.escalated_to_manager_id = manager_id
-    complaint.updated_at = str(datetime.now())
+    complaint.updated_at = datetime.now(timezone.utc)
     session.add(complaint)
     
     # Add history entry
@@ -426,24 +427,24 @@ def claim_complaint(
         changed_by_user_id=manager_id,
         new_status=ComplaintStatus.in_progress,
         notes="Manager claimed complaint",
-        updated_at=str(datetime.now())
+        updated_at=datetime.now(timezone.utc)
     )
     session.add(history)
-    session.commit()
-    session.refresh(complaint)
+    await session.commit()
+    await session.refresh(complaint)
     
     return complaint
 
 
-def resolve_complaint(
-    session: Session,
+async def resolve_complaint(
+    session: AsyncSession,
     complaint_id: int,
     user_id: int,
     resolution_notes: str,
     cancel_order: bool = False
 ) -> Complaints:
     """Resolve a complaint (by salesman or manager)"""
-    complaint = session.get(Complaints, complaint_id)
+    complaint = await session.get(Complaints, complaint_id)
     if not complaint:
         raise ValueError("Complaint not found")
     
@@ -452,16 +453,14 @@ def resolve_complaint(
     
     complaint.status = ComplaintStatus.resolved
     complaint.resolution_notes = resolution_notes
-    complaint.updated_at = str(datetime.now())
+    complaint.updated_at = datetime.now(timezone.utc)
     session.add(complaint)
     
     # If manager wants to cancel the order
     if cancel_order:
-        order = session.get(Orders, complaint.order_id)
+        order = await session.get(Orders, complaint.order_id)
         if order:
-            order.status = OrderStatus.rejected
-            order.updated_at = str(datetime.now())
-            session.add(order)
+            await apply_order_status(order, OrderStatus.rejected, session)
     
     # Add history entry
     history = ComplaintHistory(
@@ -469,24 +468,24 @@ def resolve_complaint(
         changed_by_user_id=user_id,
         new_status=ComplaintStatus.resolved,
         notes=f"Resolved: {resolution_notes}" + (" (Order cancelled)" if cancel_order else ""),
-        updated_at=str(datetime.now())
+        updated_at=datetime.now(timezone.utc)
     )
     session.add(history)
-    session.commit()
-    session.refresh(complaint)
+    await session.commit()
+    await session.refresh(complaint)
     
     return complaint
 
 
-def close_complaint(
-    session: Session,
+async def close_complaint(
+    session: AsyncSession,
     complaint_id: int,
     manager_id: int,
     notes: str | None = None,
     cancel_order: bool = False
 ) -> Complaints:
     """Close a complaint (reject it) - manager only"""
-    complaint = session.get(Complaints, complaint_id)
+    complaint = await session.get(Complaints, complaint_id)
     if not complaint:
         raise ValueError("Complaint not found")
     
@@ -495,16 +494,14 @@ def close_complaint(
     
     complaint.status = ComplaintStatus.closed
     complaint.resolution_notes = notes or "Complaint closed"
-    complaint.updated_at = str(datetime.now())
+    complaint.updated_at = datetime.now(timezone.utc)
     session.add(complaint)
     
     # If manager wants to cancel the order
     if cancel_order:
-        order = session.get(Orders, complaint.order_id)
+        order = await session.get(Orders, complaint.order_id)
         if order:
-            order.status = OrderStatus.rejected
-            order.updated_at = str(datetime.now())
-            session.add(order)
+            await apply_order_status(order, OrderStatus.rejected, session)
     
     # Add history entry
     history = ComplaintHistory(
@@ -512,44 +509,44 @@ def close_complaint(
         changed_by_user_id=manager_id,
         new_status=ComplaintStatus.closed,
         notes=notes or "Complaint closed" + (" (Order cancelled)" if cancel_order else ""),
-        updated_at=str(datetime.now())
+        updated_at=datetime.now(timezone.utc)
     )
     session.add(history)
-    session.commit()
-    session.refresh(complaint)
+    await session.commit()
+    await session.refresh(complaint)
     
     return complaint
 
 
-def get_complaint_history(session: Session, complaint_id: int):
+async def get_complaint_history(session: AsyncSession, complaint_id: int):
     """Get history for a complaint"""
     statement = (
         select(ComplaintHistory)
         .where(ComplaintHistory.complaint_id == complaint_id)
         .order_by(ComplaintHistory.updated_at.asc())
     )
-    return session.exec(statement).all()
+    return (await session.exec(statement)).all()
 
 
-def check_user_can_access_complaint(
-    session: Session,
+async def check_user_can_access_complaint(
+    session: AsyncSession,
     user_id: int,
     complaint_id: int
 ) -> bool:
     """Check if a user can access a complaint"""
-    complaint = session.get(Complaints, complaint_id)
+    complaint = await session.get(Complaints, complaint_id)
     if not complaint:
         return False
     
-    user = session.get(Users, user_id)
+    user = await session.get(Users, user_id)
     if not user:
         return False
     
-    order = session.get(Orders, complaint.order_id)
+    order = await session.get(Orders, complaint.order_id)
     if not order:
         return False
     
-    linking = session.get(Linkings, order.linking_id)
+    linking = await session.get(Linkings, order.linking_id)
     if not linking:
         return False
     
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.models.export_jobs import ExportFormat, ExportJobs, ExportStatus
+
+
+async def create_export_job(session: AsyncSession, company_id: int, user_id: int, format: ExportFormat, filters: dict) -> ExportJobs:
+    job = ExportJobs(company_id=company_id, requested_by_user_id=user_id, format=format, filters=filters)
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    return job
+
+
+async def get_export_job(session: AsyncSession, export_id: int) -> ExportJobs | None:
+    return await session.get(ExportJobs, export_id)
+
+
+async def retry_export_job(session: AsyncSession, job: ExportJobs) -> ExportJobs:
+    """Queue a failed job again; it resumes after the last chunk it uploaded"""
+    if job.status != ExportStatus.failed:
+        raise ValueError("Only failed exports can be retried")
+
+    job.status = ExportStatus.pending
+    job.error = None
+    session.add(job)
+    await session.commit()
+    await session.refresh(job)
+    return job
+
+
+async def claim_export_job(session: AsyncSession, stale_after_seconds: int) -> ExportJobs | None:
+    """
+    Take the oldest waiting job, or a running one whose worker stopped
+    sending heartbeats, and mark it running. SKIP LOCKED lets several
+    workers poll at once without picking the same job. The job's new
+    attempts value is the claim: progress is only saved under it (see
+    save_export_progress), so a worker whose job was taken over stops.
+    """
+    now = datetime.now(timezone.utc)
+    job = (await session.exec(
+        select(ExportJobs)
+        .where(
+            (ExportJobs.status == ExportStatus.pending)
+            | ((ExportJobs.status == ExportStatus.running) & (ExportJobs.heartbeat_at < now - timedelta(seconds=stale_after_seconds)))
+        )
+        .order_by(ExportJobs.export_id)
+        .limit(1)
+        .with_for_update(skip_locked=True)
+    )).first()
+    if job is None:
+        return None
+
+    job.status = ExportStatus.running
+    job.heartbeat_at = now
+    job.attempts += 1
+    session.add(job)
+    await session.commit()
+    return job
+
+
+async def save_export_progress(session: AsyncSession, export_id: int, attempt: int, **values) -> bool:
+    """
+    Set values (and a fresh heartbeat) on the job and commit, if attempt is
+    still its current claim. False means another worker has claimed it.
+    """
+    result = await session.exec(
+        update(ExportJobs)
+        .where(
+            ExportJobs.export_id == export_id,
+            ExportJobs.attempts == attempt,
+            ExportJobs.status == ExportStatus.running,
+        )
+        .values(heartbeat_at=datetime.now(timezone.utc), **values)
+    )
+    await session.commit()
+    return result.rowcount == 1
@@ -1,42 +1,45 @@
-from datetime import datetime
-from sqlmodel import Session, select
+from datetime import datetime, timezone
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 from src.models.linkings import Linkings, LinkingStatus
 from src.schemas.linkings import LinkingSchema
 
-def create_linking(session: Session, data: LinkingSchema, consumer_company_id: int, requested_user_id, company_id: int) -> Linkings:
+async def create_linking(session: AsyncSession, data: LinkingSchema, consumer_company_id: int, requested_user_id, company_id: int) -> Linkings:
     linking_data = data
 
     # Create linking instance
     linking = Linkings(**linking_data.model_dump(), supplier_company_id=company_id, consumer_company_id=consumer_company_id, requested_by_user_id=requested_user_id, status=LinkingStatus.pending)
     session.add(linking)
-    session.flush()
+    await session.flush()
 
-    session.commit()
-    session.refresh(linking)
+    await session.commit()
+    await session.refresh(linking)
 
     return linking
 
-def get_linkings_by_company(session: Session, company_id: int):
-    statement = select(Linkings).where(
+def linkings_by_company_statement(company_id: int):
+    return select(Linkings).where(
         (Linkings.supplier_company_id == company_id) | (Linkings.consumer_company_id == company_id)
-    )
-    results = session.exec(statement).all()
+    ).order_by(Linkings.linking_id)
+
+async def get_linkings_by_company(session: AsyncSession, company_id: int):
+    results = (await session.exec(linkings_by_company_statement(company_id))).all()
     return results
 
-def check_if_exists(session: Session, consumer_company_id: int, supplier_company_id: int):
-    linking = session.exec(select(Linkings).where(
+async def check_if_exists(session: AsyncSession, consumer_company_id: int, supplier_company_id: int):
+    linking = (await session.exec(select(Linkings).where(
         (Linkings.consumer_company_id == consumer_company_id) & (Linkings.supplier_company_id == supplier_company_id)
-        )).first()
+        ))).first()
     
     if not linking:
         return False
     
     return True
 
-def check_if_linked(session: Session, consumer_company_id: int, supplier_company_id: int):
-    linking = session.exec(select(Linkings).where(
+async def check_if_linked(session: AsyncSession, consumer_company_id: int, supplier_company_id: int):
+    linking = (await session.exec(select(Linkings).where(
         (Linkings.consumer_company_id == consumer_company_id) & (Linkings.supplier_company_id == supplier_company_id) & (Linkings.status == LinkingStatus.accepted)
-        )).first()
+        ))).first()
     
     if not linking:
         return False
@@ -44,10 +47,10 @@ def check_if_linked(session: Session, consumer_company_id: int, supplier_company
     return True
 
 
-def get_linking(session: Session, consumer_company_id: int, supplier_company_id: int):
-    linking = session.exec(select(Linkings).where(
+async def get_linking(session: AsyncSession, consumer_company_id: int, supplier_company_id: int):
+    linking = (await session.exec(select(Linkings).where(
         (Linkings.consumer_company_id == consumer_company_id) & (Linkings.supplier_company_id == supplier_company_id) & (Linkings.status == LinkingStatus.accepted)
-        )).first()
+        ))).first()
     
     if not linking:
         raise ValueError(f"Linking not found")
@@ -55,22 +58,22 @@ def get_linking(session: Session, consumer_company_id: int, supplier_company_id:
     return linking
 
 
-def get_linking_status(session: Session, company_id_1: int, company_id_2: int):
+async def get_linking_status(session: AsyncSession, company_id_1: int, company_id_2: int):
     """
     Get linking status between two companies.
     Works for both directions (supplier-consumer or consumer-supplier).
     Returns the linking if found, None otherwise.
     """
-    linking = session.exec(select(Linkings).where(
+    linking = (await session.exec(select(Linkings).where(
         ((Linkings.consumer_company_id == company_id_1) & (Linkings.supplier_company_id == company_id_2))
         | ((Linkings.consumer_company_id == company_id_2) & (Linkings.supplier_company_id == company_id_1))
-    )).first()
+    ))).first()
     
     return linking
 
 
-def update_due_response(session: Session, linking_id: int, responded_user_id: int, status: str):
-    linking = session.get(Linkings, linking_id)
+async def update_due_response(session: AsyncSession, linking_id: int, responded_user_id: int, status: str):
+    linking = await session.get(Linkings, linking_id)
 
     if not linking:
         raise ValueError("Linking not found")
@@ -78,9 +81,9 @@ def update_due_response(session: Session, linking_id: int, responded_user_id: in
     setattr(linking, 'status', status)
     setattr(linking, 'responded_by_user_id', responded_user_id)
     setattr(linking, 'assigned_salesman_user_id', responded_user_id)
-    setattr(linking, 'updated_at', datetime.now())
+    setattr(linking, 'updated_at', datetime.now(timezone.utc))
 
-    session.commit()
-    session.refresh(linking)
+    await session.commit()
+    await session.refresh(linking)
     
     return linking
\ No newline at end of file
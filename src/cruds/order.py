@@ -1,5 +1,10 @@
-from sqlmodel import Session, select
-from datetime import datetime
+import base64
+import json
+
+from sqlalchemy import insert, tuple_
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from datetime import datetime, timezone
 
 from src.models.linkings import Linkings
 from src.models.orders import Orders, OrderStatus
@@ -7,27 +12,64 @@ from src.models.order_products import OrderProducts
 from src.models.products import Products
 from src.models.chats import Chats
 from src.schemas.order import OrderCreate
+from src.cruds.stock import commit_reservations, release_reservations, reserve_stock
+from src.cruds.order_stats import add_to_order_stats, move_order_stats
+from src.services.pricing import PriceEntry, merge_quantities, price_cart
 
 
-def create_order(order_data: OrderCreate, linking_id: int, user_id: int, session: Session):
-    total_price = 0
+async def create_order(order_data: OrderCreate, linking_id: int, user_id: int, session: AsyncSession):
+    """
+    Price the requested products and create the order, its chat, its lines
+    and its stock reservations in a single transaction. The product rows
+    themselves are only read; stock is reserved from the per-product shards
+    (see src.cruds.stock), so orders for the same product don't serialize.
+    """
+    try:
+        order = await add_order(order_data, linking_id, user_id, session)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
 
-    # check products and calculate price
-    for item in order_data.products:
-        product = session.exec(
-            select(Products).where(Products.product_id == item.product_id)
-        ).first()
+    return order
 
-        if not product:
-            raise ValueError(f"Product {item.product_id} not found")
 
-        if product.stock_quantity < item.quantity:
-            raise ValueError(f"Product {product.name} does not have enough stock")
-        
-        if product.threshold <= item.quantity:
-            total_price += product.bulk_price * item.quantity
-        else:
-            total_price += product.retail_price * item.quantity
+async def add_order(
+    order_data: OrderCreate,
+    linking_id: int,
+    user_id: int,
+    session: AsyncSession,
+    products_by_id: dict[int, Products] | None = None,
+) -> Orders:
+    """
+    The work of create_order without the commit, for callers that place
+    several orders per transaction. products_by_id may pass in products the
+    caller has already loaded.
+    """
+    # Repeated lines for the same product are merged into one order line
+    quantities = merge_quantities(order_data.products)
+
+    if not quantities:
+        raise ValueError("Order must contain at least one product")
+
+    if products_by_id is None:
+        # Only the linking's supplier's products can be ordered through it
+        supplier = select(Linkings.supplier_company_id).where(Linkings.linking_id == linking_id).scalar_subquery()
+        products = (await session.exec(
+            select(Products)
+            .where(Products.product_id.in_(quantities), Products.company_id == supplier)
+        )).all()
+        products_by_id = {product.product_id: product for product in products}
+
+    # Priced like POST /orders/quote; stock is checked when it is reserved
+    quote = price_cart(quantities, {
+        product_id: PriceEntry.from_product(product) for product_id, product in products_by_id.items()
+    })
+    if quote.errors:
+        raise ValueError(quote.errors[0])
+
+    total_price = quote.total_price
+    prices = {line.product_id: line.unit_price for line in quote.lines}
 
     # create order
     order = Orders(
@@ -37,50 +79,38 @@ def create_order(order_data: OrderCreate, linking_id: int, user_id: int, session
         status=OrderStatus.created
     )
     session.add(order)
-    session.commit()
-    session.refresh(order)
+    await session.flush()
 
     # create order chat automatically
-    order_chat = Chats(
-        linking_id=linking_id,
-        order_id=order.order_id,
-        created_at=str(datetime.now())
-    )
-    session.add(order_chat)
-    session.commit()
+    session.add(Chats(linking_id=linking_id, order_id=order.order_id))
 
     # add order products
-    for item in order_data.products:
-        product = session.exec(
-            select(Products).where(Products.product_id == item.product_id)
-        ).one()
-
-        if product.threshold <= item.quantity:
-            price = product.bulk_price
-        else:
-            price = product.retail_price
+    await session.exec(insert(OrderProducts), params=[
+        {
+            "order_id": order.order_id,
+            "product_id": product_id,
+            "product_quantity": quantity,
+            "product_price": prices[product_id],
+        }
+        for product_id, quantity in quantities.items()
+    ])
 
-        op = OrderProducts(
-            order_id=order.order_id,
-            product_id=item.product_id,
-            product_quantity=item.quantity,
-            product_price=price
-        )
-        session.add(op)
+    await reserve_stock(session, order.order_id, quantities)
 
-        product.stock_quantity -= item.quantity
+    await add_to_order_stats(session, order, OrderStatus.created, [
+        (product_id, quantity, prices[product_id]) for product_id, quantity in quantities.items()
+    ])
 
-    session.commit()
     return order
 
 
-def get_order_by_id(order_id: int, session: Session):
-    return session.exec(
+async def get_order_by_id(order_id: int, session: AsyncSession):
+    return (await session.exec(
         select(Orders).where(Orders.order_id == order_id)
-    ).first()
+    )).first()
 
 
-def get_orders_for_company(company_id: int, session: Session):
+async def get_orders_for_company(company_id: int, session: AsyncSession):
     statement = (
         select(Orders)
         .join(Linkings)
@@ -89,78 +119,143 @@ def get_orders_for_company(company_id: int, session: Session):
             | (Linkings.consumer_company_id == company_id)
         )
     )
-    return session.exec(statement).all()
+    return (await session.exec(statement)).all()
 
 
-def get_ordered_products_for_company(company_id: int, session: Session):
-    # Get all orders for the company
-    orders = get_orders_for_company(company_id, session)
-    order_ids = [order.order_id for order in orders]
-    
-    if not order_ids:
-        return []
-    
-    # Create a dictionary for quick order lookup
-    orders_dict = {order.order_id: order for order in orders}
-    
-    # Get all order products for these orders
-    statement = (
-        select(OrderProducts)
-        .where(OrderProducts.order_id.in_(order_ids))
+# Sortable columns of the order feed, and the key each one has in a feed row
+ORDER_FEED_SORTS = {
+    "created_at": (Orders.created_at, "order_created_at"),
+    "updated_at": (Orders.updated_at, "order_updated_at"),
+    "total_price": (Orders.total_price, "order_total_price"),
+    "order_id": (Orders.order_id, "order_id"),
+}
+
+
+def order_feed_statement(
+    company_id: int,
+    status: OrderStatus | None = None,
+    created_from: datetime | None = None,
+    created_to: datetime | None = None,
+    linking_id: int | None = None,
+    product_id: int | None = None,
+    sort: str = "-created_at",
+):
+    """
+    One row per order line for every order the company supplies or places,
+    joined with its order and product, filtered and sorted in SQL. sort is a
+    key of ORDER_FEED_SORTS, prefixed with "-" for descending; ties are
+    broken by order_id and product_id so the order is total.
+    """
+    if sort.lstrip("-") not in ORDER_FEED_SORTS:
+        raise ValueError(f"Unknown sort field: {sort.lstrip('-')}")
+
+    column, _ = ORDER_FEED_SORTS[sort.lstrip("-")]
+    descending = sort.startswith("-")
+
+    company_linkings = select(Linkings.linking_id).where(
+        (Linkings.supplier_company_id == company_id)
+        | (Linkings.consumer_company_id == company_id)
     )
-    
-    order_products = session.exec(statement).all()
-    
-    # Get all product IDs and fetch products in one query
-    product_ids = [op.product_id for op in order_products]
-    if not product_ids:
-        return []
-    
-    products_statement = (
-        select(Products)
-        .where(Products.product_id.in_(product_ids))
+
+    statement = (
+        select(
+            Orders.order_id,
+            Orders.linking_id,
+            OrderProducts.product_id,
+            Products.name.label("product_name"),
+            Products.description.label("product_description"),
+            Products.picture_url.label("product_picture_url"),
+            OrderProducts.product_quantity.label("quantity"),
+            OrderProducts.product_price.label("price"),
+            Products.unit,
+            Orders.status.label("order_status"),
+            Orders.total_price.label("order_total_price"),
+            Orders.created_at.label("order_created_at"),
+            Orders.updated_at.label("order_updated_at"),
+        )
+        .join(OrderProducts, OrderProducts.order_id == Orders.order_id)
+        .join(Products, Products.product_id == OrderProducts.product_id)
+        .where(Orders.linking_id.in_(company_linkings))
     )
-    products = session.exec(products_statement).all()
-    products_dict = {product.product_id: product for product in products}
-    
-    # Format the results to return products with order information
-    products_list = []
-    for order_product in order_products:
-        # Get the product details
-        product = products_dict.get(order_product.product_id)
-        if not product:
-            continue
-            
-        # Get the order for this order_product
-        order = orders_dict.get(order_product.order_id)
-        if order:
-            products_list.append({
-                "order_id": order.order_id,
-                'linking_id': order.linking_id,
-                "product_id": product.product_id,
-                "product_name": product.name,
-                "product_description": product.description,
-                "product_picture_url": product.picture_url,
-                "quantity": order_product.product_quantity,
-                "price": order_product.product_price,
-                "unit": product.unit,
-                "order_status": order.status,
-                "order_total_price": order.total_price,
-                "order_created_at": order.created_at,
-                "order_updated_at": order.updated_at
-            })
-    
-    return products_list
 
+    if status is not None:
+        statement = statement.where(Orders.status == status)
+    if created_from is not None:
+        statement = statement.where(Orders.created_at >= created_from)
+    if created_to is not None:
+        statement = statement.where(Orders.created_at < created_to)
+    if linking_id is not None:
+        statement = statement.where(Orders.linking_id == linking_id)
+    if product_id is not None:
+        statement = statement.where(OrderProducts.product_id == product_id)
+
+    keys = (column, Orders.order_id, OrderProducts.product_id)
+    return statement.order_by(*(key.desc() if descending else key.asc() for key in keys))
+
+
+def _encode_feed_cursor(row, sort: str) -> str:
+    _, key = ORDER_FEED_SORTS[sort.lstrip("-")]
+    value = row[key]
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort, value, row["order_id"], row["product_id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _decode_feed_cursor(cursor: str, sort: str) -> tuple:
+    try:
+        cursor_sort, value, order_id, product_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        order_id, product_id = int(order_id), int(product_id)
+        # Every sort column is a timestamp or an integer
+        if ORDER_FEED_SORTS[sort.lstrip("-")][0].type.python_type is datetime:
+            value = datetime.fromisoformat(value)
+        else:
+            value = int(value)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if cursor_sort != sort:
+        raise ValueError("Cursor belongs to a different sort order")
+    return value, order_id, product_id
+
+
+async def get_order_feed(
+    company_id: int,
+    session: AsyncSession,
+    limit: int = 50,
+    cursor: str | None = None,
+    sort: str = "-created_at",
+    **filters,
+) -> tuple[list[dict], str | None]:
+    """
+    A page of order_feed_statement. Pages are keyset-paginated: cursor is
+    the opaque next_cursor of the previous page, so deep pages cost the same
+    as the first. Returns the rows and the cursor of the next page (None on
+    the last page).
+    """
+    statement = order_feed_statement(company_id, sort=sort, **filters)
 
-def get_products_for_order(order_id: int, session: Session):
+    if cursor is not None:
+        column, _ = ORDER_FEED_SORTS[sort.lstrip("-")]
+        keys = tuple_(column, Orders.order_id, OrderProducts.product_id)
+        after = tuple_(*_decode_feed_cursor(cursor, sort))
+        statement = statement.where(keys < after if sort.startswith("-") else keys > after)
+
+    # One extra row tells whether there is a next page
+    rows = [dict(row._mapping) for row in (await session.exec(statement.limit(limit + 1))).all()]
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, _encode_feed_cursor(rows[-1], sort)
+
+
+async def get_products_for_order(order_id: int, session: AsyncSession):
     # Get all order products for this order
     statement = (
         select(OrderProducts)
         .where(OrderProducts.order_id == order_id)
     )
     
-    order_products = session.exec(statement).all()
+    order_products = (await session.exec(statement)).all()
     
     if not order_products:
         return []
@@ -172,7 +267,7 @@ def get_products_for_order(order_id: int, session: Session):
         select(Products)
         .where(Products.product_id.in_(product_ids))
     )
-    products = session.exec(products_statement).all()
+    products = (await session.exec(products_statement)).all()
     products_dict = {product.product_id: product for product in products}
     
     # Format the results to return products with order product information
@@ -196,22 +291,68 @@ def get_products_for_order(order_id: int, session: Session):
     return products_list
 
 
-def update_order_status(order_id: int, new_status: OrderStatus, user_id: int, session: Session):
+async def apply_order_status(order: Orders, new_status: OrderStatus, session: AsyncSession) -> OrderStatus:
+    """
+    Move an order to new_status, and its stock reservations and daily stats
+    with it; the caller commits. Rejecting an order releases its reserved
+    stock, shipping or completing it takes the reserved stock off hand, and
+    reopening a rejected order reserves its products again. Returns the old
+    status.
+
+    The order row is locked and its status read again first, so concurrent
+    transitions of one order take turns and each starts from the status the
+    one before it left; moving to the status the order already has changes
+    nothing.
+    """
+    await session.exec(
+        select(Orders)
+        .where(Orders.order_id == order.order_id)
+        .with_for_update()
+        .execution_options(populate_existing=True)
+    )
+    old_status = order.status
+    if old_status == new_status:
+        return old_status
+
+    lines = (await session.exec(
+        select(OrderProducts.product_id, OrderProducts.product_quantity, OrderProducts.product_price)
+        .where(OrderProducts.order_id == order.order_id)
+    )).all()
+
+    if new_status == OrderStatus.rejected:
+        await release_reservations(session, order.order_id)
+    elif old_status == OrderStatus.rejected:
+        await reserve_stock(session, order.order_id, {product_id: quantity for product_id, quantity, _ in lines})
+
+    if new_status in (OrderStatus.shipping, OrderStatus.completed):
+        await commit_reservations(session, order.order_id)
+
+    await move_order_stats(session, order, old_status, new_status, [tuple(line) for line in lines])
+
+    order.status = new_status
+    order.updated_at = datetime.now(timezone.utc)
+    session.add(order)
+    return old_status
+
+
+async def update_order_status(order_id: int, new_status: OrderStatus, user_id: int, session: AsyncSession):
     from src.cruds.chat import create_system_message
     from src.models.messages import MessageType
 
-    order = get_order_by_id(order_id, session)
+    order = await get_order_by_id(order_id, session)
     if not order:
         raise ValueError("Order not found")
 
-    old_status = order.status
-    order.status = new_status
-    order.updated_at = str(datetime.now())
-    session.commit()
-    session.refresh(order)
+    try:
+        old_status = await apply_order_status(order, new_status, session)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    await session.refresh(order)
     
     # Create system message
-    message = create_system_message(
+    message = await create_system_message(
         session,
         order_id,
         user_id,
@@ -228,7 +369,7 @@ def update_order_status(order_id: int, new_status: OrderStatus, user_id: int, se
     return order, message
 
 
-def get_orders_by_linking_id(linking_id: int, session: Session):
-    return session.exec(
+async def get_orders_by_linking_id(linking_id: int, session: AsyncSession):
+    return (await session.exec(
         select(Orders).where(Orders.linking_id == linking_id)
-    ).all()
+    )).all()
@@ -0,0 +1,211 @@
+from datetime import date, datetime, timezone
+
+from sqlalchemy import Date, cast, delete, func, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.core.config import settings
+from src.models.linkings import Linkings
+from src.models.orders import Orders, OrderStatus
+from src.models.order_products import OrderProducts
+from src.models.order_stats import OrderDailyStats, ProductDailyStats
+from src.models.products import Products
+
+# Stats are bucketed by the order's creation day in UTC
+_order_day = cast(func.timezone("UTC", Orders.created_at), Date)
+
+_stats_key = ["linking_id", "day", "status"]
+
+_add_order_stats = insert(OrderDailyStats)
+_add_order_stats = _add_order_stats.on_conflict_do_update(
+    index_elements=[*_stats_key, "shard"],
+    set_={
+        "order_count": OrderDailyStats.order_count + _add_order_stats.excluded.order_count,
+        "total_price": OrderDailyStats.total_price + _add_order_stats.excluded.total_price,
+        "quantity": OrderDailyStats.quantity + _add_order_stats.excluded.quantity,
+    },
+)
+
+_add_product_stats = insert(ProductDailyStats)
+_add_product_stats = _add_product_stats.on_conflict_do_update(
+    index_elements=[*_stats_key, "product_id", "shard"],
+    set_={
+        "order_count": ProductDailyStats.order_count + _add_product_stats.excluded.order_count,
+        "quantity": ProductDailyStats.quantity + _add_product_stats.excluded.quantity,
+        "revenue": ProductDailyStats.revenue + _add_product_stats.excluded.revenue,
+    },
+)
+
+
+def order_day(created_at: datetime) -> date:
+    return created_at.astimezone(timezone.utc).date()
+
+
+async def add_to_order_stats(session: AsyncSession, order: Orders, status: OrderStatus, lines: list[tuple[int, int, int]], sign: int = 1):
+    """
+    Count an order under status in the daily stats, or take it out again
+    with sign=-1. lines are the order's (product_id, quantity, price).
+    Runs in the caller's transaction, so the stats commit with the order.
+    """
+    key = {
+        "linking_id": order.linking_id,
+        "day": order_day(order.created_at),
+        "status": status,
+        "shard": order.order_id % settings.ORDER_STATS_SHARD_COUNT,
+    }
+
+    await session.exec(_add_order_stats, params=[{
+        **key,
+        "order_count": sign,
+        "total_price": sign * order.total_price,
+        "quantity": sign * sum(quantity for _, quantity, _ in lines),
+    }])
+    await session.exec(_add_product_stats, params=[
+        {**key, "product_id": product_id, "order_count": sign, "quantity": sign * quantity, "revenue": sign * quantity * price}
+        for product_id, quantity, price in sorted(lines)
+    ])
+
+
+async def move_order_stats(session: AsyncSession, order: Orders, old_status: OrderStatus, new_status: OrderStatus, lines: list[tuple[int, int, int]]):
+    if old_status == new_status:
+        return
+    # Rows are always locked in status order, whichever way the order moves
+    for status, sign in sorted([(old_status, -1), (new_status, 1)], key=lambda change: change[0].value):
+        await add_to_order_stats(session, order, status, lines, sign)
+
+
+async def rebuild_order_stats(session: AsyncSession, linking_ids: list[int] | None = None):
+    """
+    Recompute the daily stats from the orders, for all linkings or only the
+    given ones, into shard 0. The stats tables are locked against writes until the caller
+    commits, so orders placed meanwhile wait and are counted on top of the
+    rebuilt rows instead of being lost or counted twice.
+    """
+    await session.exec(text("LOCK TABLE order_daily_stats, product_daily_stats IN EXCLUSIVE MODE"))
+
+    for model in (OrderDailyStats, ProductDailyStats):
+        statement = delete(model)
+        if linking_ids is not None:
+            statement = statement.where(model.linking_id.in_(linking_ids))
+        await session.exec(statement)
+
+    quantities = (
+        select(OrderProducts.order_id, func.sum(OrderProducts.product_quantity).label("quantity"))
+        .group_by(OrderProducts.order_id)
+        .subquery()
+    )
+    orders = (
+        select(
+            Orders.linking_id,
+            _order_day,
+            Orders.status,
+            func.count(),
+            func.sum(Orders.total_price),
+            func.coalesce(func.sum(quantities.c.quantity), 0),
+        )
+        .outerjoin(quantities, quantities.c.order_id == Orders.order_id)
+        .group_by(Orders.linking_id, _order_day, Orders.status)
+    )
+    lines = (
+        select(
+            Orders.linking_id,
+            _order_day,
+            Orders.status,
+            OrderProducts.product_id,
+            func.count(),
+            func.sum(OrderProducts.product_quantity),
+            func.sum(OrderProducts.product_quantity * OrderProducts.product_price),
+        )
+        .join(OrderProducts, OrderProducts.order_id == Orders.order_id)
+        .group_by(Orders.linking_id, _order_day, Orders.status, OrderProducts.product_id)
+    )
+    if linking_ids is not None:
+        orders = orders.where(Orders.linking_id.in_(linking_ids))
+        lines = lines.where(Orders.linking_id.in_(linking_ids))
+
+    await session.exec(insert(OrderDailyStats).from_select(
+        [*_stats_key, "order_count", "total_price", "quantity"], orders
+    ))
+    await session.exec(insert(ProductDailyStats).from_select(
+        [*_stats_key, "product_id", "order_count", "quantity", "revenue"], lines
+    ))
+
+
+async def get_order_stats(
+    session: AsyncSession,
+    company_id: int,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    linking_id: int | None = None,
+    role: str | None = None,
+    top: int = 10,
+) -> dict:
+    """
+    Order counts, totals and quantities of the company's orders, by status,
+    by linking and status, and by day and status, plus its top products by
+    quantity (rejected orders left out). Read from the daily stats, so the
+    cost grows with the number of days and linkings, not orders. role
+    ("supplier" or "consumer") limits the stats to one side of the company's
+    linkings; date_to is inclusive.
+    """
+    if role == "supplier":
+        company_linkings = select(Linkings.linking_id).where(Linkings.supplier_company_id == company_id)
+    elif role == "consumer":
+        company_linkings = select(Linkings.linking_id).where(Linkings.consumer_company_id == company_id)
+    elif role is None:
+        company_linkings = select(Linkings.linking_id).where(
+            (Linkings.supplier_company_id == company_id)
+            | (Linkings.consumer_company_id == company_id)
+        )
+    else:
+        raise ValueError(f"Unknown role: {role}")
+
+    def scoped(statement, model):
+        statement = statement.where(model.linking_id.in_(company_linkings))
+        if date_from is not None:
+            statement = statement.where(model.day >= date_from)
+        if date_to is not None:
+            statement = statement.where(model.day <= date_to)
+        if linking_id is not None:
+            statement = statement.where(model.linking_id == linking_id)
+        return statement
+
+    totals = (
+        func.sum(OrderDailyStats.order_count).label("order_count"),
+        func.sum(OrderDailyStats.total_price).label("total_price"),
+        func.sum(OrderDailyStats.quantity).label("quantity"),
+    )
+
+    async def grouped(*keys):
+        statement = scoped(select(*keys, *totals), OrderDailyStats).group_by(*keys).order_by(*keys)
+        # Rows of orders that have all moved to another status are left at zero
+        statement = statement.having(func.sum(OrderDailyStats.order_count) != 0)
+        return [dict(row._mapping) for row in (await session.exec(statement)).all()]
+
+    top_products = scoped(
+        select(
+            ProductDailyStats.product_id,
+            Products.name.label("product_name"),
+            func.sum(ProductDailyStats.order_count).label("order_count"),
+            func.sum(ProductDailyStats.quantity).label("quantity"),
+            func.sum(ProductDailyStats.revenue).label("revenue"),
+        )
+        .join(Products, Products.product_id == ProductDailyStats.product_id)
+        .where(ProductDailyStats.status != OrderStatus.rejected),
+        ProductDailyStats,
+    )
+    top_products = (
+        top_products
+        .group_by(ProductDailyStats.product_id, Products.name)
+        .having(func.sum(ProductDailyStats.quantity) > 0)
+        .order_by(func.sum(ProductDailyStats.quantity).desc(), ProductDailyStats.product_id)
+        .limit(top)
+    )
+
+    return {
+        "by_status": await grouped(OrderDailyStats.status),
+        "by_linking": await grouped(OrderDailyStats.linking_id, OrderDailyStats.status),
+        "by_day": await grouped(OrderDailyStats.day, OrderDailyStats.status),
+        "top_products": [dict(row._mapping) for row in (await session.exec(top_products)).all()],
+    }
@@ -1,46 +1,262 @@
-from sqlmodel import Session, select
-from src.models.products import Products
-from src.schemas.products import ProductSchema
+import base64
+import json
+import re
 
-def get_all_products(session: Session, company_id: int) -> list[Products]:
-    products = session.exec(select(Products).where((Products.is_available == True) & (Products.company_id == company_id))).all()
+from sqlalchemy import and_, exists, func, or_
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.models.linkings import Linkings, LinkingStatus
+from src.models.products import Products, search_document, search_query
+from src.models.stock import ProductStockShards
+from src.schemas.products import ProductImportRow, ProductSchema
+from src.cruds.stock import rebuild_many_stock_shards, rebuild_stock_shards
+from src.cruds.catalog import bump_catalog_version
+
+def all_products_statement(company_id: int):
+    return select(Products).where((Products.is_available == True) & (Products.company_id == company_id)).order_by(Products.product_id)
+
+async def get_all_products(session: AsyncSession, company_id: int) -> list[Products]:
+    products = (await session.exec(all_products_statement(company_id))).all()
     return products
 
-def get_product_by_id(session: Session, product_id: int) -> list[Products]:
-    product = session.get(Products, product_id)
+async def get_product_by_id(session: AsyncSession, product_id: int) -> list[Products]:
+    product = await session.get(Products, product_id)
     return product
 
-def create_product(session: Session, data: ProductSchema, company_id: int) -> Products:
+async def get_company_products_by_ids(session: AsyncSession, company_id: int, product_ids) -> list[Products]:
+    return (await session.exec(
+        select(Products).where(Products.company_id == company_id, Products.product_id.in_(product_ids))
+    )).all()
+
+PRODUCT_FIELDS = tuple(column.name for column in Products.__table__.columns)
+
+
+async def get_products_by_ids(session: AsyncSession, product_ids: list[int], fields: list[str] | None = None) -> list[dict]:
+    """
+    The products with the given ids, in one query, as dicts of the given
+    fields (all of them by default; product_id is always included).
+    Unknown ids are left out.
+    """
+    names = ["product_id", *(name for name in (fields or PRODUCT_FIELDS) if name != "product_id")]
+    unknown = [name for name in names if name not in PRODUCT_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown product fields: {', '.join(unknown)}")
+
+    rows = (await session.exec(
+        select(*(Products.__table__.c[name] for name in names)).where(Products.product_id.in_(product_ids))
+    )).mappings().all()
+    return [dict(row) for row in rows]
+
+
+def _search_query(q: str) -> str | None:
+    """Words of q as a prefix tsquery ("fresh mil" matches "Fresh milk"), or None if q has none"""
+    words = re.findall(r"\w+", q.lower())[:8]
+    return " & ".join(f"{word}:*" for word in words) or None
+
+
+def _encode_search_cursor(row: dict) -> str:
+    payload = json.dumps([row["rank"], row["product_id"]], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def _decode_search_cursor(cursor: str) -> tuple:
+    try:
+        rank, product_id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        product_id = int(product_id)
+        rank = None if rank is None else float(rank)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    return rank, product_id
+
+
+async def search_products(
+    session: AsyncSession,
+    company_id: int,
+    company_type: str,
+    q: str | None = None,
+    supplier_company_id: int | None = None,
+    min_price: int | None = None,
+    max_price: int | None = None,
+    unit: str | None = None,
+    in_stock: bool | None = None,
+    limit: int = 50,
+    cursor: str | None = None,
+) -> tuple[list[dict], str | None]:
+    """
+    A page of the available products a company can order from: the
+    catalogs of its accepted suppliers for a consumer, its own for a
+    supplier. With q, products whose name or description has words
+    starting with q's words, or whose name is close to q (trigram
+    similarity, so typos still match), ranked best first; without q, all
+    of them by product_id. Keyset-paginated on (rank, product_id) like the
+    order feed. Filters: retail price range, unit and in_stock (stock left
+    to reserve).
+    """
+    if company_type == "supplier":
+        searchable = Products.company_id == company_id
+    else:
+        searchable = Products.company_id.in_(select(Linkings.supplier_company_id).where(
+            Linkings.consumer_company_id == company_id,
+            Linkings.status == LinkingStatus.accepted,
+        ))
+
+    columns = (
+        Products.product_id,
+        Products.company_id,
+        Products.name,
+        Products.description,
+        Products.picture_url,
+        Products.retail_price,
+        Products.threshold,
+        Products.bulk_price,
+        Products.minimum_order,
+        Products.unit,
+    )
+
+    tsquery = _search_query(q) if q else None
+    if q and tsquery is None:
+        return [], None
+
+    if tsquery is not None:
+        document = search_document(Products.name, Products.description)
+        query = search_query(tsquery)
+        rank = func.ts_rank(document, query) + func.word_similarity(q, Products.name)
+        # Ordering by the label sorts on the selected value instead of ranking twice
+        ranked = rank.label("rank")
+        statement = (
+            select(*columns, ranked)
+            .where(or_(document.op("@@")(query), Products.name.op("%>")(q)))
+            .order_by(ranked.desc(), Products.product_id)
+        )
+    else:
+        rank = None
+        statement = select(*columns).order_by(Products.product_id)
+
+    statement = statement.where(Products.is_available == True, searchable)
+
+    if supplier_company_id is not None:
+        statement = statement.where(Products.company_id == supplier_company_id)
+    if min_price is not None:
+        statement = statement.where(Products.retail_price >= min_price)
+    if max_price is not None:
+        statement = statement.where(Products.retail_price <= max_price)
+    if unit is not None:
+        statement = statement.where(Products.unit == unit)
+    if in_stock is not None:
+        shards = select(ProductStockShards.shard).where(ProductStockShards.product_id == Products.product_id)
+        # Products nobody has ordered since sharding have no shards yet
+        available = or_(
+            exists(shards.where(ProductStockShards.quantity > 0)),
+            and_(~exists(shards), Products.stock_quantity > 0),
+        )
+        statement = statement.where(available if in_stock else ~available)
+
+    if cursor is not None:
+        after_rank, after_id = _decode_search_cursor(cursor)
+        if (after_rank is None) != (rank is None):
+            raise ValueError("Cursor belongs to a different search")
+        if rank is None:
+            statement = statement.where(Products.product_id > after_id)
+        else:
+            statement = statement.where(or_(rank < after_rank, and_(rank == after_rank, Products.product_id > after_id)))
+
+    rows = [dict(row._mapping) for row in (await session.exec(statement.limit(limit + 1))).all()]
+    for row in rows:
+        row.setdefault("rank", None)
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, _encode_search_cursor(rows[-1])
+
+
+async def create_product(session: AsyncSession, data: ProductSchema, company_id: int) -> Products:
     product_data = data
 
     # Create product instance
     company = Products(**product_data.model_dump(), company_id=company_id)
     session.add(company)
-    session.flush()
+    await session.flush()
+    await rebuild_stock_shards(session, company.product_id)
+    await bump_catalog_version(session, company_id)
 
-    session.commit()
-    session.refresh(company)
+    await session.commit()
+    await session.refresh(company)
 
     return company
 
-def delete_product(session: Session, product_id: int) -> None:
-    product = session.get(Products, product_id)
+async def delete_product(session: AsyncSession, product_id: int) -> None:
+    product = await session.get(Products, product_id)
 
     if product:
         product.is_available = False
-        session.commit()
+        await bump_catalog_version(session, product.company_id)
+        await session.commit()
 
-def update_product(session: Session, product_id: int, data: ProductSchema) -> Products:
-    product = session.get(Products, product_id)
+async def update_product(session: AsyncSession, product_id: int, data: ProductSchema) -> Products:
+    product = await session.get(Products, product_id)
 
     if not product:
         raise ValueError("Product not found")
 
+    old_stock = product.stock_quantity
     for key, value in data.model_dump(exclude_unset=True).items():
         setattr(product, key, value)
 
     session.add(product)
-    session.commit()
-    session.refresh(product)
+    if product.stock_quantity != old_stock:
+        # The new on-hand count changes what is left to reserve
+        await session.flush()
+        await rebuild_stock_shards(session, product_id)
+    await bump_catalog_version(session, product.company_id)
+    await session.commit()
+    await session.refresh(product)
 
     return product
+
+
+_products = Products.__table__
+
+
+async def upsert_products(session: AsyncSession, company_id: int, rows: list[ProductImportRow]) -> dict[str, tuple[int, bool]]:
+    """
+    Create or update a supplier's products by sku, in one INSERT ... ON
+    CONFLICT statement per call; updated products become available again.
+    Returns {sku: (product_id, created)}. Skus must be unique within rows.
+    Commits, and bumps the catalog version once for the lot.
+    """
+    if not rows:
+        return {}
+
+    skus = [row.sku for row in rows]
+    existing = {
+        row.sku: row
+        for row in (await session.exec(
+            select(Products.sku, Products.product_id, Products.stock_quantity)
+            .where(Products.company_id == company_id, Products.sku.in_(skus))
+        )).all()
+    }
+
+    statement = insert(_products)
+    columns = [name for name in ProductImportRow.model_fields if name != "sku"]
+    statement = statement.on_conflict_do_update(
+        index_elements=[_products.c.company_id, _products.c.sku],
+        set_={**{name: statement.excluded[name] for name in columns}, "is_available": True},
+    ).returning(_products.c.sku, _products.c.product_id)
+
+    upserted = (await session.exec(statement, params=[
+        {**row.model_dump(), "company_id": company_id, "is_available": True} for row in rows
+    ])).all()
+
+    # New products get their stock shards on their first order; existing
+    # ones whose stock on hand changed need theirs recomputed now
+    changed = [
+        existing[row.sku].product_id
+        for row in rows
+        if row.sku in existing and existing[row.sku].stock_quantity != row.stock_quantity
+    ]
+    await rebuild_many_stock_shards(session, changed)
+    await bump_catalog_version(session, company_id)
+    await session.commit()
+
+    return {row.sku: (row.product_id, row.sku not in existing) for row in upserted}
@@ -0,0 +1,63 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.core.config import settings
+from src.core.jwt import REFRESH_TOKEN_LIFETIME, token_digest
+from src.models.revoked_tokens import RevokedTokens
+from src.models.users import Users, UserStatus
+
+
+async def revoke_token(session: AsyncSession, token: str, claims: dict) -> None:
+    """
+    Record in the caller's transaction that token is rejected until its exp.
+    claims must come from decode_token, so only tokens this API issued are
+    recorded, and never for longer than a refresh token lives. Every worker
+    is told once the transaction commits (see src.services.token_revocations).
+    """
+    now = datetime.now(timezone.utc).timestamp()
+    expires_at = min(float(claims.get("exp", 0)), now + REFRESH_TOKEN_LIFETIME.total_seconds())
+    if expires_at <= now:
+        return
+
+    digest = token_digest(token).hex()
+    await session.exec(
+        insert(RevokedTokens)
+        .values(token_digest=digest, expires_at=datetime.fromtimestamp(expires_at, timezone.utc))
+        .on_conflict_do_nothing(index_elements=["token_digest"])
+    )
+    session.info.setdefault("token_revocations", []).append({"digest": digest, "expires_at": expires_at})
+
+
+def revoke_user(session: AsyncSession, user: Users) -> None:
+    """
+    Reject every token of user once the caller's transaction commits; it
+    must also set the user's status to suspended, which is what makes the
+    revocation durable.
+    """
+    session.info.setdefault("token_revocations", []).append({"user_id": user.user_id, "email": user.email})
+
+
+async def get_revocations(session: AsyncSession) -> tuple[list[tuple[str, datetime]], list[tuple[int, str]]]:
+    """
+    Tokens revoked and not yet expired as (digest, expires_at), latest to
+    expire first and at most JWT_REVOCATION_MAX_ENTRIES, and suspended users
+    as (user_id, email)
+    """
+    tokens = (await session.exec(
+        select(RevokedTokens.token_digest, RevokedTokens.expires_at)
+        .where(RevokedTokens.expires_at > datetime.now(timezone.utc))
+        .order_by(RevokedTokens.expires_at.desc())
+        .limit(settings.JWT_REVOCATION_MAX_ENTRIES)
+    )).all()
+    users = (await session.exec(
+        select(Users.user_id, Users.email).where(Users.status == UserStatus.suspended)
+    )).all()
+    return [tuple(row) for row in tokens], [tuple(row) for row in users]
+
+
+async def delete_expired_revocations(session: AsyncSession) -> None:
+    await session.exec(delete(RevokedTokens).where(RevokedTokens.expires_at <= datetime.now(timezone.utc)))
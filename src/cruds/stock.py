@@ -0,0 +1,258 @@
+import asyncio
+import random
+
+from sqlalchemy import bindparam, delete, func, insert, update
+from sqlalchemy.exc import DBAPIError
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.core.config import settings
+from src.cruds.catalog import bump_catalog_version
+from src.models.products import Products
+from src.models.stock import ProductStockShards, ReservationStatus, StockReservations
+
+# Products.stock_quantity is the stock on hand. What can still be promised to
+# new orders (on hand minus outstanding reservations) lives in
+# ProductStockShards, spread over several rows per product so that orders
+# for the same product don't all queue on one row lock.
+
+_shards = ProductStockShards.__table__
+
+# SQLSTATEs of deadlock_detected and lock_not_available
+_LOCK_CONFLICTS = {"40P01", "55P03"}
+
+RESERVE_ATTEMPTS = 3
+RESERVE_BACKOFF_SECONDS = 0.02
+
+_take_from_shard = (
+    update(_shards)
+    .where(_shards.c.product_id == bindparam("b_product_id"), _shards.c.shard == bindparam("b_shard"))
+    .values(quantity=_shards.c.quantity - bindparam("b_quantity"))
+)
+
+
+def _split(product_id: int, total: int, shard_count: int) -> list[dict]:
+    base, extra = divmod(total, shard_count)
+    return [
+        {"product_id": product_id, "shard": shard, "quantity": base + (1 if shard < extra else 0)}
+        for shard in range(shard_count)
+    ]
+
+
+async def _available(session: AsyncSession, product_ids: list[int]) -> dict[int, int]:
+    # Locking the product rows orders this against commit_reservations, which
+    # moves stock from reserved to shipped under the same lock
+    on_hand = dict((await session.exec(
+        select(Products.product_id, Products.stock_quantity)
+        .where(Products.product_id.in_(product_ids))
+        .order_by(Products.product_id)
+        .with_for_update()
+    )).all())
+    reserved = dict((await session.exec(
+        select(StockReservations.product_id, func.sum(StockReservations.quantity))
+        .where(StockReservations.product_id.in_(product_ids), StockReservations.status == ReservationStatus.reserved)
+        .group_by(StockReservations.product_id)
+    )).all())
+    return {product_id: quantity - reserved.get(product_id, 0) for product_id, quantity in on_hand.items()}
+
+
+async def rebuild_stock_shards(session: AsyncSession, product_id: int, shard_count: int | None = None):
+    """Recompute a product's available stock from scratch and spread it over shard_count shards"""
+    await rebuild_many_stock_shards(session, [product_id], shard_count)
+
+
+async def rebuild_many_stock_shards(session: AsyncSession, product_ids, shard_count: int | None = None):
+    """rebuild_stock_shards for several products, in a fixed number of statements"""
+    product_ids = sorted(set(product_ids))
+    if not product_ids:
+        return
+
+    # Wait for orders that are reserving from the current shards
+    await session.exec(
+        select(ProductStockShards.shard)
+        .where(ProductStockShards.product_id.in_(product_ids))
+        .order_by(ProductStockShards.product_id, ProductStockShards.shard)
+        .with_for_update()
+    )
+
+    available = await _available(session, product_ids)
+    await session.exec(delete(_shards).where(_shards.c.product_id.in_(product_ids)))
+    shards = [
+        shard
+        for product_id in sorted(available)
+        for shard in _split(product_id, available[product_id], shard_count or settings.STOCK_SHARD_COUNT)
+    ]
+    if shards:
+        await session.exec(insert(_shards), params=shards)
+
+
+async def get_available_stock(session: AsyncSession, product_ids) -> dict[int, int]:
+    """
+    What each product can still promise to new orders, without locking
+    anything; a snapshot for display, reserve_stock has the final word.
+    """
+    in_shards = (
+        select(func.sum(ProductStockShards.quantity))
+        .where(ProductStockShards.product_id == Products.product_id)
+        .scalar_subquery()
+    )
+    # Products nobody has ordered since sharding have no shards, and no reservations
+    return dict((await session.exec(
+        select(Products.product_id, func.coalesce(in_shards, Products.stock_quantity))
+        .where(Products.product_id.in_(product_ids))
+    )).all())
+
+
+def is_lock_conflict(error: DBAPIError) -> bool:
+    """A deadlock or NOWAIT lock failure: the transaction lost a race, retrying may succeed"""
+    return getattr(error.orig, "pgcode", None) in _LOCK_CONFLICTS
+
+
+async def _take_free_shards(session: AsyncSession, product_id: int, needed: int) -> list[dict]:
+    """Take from whichever shards no other order is holding right now, until needed is covered"""
+    taken: list[dict] = []
+    used: list[int] = []
+    while needed > 0:
+        row = (await session.exec(
+            select(ProductStockShards.shard, ProductStockShards.quantity)
+            .where(
+                ProductStockShards.product_id == product_id,
+                ProductStockShards.quantity > 0,
+                ProductStockShards.shard.notin_(used),
+            )
+            .order_by(func.random())
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )).first()
+        if row is None:
+            break
+
+        quantity = min(row.quantity, needed)
+        taken.append({"b_product_id": product_id, "b_shard": row.shard, "b_quantity": quantity})
+        used.append(row.shard)
+        needed -= quantity
+    return taken
+
+
+async def _take_all_shards(session: AsyncSession, product_id: int, needed: int) -> list[dict]:
+    """Wait for every shard of the product, in shard order, and take from them until needed is covered"""
+    statement = (
+        select(ProductStockShards.shard, ProductStockShards.quantity)
+        .where(ProductStockShards.product_id == product_id)
+        .order_by(ProductStockShards.shard)
+        .with_for_update()
+    )
+    rows = (await session.exec(statement)).all()
+    if not rows:
+        # First reservation for a product created before sharding
+        await rebuild_stock_shards(session, product_id)
+        rows = (await session.exec(statement)).all()
+
+    taken: list[dict] = []
+    for row in rows:
+        quantity = min(max(row.quantity, 0), needed)
+        if quantity:
+            taken.append({"b_product_id": product_id, "b_shard": row.shard, "b_quantity": quantity})
+            needed -= quantity
+        if needed == 0:
+            break
+    return taken
+
+
+async def _reserve_product(session: AsyncSession, product_id: int, needed: int) -> list[dict]:
+    """
+    Lock shards of one product covering needed units and return what to take
+    from each. Free shards are tried first. If they aren't enough, the
+    shards they locked are given back (rolling back the savepoint releases
+    them) before waiting for all of the product's shards in shard order, so
+    an order never waits for a shard while holding another shard of the
+    same product. Lock conflicts with other writers are retried.
+    """
+    for attempt in range(RESERVE_ATTEMPTS):
+        savepoint = await session.begin_nested()
+        try:
+            taken = await _take_free_shards(session, product_id, needed)
+            if sum(t["b_quantity"] for t in taken) < needed:
+                await savepoint.rollback()
+                savepoint = await session.begin_nested()
+                taken = await _take_all_shards(session, product_id, needed)
+            await savepoint.commit()
+        except DBAPIError as e:
+            await savepoint.rollback()
+            if not is_lock_conflict(e):
+                raise
+            await asyncio.sleep(RESERVE_BACKOFF_SECONDS * 2 ** attempt * (1 + random.random()))
+            continue
+
+        if sum(t["b_quantity"] for t in taken) < needed:
+            raise ValueError(f"Product {product_id} does not have enough stock")
+        return taken
+
+    raise ValueError(f"Product {product_id} is being ordered by too many others right now, try again")
+
+
+async def reserve_stock(session: AsyncSession, order_id: int, quantities: dict[int, int]):
+    """
+    Reserve quantities ({product_id: quantity}) for an order, or raise
+    ValueError if any product doesn't have enough available stock. Runs in
+    the caller's transaction; the shards taken from stay locked until it ends.
+    Products are locked in product_id order.
+    """
+    if not quantities:
+        return
+
+    taken: list[dict] = []
+    for product_id in sorted(quantities):
+        taken.extend(await _reserve_product(session, product_id, quantities[product_id]))
+
+    await session.exec(_take_from_shard, params=taken)
+    await session.exec(insert(StockReservations), params=[
+        {"order_id": order_id, "product_id": t["b_product_id"], "shard": t["b_shard"], "quantity": t["b_quantity"]}
+        for t in taken
+    ])
+
+
+async def release_reservations(session: AsyncSession, order_id: int):
+    """Return an order's outstanding reservations to the shards they came from"""
+    released = (await session.exec(
+        update(StockReservations)
+        .where(StockReservations.order_id == order_id, StockReservations.status == ReservationStatus.reserved)
+        .values(status=ReservationStatus.released)
+        .returning(StockReservations.product_id, StockReservations.shard, StockReservations.quantity)
+        .execution_options(synchronize_session=False)
+    )).all()
+
+    if released:
+        # A negative take puts the stock back
+        await session.exec(_take_from_shard, params=[
+            {"b_product_id": row.product_id, "b_shard": row.shard, "b_quantity": -row.quantity}
+            for row in sorted(released)
+        ])
+
+
+async def commit_reservations(session: AsyncSession, order_id: int):
+    """Take an order's outstanding reservations off the stock on hand; the suppliers' catalogs change with it"""
+    committed = (await session.exec(
+        update(StockReservations)
+        .where(StockReservations.order_id == order_id, StockReservations.status == ReservationStatus.reserved)
+        .values(status=ReservationStatus.committed)
+        .returning(StockReservations.product_id, StockReservations.quantity)
+        .execution_options(synchronize_session=False)
+    )).all()
+
+    shipped: dict[int, int] = {}
+    for row in committed:
+        shipped[row.product_id] = shipped.get(row.product_id, 0) + row.quantity
+
+    companies = set()
+    for product_id in sorted(shipped):
+        companies.add((await session.exec(
+            update(Products)
+            .where(Products.product_id == product_id)
+            .values(stock_quantity=Products.stock_quantity - shipped[product_id])
+            .returning(Products.company_id)
+            .execution_options(synchronize_session=False)
+        )).scalar_one())
+
+    for company_id in sorted(companies):
+        await bump_catalog_version(session, company_id)
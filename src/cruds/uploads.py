@@ -1,17 +1,20 @@
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.core.cache import company_cache
 from src.models.companies import Companies
 
 
-def store_company_url(session: Session, company_id: int, file_url: str):
+async def store_company_url(session: AsyncSession, company_id: int, file_url: str):
     stmt = select(Companies).where(Companies.company_id == company_id)
-    company = session.exec(stmt).one_or_none()
+    company = (await session.exec(stmt)).one_or_none()
 
     if not company:
         raise ValueError("Company not found")
 
     company.logo_url = file_url
     session.add(company)
-    session.commit()
-    session.refresh(company)
+    await session.commit()
+    await session.refresh(company)
+    company_cache.pop(company_id)
 
     return company
\ No newline at end of file
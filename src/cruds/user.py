@@ -1,48 +1,57 @@
-from sqlmodel import Session, select
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.core.cache import user_cache
+from src.cruds.revocations import revoke_user
 from src.core.security import hash_password
 from src.models.users import Users, UserStatus
 from src.schemas.authentication import UserSchema
 from src.schemas.update_user import UpdateUserSchema
 
-def get_user_by_email(session: Session, email: str) -> Users | None:
-    return session.exec(select(Users).where(Users.email == email)).first()
+async def get_user_by_email(session: AsyncSession, email: str) -> Users | None:
+    return (await session.exec(select(Users).where(Users.email == email))).first()
 
-def get_user_by_id(session: Session, user_id: str) -> Users | None:
-    return session.exec(select(Users).where(Users.user_id == user_id)).first()
+async def get_user_by_id(session: AsyncSession, user_id: str) -> Users | None:
+    return (await session.exec(select(Users).where(Users.user_id == user_id))).first()
 
-def get_user_by_phone(session: Session, phone_number: str):
-    return session.exec(select(Users).where(Users.phone_number == phone_number)).first()
+async def get_user_by_phone(session: AsyncSession, phone_number: str):
+    return (await session.exec(select(Users).where(Users.phone_number == phone_number))).first()
 
-def get_all_users(session: Session, company_id: int):
-    return session.exec(select(Users).where(Users.company_id == company_id)).all()
+def company_users_statement(company_id: int):
+    return select(Users).where(Users.company_id == company_id).order_by(Users.user_id)
 
-def create_user(session: Session, user: UserSchema, company_id: int) -> Users:
+async def get_all_users(session: AsyncSession, company_id: int):
+    return (await session.exec(company_users_statement(company_id))).all()
+
+async def create_user(session: AsyncSession, user: UserSchema, company_id: int) -> Users:
     user = Users(company_id=company_id, 
                        **user.model_dump(exclude={'password'}),
-                       hashed_password=hash_password(user.password))
+                       hashed_password=await hash_password(user.password))
     session.add(user)
-    session.flush()
+    await session.flush()
 
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
 
     return user
 
-def delete_user(session: Session, user: Users) -> bool:
+async def delete_user(session: AsyncSession, user: Users) -> bool:
     if user:
         user.status = UserStatus.suspended
-        session.commit()
+        revoke_user(session, user)
+        await session.commit()
+        user_cache.pop(user.user_id)
         return True
     return False
 
-def update_user(session: Session, updated_user: UpdateUserSchema, user_id: int) -> Users:
-    user = session.get(Users, user_id)
+async def update_user(session: AsyncSession, updated_user: UpdateUserSchema, user_id: int) -> Users:
+    user = await session.get(Users, user_id)
 
     for key, value in updated_user.model_dump(exclude_unset=True).items():
         setattr(user, key, value)
 
     session.add(user)
-    session.commit()
-    session.refresh(user)
+    await session.commit()
+    await session.refresh(user)
+    user_cache.pop(user_id)
 
     return user
\ No newline at end of file
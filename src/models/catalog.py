@@ -0,0 +1,17 @@
+from sqlalchemy import Column, DateTime, func
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+class CatalogVersions(SQLModel, table=True):
+    """
+    Bumped in the same transaction as every change to a company's products
+    that shows in its catalog, so (company_id, version) names one state of
+    the catalog. No row means version 0.
+    """
+    __tablename__ = "catalog_versions"
+    __mapper_args__ = {"eager_defaults": True}
+
+    company_id: int = Field(foreign_key="companies.company_id", primary_key=True, nullable=False)
+    version: int = Field(nullable=False, default=0)
+
+    updated_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False))
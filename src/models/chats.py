@@ -1,14 +1,20 @@
+from sqlalchemy import Column, DateTime, Index, func, text
 from sqlmodel import SQLModel, Field, Relationship
 from datetime import datetime
 
 class Chats(SQLModel, table=True):
     __tablename__ = "chats"
+    __table_args__ = (
+        # Only the linking's general chat (not order chats) is looked up by linking_id
+        Index("ix_chats_linking_id_general", "linking_id", postgresql_where=text("order_id IS NULL")),
+    )
+    __mapper_args__ = {"eager_defaults": True}
 
     chat_id: int | None = Field(primary_key=True, default=None)
     linking_id: int = Field(foreign_key="linkings.linking_id", nullable=False)
-    order_id: int | None = Field(foreign_key="orders.order_id", default=None, nullable=True)
+    order_id: int | None = Field(foreign_key="orders.order_id", default=None, nullable=True, index=True)
 
-    created_at: str = Field(default=datetime.now(), nullable=False)
+    created_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False))
 
     order: "Orders" = Relationship(back_populates="chats")
     linking: "Linkings" = Relationship(back_populates="chats")
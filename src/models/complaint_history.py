@@ -1,3 +1,4 @@
+from sqlalchemy import Column, DateTime, func
 from sqlmodel import SQLModel, Field, Relationship
 from datetime import datetime
 from enum import Enum
@@ -11,14 +12,15 @@ class ComplaintStatus(str, Enum):
 
 class ComplaintHistory(SQLModel, table=True):
     __tablename__ = "complaint_history"
+    __mapper_args__ = {"eager_defaults": True}
 
     history_id: int | None = Field(primary_key=True, default=None)
-    complaint_id: int = Field(foreign_key="complaints.complaint_id", nullable=False)
+    complaint_id: int = Field(foreign_key="complaints.complaint_id", nullable=False, index=True)
     changed_by_user_id: int = Field(foreign_key="users.user_id", nullable=False)
 
     new_status: ComplaintStatus = Field(nullable=False)
     notes: str | None = Field(default=None, nullable=True)
 
-    updated_at: str = Field(default=datetime.now(), nullable=False)
+    updated_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False))
 
     complaint: "Complaints" = Relationship(back_populates="history")
\ No newline at end of file
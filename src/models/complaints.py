@@ -1,3 +1,4 @@
+from sqlalchemy import Column, DateTime, func
 from sqlmodel import SQLModel, Field, Relationship
 from enum import Enum
 from datetime import datetime
@@ -11,11 +12,12 @@ class ComplaintStatus(str, Enum):
 
 class Complaints(SQLModel, table=True):
     __tablename__ = "complaints"
+    __mapper_args__ = {"eager_defaults": True}
 
     complaint_id: int | None = Field(primary_key=True, default=None)
-    order_id: int = Field(foreign_key="orders.order_id", nullable=False)
-    assigned_to_salesman_id: int = Field(foreign_key="users.user_id", nullable=False)
-    escalated_to_manager_id: int | None = Field(foreign_key="users.user_id", default=None, nullable=True)
+    order_id: int = Field(foreign_key="orders.order_id", nullable=False, index=True)
+    assigned_to_salesman_id: int = Field(foreign_key="users.user_id", nullable=False, index=True)
+    escalated_to_manager_id: int | None = Field(foreign_key="users.user_id", default=None, nullable=True, index=True)
     escalated_to_owner_id: int | None = Field(foreign_key="users.user_id", default=None, nullable=True)
 
     status: ComplaintStatus = Field(default=ComplaintStatus.open, nullable=False)
@@ -23,8 +25,8 @@ class Complaints(SQLModel, table=True):
     description: str = Field(nullable=False)
     resolution_notes: str | None = Field(default=None, nullable=True)
 
-    created_at: str = Field(default=datetime.now(), nullable=False)
-    updated_at: str = Field(default=datetime.now(), nullable=False)
+    created_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), index=True, nullable=False))
+    updated_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False))
 
     order: "Orders" = Relationship(back_populates="complaints")
     assigned_to_salesman: "Users" = Relationship(sa_relationship_kwargs={"foreign_keys": "[Complaints.assigned_to_salesman_id]"})
@@ -0,0 +1,43 @@
+from sqlalchemy import Column, DateTime, Index, func, text
+from sqlmodel import SQLModel, Field, JSON
+from enum import Enum
+from datetime import datetime
+
+class ExportFormat(str, Enum):
+    csv = "csv"
+    parquet = "parquet"
+
+class ExportStatus(str, Enum):
+    pending = "pending"
+    running = "running"
+    completed = "completed"
+    failed = "failed"
+
+class ExportJobs(SQLModel, table=True):
+    __tablename__ = "export_jobs"
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        # The export worker polls for jobs that are waiting or whose worker died
+        Index("ix_export_jobs_unfinished", "export_id", postgresql_where=text("status IN ('pending', 'running')")),
+    )
+
+    export_id: int | None = Field(primary_key=True, default=None)
+    company_id: int = Field(foreign_key="companies.company_id", nullable=False, index=True)
+    requested_by_user_id: int = Field(foreign_key="users.user_id", nullable=False)
+
+    format: ExportFormat = Field(default=ExportFormat.csv, nullable=False)
+    status: ExportStatus = Field(default=ExportStatus.pending, nullable=False)
+    # Order feed filters (cruds.order.order_feed_statement), dates as ISO strings
+    filters: dict = Field(default_factory=dict, sa_column=Column(JSON, nullable=False))
+
+    # Progress, saved after every uploaded chunk so an interrupted job resumes
+    # after the last chunk instead of starting over
+    cursor: str | None = Field(default=None, nullable=True)
+    files: list[str] = Field(default_factory=list, sa_column=Column(JSON, nullable=False))
+    row_count: int = Field(default=0, nullable=False)
+    attempts: int = Field(default=0, nullable=False)
+    error: str | None = Field(default=None, nullable=True)
+
+    created_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False))
+    heartbeat_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), nullable=True))
+    completed_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), nullable=True))
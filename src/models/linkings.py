@@ -1,3 +1,4 @@
+from sqlalchemy import Column, DateTime, func
 from sqlmodel import SQLModel, Field, Relationship  
 from enum import Enum
 from datetime import datetime
@@ -10,10 +11,11 @@ class LinkingStatus(str, Enum):
 
 class Linkings(SQLModel, table=True):
     __tablename__ = "linkings"
+    __mapper_args__ = {"eager_defaults": True}
 
     linking_id: int | None = Field(primary_key=True, default=None)
-    consumer_company_id: int = Field(foreign_key="companies.company_id", nullable=False)
-    supplier_company_id: int = Field(foreign_key="companies.company_id", nullable=False)
+    consumer_company_id: int = Field(foreign_key="companies.company_id", nullable=False, index=True)
+    supplier_company_id: int = Field(foreign_key="companies.company_id", nullable=False, index=True)
 
     requested_by_user_id: int = Field(foreign_key="users.user_id", nullable=False)
     responded_by_user_id: int | None = Field(foreign_key="users.user_id", default=None, nullable=True)
@@ -22,8 +24,8 @@ class Linkings(SQLModel, table=True):
     status: LinkingStatus = Field(default=LinkingStatus.pending, nullable=False)
     message: str | None = Field(default=None, nullable=True)
 
-    created_at: str = Field(default=datetime.now(), nullable=False)
-    updated_at: str = Field(default=datetime.now(), nullable=False)
+    created_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False))
+    updated_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False))
 
     consumer_company: "Companies" = Relationship(sa_relationship_kwargs={"foreign_keys": "[Linkings.consumer_company_id]"})
     supplier_company: "Companies" = Relationship(sa_relationship_kwargs={"foreign_keys": "[Linkings.supplier_company_id]"})
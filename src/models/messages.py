@@ -1,3 +1,4 @@
+from sqlalchemy import Column, DateTime, Index, func
 from sqlmodel import SQLModel, Field, Relationship
 from enum import Enum
 from datetime import datetime
@@ -12,13 +13,18 @@ class MessageType(str, Enum):
 
 class Messages(SQLModel, table=True):
     __tablename__ = "messages"
-    
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        # Chat history is paged by message_id within a chat
+        Index("ix_messages_chat_id_message_id", "chat_id", "message_id"),
+    )
+
     message_id: int | None = Field(primary_key=True, default=None)
     chat_id: int = Field(foreign_key="chats.chat_id", nullable=False)
     sender_id: int = Field(foreign_key="users.user_id", nullable=False)
 
     type: MessageType = Field(default=MessageType.text, nullable=False)
     body: str = Field(nullable=False)
-    sent_at: str = Field(default=datetime.now(), nullable=False)
+    sent_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), index=True, nullable=False))
 
     chat: "Chats" = Relationship(back_populates="messages")
\ No newline at end of file
@@ -4,7 +4,7 @@ class OrderProducts(SQLModel, table=True):
     __tablename__ = "order_products"
 
     order_id: int = Field(foreign_key="orders.order_id", primary_key=True, nullable=False)
-    product_id: int = Field(foreign_key="products.product_id", primary_key=True, nullable=False)
+    product_id: int = Field(foreign_key="products.product_id", primary_key=True, nullable=False, index=True)
 
     product_quantity: int = Field(nullable=False)
     product_price: int = Field(nullable=False)
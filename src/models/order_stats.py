@@ -0,0 +1,36 @@
+from sqlmodel import SQLModel, Field
+from datetime import date
+from src.models.orders import OrderStatus
+
+class OrderDailyStats(SQLModel, table=True):
+    """
+    Orders per linking, day of creation (UTC) and current status, kept up to
+    date by add_order and apply_order_status. When an order changes status
+    it moves between the rows of its creation day. Each bucket is split over
+    a few shard rows (by order_id) so concurrent orders on one linking don't
+    all wait on the same row lock; readers sum the shards.
+    """
+    __tablename__ = "order_daily_stats"
+
+    linking_id: int = Field(foreign_key="linkings.linking_id", primary_key=True, nullable=False)
+    day: date = Field(primary_key=True, nullable=False)
+    status: OrderStatus = Field(primary_key=True, nullable=False)
+    shard: int = Field(primary_key=True, nullable=False, default=0)
+
+    order_count: int = Field(nullable=False, default=0)
+    total_price: int = Field(nullable=False, default=0)
+    quantity: int = Field(nullable=False, default=0)
+
+class ProductDailyStats(SQLModel, table=True):
+    """Order lines per linking, day, status and product, for top-product reports"""
+    __tablename__ = "product_daily_stats"
+
+    linking_id: int = Field(foreign_key="linkings.linking_id", primary_key=True, nullable=False)
+    day: date = Field(primary_key=True, nullable=False)
+    status: OrderStatus = Field(primary_key=True, nullable=False)
+    product_id: int = Field(foreign_key="products.product_id", primary_key=True, nullable=False)
+    shard: int = Field(primary_key=True, nullable=False, default=0)
+
+    order_count: int = Field(nullable=False, default=0)
+    quantity: int = Field(nullable=False, default=0)
+    revenue: int = Field(nullable=False, default=0)
@@ -1,3 +1,4 @@
+from sqlalchemy import Column, DateTime, func
 from sqlmodel import SQLModel, Field, Relationship
 from enum import Enum
 from datetime import datetime
@@ -11,17 +12,18 @@ class OrderStatus(str, Enum):
 
 class Orders(SQLModel, table=True):
     __tablename__ = "orders"
+    __mapper_args__ = {"eager_defaults": True}
 
     order_id: int | None = Field(primary_key=True, default=None)
-    linking_id: int = Field(foreign_key="linkings.linking_id", nullable=False)
-    consumer_staff_id: int = Field(foreign_key= "users.user_id", nullable=False)
+    linking_id: int = Field(foreign_key="linkings.linking_id", nullable=False, index=True)
+    consumer_staff_id: int = Field(foreign_key= "users.user_id", nullable=False, index=True)
 
     total_price: int = Field(nullable=False)
 
     status: OrderStatus = Field(default=OrderStatus.created, nullable=False)
 
-    created_at: str = Field(default=datetime.now(), nullable=False)
-    updated_at: str = Field(default=datetime.now(), nullable=False)
+    created_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), index=True, nullable=False))
+    updated_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True, nullable=False))
 
     linking: "Linkings" = Relationship(back_populates="orders")
     consumer_staff: "Users" = Relationship(back_populates="orders")
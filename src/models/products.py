@@ -1,11 +1,18 @@
+from sqlalchemy import Index, cast, func, literal
+from sqlalchemy.dialects.postgresql import REGCONFIG
 from sqlmodel import SQLModel, Field, Relationship, Column, JSON
 
 class Products(SQLModel, table=True):
     __tablename__ = "products"
+    __table_args__ = (
+        # The supplier's own code for the product; bulk imports upsert on it
+        Index("ix_products_company_id_sku", "company_id", "sku", unique=True),
+    )
 
     product_id: int | None = Field(primary_key=True, default=None)
-    company_id: int | None = Field(foreign_key="companies.company_id", default=None)
+    company_id: int | None = Field(foreign_key="companies.company_id", default=None, index=True)
 
+    sku: str | None = Field(default=None, nullable=True)
     name: str = Field(nullable=False)
     description: str | None = Field(default=None, nullable=True)
 
@@ -22,4 +29,32 @@ class Products(SQLModel, table=True):
     is_available: bool = Field(nullable=False, default=True)
 
     company: "Companies" = Relationship(back_populates="products")
-    order_products: list["OrderProducts"] = Relationship(back_populates="product")
\ No newline at end of file
+    order_products: list["OrderProducts"] = Relationship(back_populates="product")
+
+
+def _constant(value):
+    return literal(value, literal_execute=True)
+
+
+def search_document(name, description):
+    """
+    What catalog search matches against: the name, weighted above the
+    description. The 'simple' configuration doesn't stem, as names come in
+    several languages. The constants are rendered inline rather than bound,
+    so queries repeat the exact expression of ix_products_search_document
+    and the planner can use it.
+    """
+    simple = cast(_constant("simple"), REGCONFIG)
+    return func.setweight(func.to_tsvector(simple, func.coalesce(name, _constant(""))), _constant("A")).op("||")(
+        func.setweight(func.to_tsvector(simple, func.coalesce(description, _constant(""))), _constant("B"))
+    )
+
+
+def search_query(query: str):
+    """tsquery for search_document, parsed with the same configuration"""
+    return func.to_tsquery(cast(_constant("simple"), REGCONFIG), query)
+
+
+# The trigram index needs the pg_trgm extension (see create_extensions)
+Index("ix_products_search_document", search_document(Products.name, Products.description), postgresql_using="gin")
+Index("ix_products_name_trgm", Products.name, postgresql_using="gin", postgresql_ops={"name": "gin_trgm_ops"})
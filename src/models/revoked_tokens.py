@@ -0,0 +1,17 @@
+from sqlalchemy import Column, DateTime, func
+from sqlmodel import SQLModel, Field
+from datetime import datetime
+
+class RevokedTokens(SQLModel, table=True):
+    """
+    Tokens rejected before their exp, e.g. on logout, by SHA-256 digest.
+    Rows are only needed until expires_at (the token's exp) and are deleted
+    after it. Suspended users need no rows here: users.status says so.
+    """
+    __tablename__ = "revoked_tokens"
+    __mapper_args__ = {"eager_defaults": True}
+
+    token_digest: str = Field(primary_key=True, nullable=False)
+    expires_at: datetime = Field(sa_column=Column(DateTime(timezone=True), nullable=False, index=True))
+
+    created_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False))
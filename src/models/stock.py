@@ -0,0 +1,40 @@
+from sqlalchemy import Column, DateTime, Index, func, text
+from sqlmodel import SQLModel, Field
+from enum import Enum
+from datetime import datetime
+
+class ReservationStatus(str, Enum):
+    reserved = "reserved"
+    committed = "committed"
+    released = "released"
+
+class ProductStockShards(SQLModel, table=True):
+    """
+    Stock that can still be promised to new orders, split over several rows
+    per product so concurrent orders for the same product lock different rows
+    """
+    __tablename__ = "product_stock_shards"
+
+    product_id: int = Field(foreign_key="products.product_id", primary_key=True, nullable=False)
+    shard: int = Field(primary_key=True, nullable=False)
+
+    quantity: int = Field(nullable=False, default=0)
+
+class StockReservations(SQLModel, table=True):
+    __tablename__ = "stock_reservations"
+    __mapper_args__ = {"eager_defaults": True}
+    __table_args__ = (
+        # Outstanding reservations are summed per product when shards are (re)built
+        Index("ix_stock_reservations_product_id_reserved", "product_id", postgresql_where=text("status = 'reserved'")),
+    )
+
+    reservation_id: int | None = Field(primary_key=True, default=None)
+    order_id: int = Field(foreign_key="orders.order_id", nullable=False, index=True)
+    product_id: int = Field(foreign_key="products.product_id", nullable=False)
+    shard: int = Field(nullable=False)
+
+    quantity: int = Field(nullable=False)
+    status: ReservationStatus = Field(default=ReservationStatus.reserved, nullable=False)
+
+    created_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False))
+    updated_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False))
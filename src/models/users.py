@@ -1,3 +1,4 @@
+from sqlalchemy import Column, DateTime, func
 from sqlmodel import SQLModel, Field, Relationship
 from enum import Enum
 from datetime import datetime
@@ -18,9 +19,10 @@ class Locale(str, Enum):
 
 class Users(SQLModel, table=True):
     __tablename__ = "users"
+    __mapper_args__ = {"eager_defaults": True}
 
     user_id: int | None = Field(primary_key=True, default=None)
-    company_id: int = Field(foreign_key="companies.company_id", default=None)
+    company_id: int = Field(foreign_key="companies.company_id", default=None, index=True)
 
     status: UserStatus = Field(default=UserStatus.active, nullable=False)
     first_name: str = Field(nullable=False)
@@ -31,7 +33,7 @@ class Users(SQLModel, table=True):
     hashed_password: str = Field(nullable=False)
     role: UserRole = Field(nullable=False)
 
-    created_at: str = Field(default=datetime.now() ,nullable=False)
+    created_at: datetime | None = Field(default=None, sa_column=Column(DateTime(timezone=True), server_default=func.now(), nullable=False))
     locale: Locale = Field(default=Locale.en, nullable=False)
 
     company: "Companies" = Relationship(back_populates="users")
@@ -8,6 +8,8 @@ from src.routes.linkings import router as linkings_router
 from src.routes.order import router as order_router
 from src.routes.chat import router as chat_router
 from src.routes.complaint import router as complaint_router
+from src.routes.metrics import router as metrics_router
+from src.routes.exports import router as exports_router
 from fastapi import APIRouter
 
 router = APIRouter()
@@ -21,3 +23,5 @@ router.include_router(linkings_router)
 router.include_router(order_router)
 router.include_router(chat_router)
 router.include_router(complaint_router)
+router.include_router(metrics_router)
+router.include_router(exports_router)
@@ -1,61 +1,92 @@
-from datetime import timedelta
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlmodel import Session
+from fastapi.security import HTTPAuthorizationCredentials
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.core.database import get_session
+from src.core.database import get_async_session
 from src.cruds.authentication import create_company_with_owner, authenticate_user
 from src.cruds.user import get_user_by_phone, get_user_by_email
 from src.schemas.authentication import UserCompanySchema, UserLoginSchema
-from src.core.jwt import create_token, decode_token
+from src.models.users import Users
+from src.core.jwt import REFRESH_TOKEN_LIFETIME, create_token, decode_token
+from src.cruds.revocations import revoke_token
+from src.core.security import security, check_access_token
 
 
 router = APIRouter(prefix="/auth", tags=["Authentication"])
 
+
+def token_claims(user: Users) -> dict:
+    # user_id / company_id let get_current_user skip the lookup by email
+    return {"sub": user.email, "user_id": user.user_id, "company_id": user.company_id}
+
+
 @router.post("/register", response_model=dict)
-async def register_company_with_owner(data: UserCompanySchema, session: Session = Depends(get_session)):
-    user = get_user_by_email(session, data.user.email)
+async def register_company_with_owner(data: UserCompanySchema, session: AsyncSession = Depends(get_async_session)):
+    user = await get_user_by_email(session, data.user.email)
 
     if user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="User with this email already exists")
     
-    user = get_user_by_phone(session, data.user.phone_number)
+    user = await get_user_by_phone(session, data.user.phone_number)
 
     if user:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="User with this phone number already exists")
 
     try:
-        user = create_company_with_owner(session, data)
-        access_token = create_token(data={"sub": user.email})
-        refresh_token = create_token(data={"sub": user.email}, expires_delta=timedelta(days=7), refresh=True)
+        user = await create_company_with_owner(session, data)
+        access_token = create_token(data=token_claims(user))
+        refresh_token = create_token(data=token_claims(user), expires_delta=REFRESH_TOKEN_LIFETIME, refresh=True)
         return {"company_id": user.company_id, "access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
 @router.post("/login", response_model=dict)
-async def login_user(data: UserLoginSchema, session: Session = Depends(get_session)):
-    user = authenticate_user(session, data.email, data.password)
+async def login_user(data: UserLoginSchema, session: AsyncSession = Depends(get_async_session)):
+    user = await authenticate_user(session, data.email, data.password)
 
     if not user:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
-    access_token = create_token(data={"sub": user.email})
-    refresh_token = create_token(data={"sub": user.email}, expires_delta=timedelta(days=7), refresh=True)
+    access_token = create_token(data=token_claims(user))
+    refresh_token = create_token(data=token_claims(user), expires_delta=REFRESH_TOKEN_LIFETIME, refresh=True)
 
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
 @router.post("/refresh", response_model=dict)
-async def refresh_token(refresh_token: str, session: Session = Depends(get_session)):
+async def refresh_token(refresh_token: str, session: AsyncSession = Depends(get_async_session)):
     try:
         decoded = decode_token(refresh_token, refresh=True)
         email = decoded.get("sub")
-        user = get_user_by_email(session, email)
+        user = await get_user_by_email(session, email)
         if not user:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
     
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
     
-    access_token = create_token(data={"sub": user.email})
+    access_token = create_token(data=token_claims(user))
     
-    return {"access_token": access_token, "token_type": "bearer"}
\ No newline at end of file
+    return {"access_token": access_token, "token_type": "bearer"}
+
+@router.post("/logout", response_model=dict)
+async def logout_user(refresh_token: str | None = None, credentials: HTTPAuthorizationCredentials = Depends(security), session: AsyncSession = Depends(get_async_session)):
+    claims = check_access_token(credentials)
+
+    refresh_claims = None
+    if refresh_token:
+        try:
+            refresh_claims = decode_token(refresh_token, refresh=True)
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=str(e))
+        if refresh_claims.get("sub") != claims.get("sub") or refresh_claims.get("user_id") != claims.get("user_id"):
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Refresh token belongs to another user")
+
+    await revoke_token(session, credentials.credentials, claims)
+    if refresh_claims:
+        await revoke_token(session, refresh_token, refresh_claims)
+    await session.commit()
+
+    return {"message": "Logged out"}
@@ -1,25 +1,29 @@
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, HTTPException, Depends
-from sqlmodel import Session
-from typing import Dict
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import Optional
 import json
 
-from src.core.database import get_session
+from src.core.database import get_async_session
+from src.core.replicas import get_read_session
 from src.core.jwt import decode_token
-from src.core.security import check_access_token
-from src.cruds.user import get_user_by_email
+from src.core.dependencies import CurrentUser, get_current_user, resolve_current_user
 from src.cruds.chat import (
     get_or_create_chat_for_linking,
-    create_message,
     check_user_can_chat
 )
 from src.models.messages import MessageType
 from src.schemas.chat import ChatHistoryResponse
+from src.services.chat_hub import (
+    LINKING_CHANNEL,
+    ORDER_CHANNEL,
+    linking_connections,
+    order_connections,
+    publish
+)
+from src.services.message_writer import message_writer
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-# Store active WebSocket connections: {linking_id: {user_id: websocket}}
-active_connections: Dict[int, Dict[int, WebSocket]] = {}
-
 
 def verify_websocket_token(token: str) -> dict:
     try:
@@ -29,35 +33,18 @@ def verify_websocket_token(token: str) -> dict:
         raise HTTPException(status_code=401, detail=f"Invalid token: {str(e)}")
 
 
-async def connect_websocket(websocket: WebSocket, linking_id: int, user_id: int):
-    if linking_id not in active_connections:
-        active_connections[linking_id] = {}
-    active_connections[linking_id][user_id] = websocket
-
-
-async def disconnect_websocket(linking_id: int, user_id: int):
-    if linking_id in active_connections:
-        active_connections[linking_id].pop(user_id, None)
-        if not active_connections[linking_id]:
-            del active_connections[linking_id]
+def next_cursor(messages: list, limit: int, after_id: int | None) -> int | None:
+    """Cursor for the following page, None once the end has been reached"""
+    if not messages or len(messages) < limit:
+        return None
+    # Pages are newest-first: scrolling back continues from the oldest
+    # message, catching up (after_id) from the newest one
+    return messages[0].message_id if after_id is not None else messages[-1].message_id
 
 
 async def broadcast_message(linking_id: int, message_data: dict, exclude_user_id: int = None):
-    if linking_id not in active_connections:
-        return
-    
-    message_json = json.dumps(message_data)
-    disconnected_users = []
-    
-    for user_id, connection in active_connections[linking_id].items():
-        if user_id != exclude_user_id:
-            try:
-                await connection.send_text(message_json)
-            except Exception:
-                disconnected_users.append(user_id)
-    
-    for user_id in disconnected_users:
-        await disconnect_websocket(linking_id, user_id)
+    # Goes through the broker so sockets connected to other workers get it too
+    await publish(LINKING_CHANNEL, linking_id, message_data, exclude_user_id)
 
 
 @router.websocket("/ws/{linking_id}")
@@ -75,89 +62,87 @@ async def websocket_chat(websocket: WebSocket, linking_id: int):
             await websocket.close(code=1008, reason="Invalid token")
             return
 
-        from src.core.database import engine
-        with Session(engine) as session:
-            user = get_user_by_email(session, email)
-            
-            if not user:
-                await websocket.close(code=1008, reason="User not found")
-                return
+        from src.core.database import async_session_maker
+        async with async_session_maker() as session:
+            user = (await resolve_current_user(session, decoded_token)).user
             
 
-            if not check_user_can_chat(session, user.user_id, linking_id):
+            if not await check_user_can_chat(session, user.user_id, linking_id):
                 await websocket.close(code=1008, reason="Access denied: You are not authorized to chat in this linking")
                 return
             
-            chat = get_or_create_chat_for_linking(session, linking_id)
-            
-            await websocket.accept()
+            chat = await get_or_create_chat_for_linking(session, linking_id)
             
-            await connect_websocket(websocket, linking_id, user.user_id)
-            
-            await websocket.send_json({
-                "type": "connection",
-                "message": "Connected to chat",
-                "chat_id": chat.chat_id,
-                "linking_id": linking_id
-            })
-            
-            try:
-                while True:
+        # The setup session is closed here so the socket doesn't pin a pooled
+        # connection for its whole lifetime
+        await websocket.accept()
+        
+        # Everything sent after this point goes through the client's outbound queue
+        client = linking_connections.connect(linking_id, user.user_id, websocket)
+        
+        client.send({
+            "type": "connection",
+            "message": "Connected to chat",
+            "chat_id": chat.chat_id,
+            "linking_id": linking_id
+        })
+        
+        try:
+            while True:
 
-                    data = await websocket.receive_text()
-                    message_data = json.loads(data)
-                    
-                    body = message_data.get("body", "").strip()
-                    if not body:
-                        await websocket.send_json({
-                            "type": "error",
-                            "message": "Message body cannot be empty"
-                        })
-                        continue
-                    
-                    message_type_str = message_data.get("type", "text")
-                    try:
-                        message_type = MessageType(message_type_str)
-                    except ValueError:
-                        message_type = MessageType.text
-                    
-                    with Session(engine) as msg_session:
-                        message = create_message(
-                            msg_session,
-                            chat.chat_id,
-                            user.user_id,
-                            body,
-                            message_type
-                        )
-                        
-                        broadcast_data = {
-                            "type": "message",
-                            "message_id": message.message_id,
-                            "chat_id": message.chat_id,
-                            "sender_id": message.sender_id,
-                            "sender_name": f"{user.first_name} {user.last_name}",
-                            "body": message.body,
-                            "message_type": message.type,
-                            "sent_at": message.sent_at
-                        }
-                        
-                        await broadcast_message(linking_id, broadcast_data, exclude_user_id=user.user_id)
-                        
-                        await websocket.send_json({
-                            "type": "message_sent",
-                            "message_id": message.message_id,
-                            "sent_at": message.sent_at
-                        })
-                    
-            except WebSocketDisconnect:
-                await disconnect_websocket(linking_id, user.user_id)
-            except Exception as e:
-                await websocket.send_json({
-                    "type": "error",
-                    "message": f"Error processing message: {str(e)}"
+                data = await websocket.receive_text()
+                message_data = json.loads(data)
+                
+                body = message_data.get("body", "").strip()
+                if not body:
+                    client.send({
+                        "type": "error",
+                        "message": "Message body cannot be empty"
+                    })
+                    continue
+                
+                message_type_str = message_data.get("type", "text")
+                try:
+                    message_type = MessageType(message_type_str)
+                except ValueError:
+                    message_type = MessageType.text
+                
+                message = await message_writer.write(
+                    chat.chat_id,
+                    user.user_id,
+                    body,
+                    message_type
+                )
+                
+                broadcast_data = {
+                    "type": "message",
+                    "message_id": message.message_id,
+                    "chat_id": message.chat_id,
+                    "sender_id": message.sender_id,
+                    "sender_name": f"{user.first_name} {user.last_name}",
+                    "body": message.body,
+                    "message_type": message.type,
+                    "sent_at": message.sent_at.isoformat()
+                }
+                
+                await broadcast_message(linking_id, broadcast_data, exclude_user_id=user.user_id)
+                
+                client.send({
+                    "type": "message_sent",
+                    "message_id": message.message_id,
+                    "sent_at": message.sent_at.isoformat()
                 })
-                await disconnect_websocket(linking_id, user.user_id)
                 
+        except WebSocketDisconnect:
+            linking_connections.disconnect(linking_id, user.user_id, client)
+        except Exception as e:
+            client.send({
+                "type": "error",
+                "message": f"Error processing message: {str(e)}"
+            })
+            linking_connections.disconnect(linking_id, user.user_id, client)
+            await client.wait_closed()
+            
     except HTTPException as e:
         await websocket.close(code=1008, reason=str(e.detail))
     except Exception as e:
@@ -169,22 +154,29 @@ async def get_chat_messages(
     linking_id: int,
     limit: int = 100,
     offset: int = 0,
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session),
+    primary_session: AsyncSession = Depends(get_async_session)
 ):
-    from src.cruds.chat import get_messages_for_chat, get_or_create_chat_for_linking, check_user_can_chat
+    from src.cruds.chat import get_messages_for_chat, get_chat_for_linking, get_or_create_chat_for_linking, check_user_can_chat
     from fastapi import HTTPException
     
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    if not check_user_can_chat(session, user_obj.user_id, linking_id):
+    user_obj = current_user.user
+
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id, not both")
+
+    if not await check_user_can_chat(session, user_obj.user_id, linking_id):
         raise HTTPException(status_code=403, detail="Access denied: You are not authorized to access this chat")
     
-    chat = get_or_create_chat_for_linking(session, linking_id)
+    chat = await get_chat_for_linking(session, linking_id)
+    if not chat:
+        # First look at this linking's chat: create it on the primary
+        chat = await get_or_create_chat_for_linking(primary_session, linking_id)
     
-    messages = get_messages_for_chat(session, chat.chat_id, limit, offset)
+    messages = await get_messages_for_chat(session, chat.chat_id, limit, offset, before_id, after_id)
     
     return {
         "chat_id": chat.chat_id,
@@ -200,44 +192,14 @@ async def get_chat_messages(
             for msg in messages
         ],
         "limit": limit,
-        "offset": offset
+        "offset": offset,
+        "next_cursor": next_cursor(messages, limit, after_id)
     }
 
 
 # Order chat endpoints
-# Store active WebSocket connections for order chats: {order_id: {user_id: websocket}}
-active_order_connections: Dict[int, Dict[int, WebSocket]] = {}
-
-
-async def connect_order_websocket(websocket: WebSocket, order_id: int, user_id: int):
-    if order_id not in active_order_connections:
-        active_order_connections[order_id] = {}
-    active_order_connections[order_id][user_id] = websocket
-
-
-async def disconnect_order_websocket(order_id: int, user_id: int):
-    if order_id in active_order_connections:
-        active_order_connections[order_id].pop(user_id, None)
-        if not active_order_connections[order_id]:
-            del active_order_connections[order_id]
-
-
 async def broadcast_order_message(order_id: int, message_data: dict, exclude_user_id: int = None):
-    if order_id not in active_order_connections:
-        return
-    
-    message_json = json.dumps(message_data)
-    disconnected_users = []
-    
-    for user_id, connection in active_order_connections[order_id].items():
-        if user_id != exclude_user_id:
-            try:
-                await connection.send_text(message_json)
-            except Exception:
-                disconnected_users.append(user_id)
-    
-    for user_id in disconnected_users:
-        await disconnect_order_websocket(order_id, user_id)
+    await publish(ORDER_CHANNEL, order_id, message_data, exclude_user_id)
 
 
 @router.websocket("/ws/order/{order_id}")
@@ -255,92 +217,90 @@ async def websocket_order_chat(websocket: WebSocket, order_id: int):
             await websocket.close(code=1008, reason="Invalid token")
             return
 
-        from src.core.database import engine
+        from src.core.database import async_session_maker
         from src.cruds.chat import get_chat_for_order, check_user_can_access_order_chat
         
-        with Session(engine) as session:
-            user = get_user_by_email(session, email)
-            
-            if not user:
-                await websocket.close(code=1008, reason="User not found")
-                return
+        async with async_session_maker() as session:
+            user = (await resolve_current_user(session, decoded_token)).user
             
-            if not check_user_can_access_order_chat(session, user.user_id, order_id):
+            if not await check_user_can_access_order_chat(session, user.user_id, order_id):
                 await websocket.close(code=1008, reason="Access denied: You are not authorized to chat in this order")
                 return
             
-            chat = get_chat_for_order(session, order_id)
+            chat = await get_chat_for_order(session, order_id)
             if not chat:
                 await websocket.close(code=1008, reason="Order chat not found")
                 return
             
-            await websocket.accept()
-            
-            await connect_order_websocket(websocket, order_id, user.user_id)
-            
-            await websocket.send_json({
-                "type": "connection",
-                "message": "Connected to order chat",
-                "chat_id": chat.chat_id,
-                "order_id": order_id
-            })
-            
-            try:
-                while True:
-                    data = await websocket.receive_text()
-                    message_data = json.loads(data)
-                    
-                    body = message_data.get("body", "").strip()
-                    if not body:
-                        await websocket.send_json({
-                            "type": "error",
-                            "message": "Message body cannot be empty"
-                        })
-                        continue
-                    
-                    message_type_str = message_data.get("type", "text")
-                    try:
-                        message_type = MessageType(message_type_str)
-                    except ValueError:
-                        message_type = MessageType.text
-                    
-                    with Session(engine) as msg_session:
-                        message = create_message(
-                            msg_session,
-                            chat.chat_id,
-                            user.user_id,
-                            body,
-                            message_type
-                        )
-                        
-                        broadcast_data = {
-                            "type": "message",
-                            "message_id": message.message_id,
-                            "chat_id": message.chat_id,
-                            "sender_id": message.sender_id,
-                            "sender_name": f"{user.first_name} {user.last_name}",
-                            "body": message.body,
-                            "message_type": message.type,
-                            "sent_at": message.sent_at
-                        }
-                        
-                        await broadcast_order_message(order_id, broadcast_data, exclude_user_id=user.user_id)
-                        
-                        await websocket.send_json({
-                            "type": "message_sent",
-                            "message_id": message.message_id,
-                            "sent_at": message.sent_at
-                        })
-                    
-            except WebSocketDisconnect:
-                await disconnect_order_websocket(order_id, user.user_id)
-            except Exception as e:
-                await websocket.send_json({
-                    "type": "error",
-                    "message": f"Error processing message: {str(e)}"
+        # The setup session is closed here so the socket doesn't pin a pooled
+        # connection for its whole lifetime
+        await websocket.accept()
+        
+        # Everything sent after this point goes through the client's outbound queue
+        client = order_connections.connect(order_id, user.user_id, websocket)
+        
+        client.send({
+            "type": "connection",
+            "message": "Connected to order chat",
+            "chat_id": chat.chat_id,
+            "order_id": order_id
+        })
+        
+        try:
+            while True:
+                data = await websocket.receive_text()
+                message_data = json.loads(data)
+                
+                body = message_data.get("body", "").strip()
+                if not body:
+                    client.send({
+                        "type": "error",
+                        "message": "Message body cannot be empty"
+                    })
+                    continue
+                
+                message_type_str = message_data.get("type", "text")
+                try:
+                    message_type = MessageType(message_type_str)
+                except ValueError:
+                    message_type = MessageType.text
+                
+                message = await message_writer.write(
+                    chat.chat_id,
+                    user.user_id,
+                    body,
+                    message_type
+                )
+                
+                broadcast_data = {
+                    "type": "message",
+                    "message_id": message.message_id,
+                    "chat_id": message.chat_id,
+                    "sender_id": message.sender_id,
+                    "sender_name": f"{user.first_name} {user.last_name}",
+                    "body": message.body,
+                    "message_type": message.type,
+                    "sent_at": message.sent_at.isoformat()
+                }
+                
+                await broadcast_order_message(order_id, broadcast_data, exclude_user_id=user.user_id)
+                
+                client.send({
+                    "type": "message_sent",
+                    "message_id": message.message_id,
+                    "sent_at": message.sent_at.isoformat()
                 })
-                await disconnect_order_websocket(order_id, user.user_id)
                 
+        except WebSocketDisconnect:
+            order_connections.disconnect(order_id, user.user_id, client)
+        except Exception as e:
+            client.send({
+                "type": "error",
+                "message": f"Error processing message: {str(e)}"
+            })
+            order_connections.disconnect(order_id, user.user_id, client)
+            await client.wait_closed()
+            
     except HTTPException as e:
         await websocket.close(code=1008, reason=str(e.detail))
     except Exception as e:
@@ -352,24 +312,27 @@ async def get_order_chat_messages(
     order_id: int,
     limit: int = 100,
     offset: int = 0,
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
 ):
     from src.cruds.chat import get_messages_for_chat, get_chat_for_order, check_user_can_access_order_chat
     from fastapi import HTTPException
     
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    if not check_user_can_access_order_chat(session, user_obj.user_id, order_id):
+    user_obj = current_user.user
+
+    if before_id is not None and after_id is not None:
+        raise HTTPException(status_code=400, detail="Use either before_id or after_id, not both")
+
+    if not await check_user_can_access_order_chat(session, user_obj.user_id, order_id):
         raise HTTPException(status_code=403, detail="Access denied: You are not authorized to access this order chat")
     
-    chat = get_chat_for_order(session, order_id)
+    chat = await get_chat_for_order(session, order_id)
     if not chat:
         raise HTTPException(status_code=404, detail="Order chat not found")
     
-    messages = get_messages_for_chat(session, chat.chat_id, limit, offset)
+    messages = await get_messages_for_chat(session, chat.chat_id, limit, offset, before_id, after_id)
     
     return {
         "chat_id": chat.chat_id,
@@ -385,5 +348,6 @@ async def get_order_chat_messages(
             for msg in messages
         ],
         "limit": limit,
-        "offset": offset
+        "offset": offset,
+        "next_cursor": next_cursor(messages, limit, after_id)
     }
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.core.database import get_session
+from src.core.database import get_async_session
 from src.cruds.city import get_all_cities
 from src.core.security import check_access_token
 
@@ -9,8 +9,8 @@ from src.core.security import check_access_token
 router = APIRouter(prefix="/cities", tags=["Cities"])
 
 @router.get("/get-all-cities")
-async def get_cities(session: Session = Depends(get_session)):
-    cities = get_all_cities(session)
+async def get_cities(session: AsyncSession = Depends(get_async_session)):
+    cities = await get_all_cities(session)
 
     if not cities:
         raise HTTPException(status_code=404, detail="No cities found")
@@ -1,18 +1,18 @@
 from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.core.database import get_session
+from src.core.database import get_async_session
 from src.core.security import check_access_token
+from src.core.dependencies import CurrentUser, get_current_user
 from src.cruds.company import get_company_by_id, get_all_companies, update_company
-from src.cruds.user import get_user_by_email
 from src.schemas.company import UpdateCompany
 from src.models.users import UserRole
 
 router = APIRouter(prefix="/company", tags=["Company"])
 
 @router.get("/get-company")
-async def get_company(company_id: int, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    company = get_company_by_id(session, company_id)
+async def get_company(company_id: int, user: str = Depends(check_access_token), session: AsyncSession = Depends(get_async_session)):
+    company = await get_company_by_id(session, company_id)
 
     if not company:
         raise HTTPException(status_code=404, detail="Company not found")
@@ -21,14 +21,14 @@ async def get_company(company_id: int, user: str = Depends(check_access_token),
 
 
 @router.get("/")
-async def get_companis(user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    user = get_user_by_email(session, user['sub'])
-    company = get_company_by_id(session, user.company_id)
+async def get_companis(current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    user = current_user.user
+    company = current_user.company
 
     if company.company_type != "consumer":
         return HTTPException(status_code=403, detail="Not enough rights")
     
-    companies = get_all_companies(session)
+    companies = await get_all_companies(session)
 
     return {"companies": companies}
 
@@ -37,20 +37,17 @@ async def get_companis(user: str = Depends(check_access_token), session: Session
 async def update_company_route(
     company_id: int,
     update_data: UpdateCompany,
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     Update company information. Only the owner of the company can update it.
     """
     # Get the authenticated user
-    user_obj = get_user_by_email(session, user['sub'])
-    
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+    user_obj = current_user.user
+
     # Check if the company exists
-    company = get_company_by_id(session, company_id)
+    company = await get_company_by_id(session, company_id)
     if not company:
         raise HTTPException(status_code=404, detail="Company not found")
     
@@ -69,7 +66,7 @@ async def update_company_route(
         )
     
     # Update the company
-    updated_company = update_company(session, company_id, update_data)
+    updated_company = await update_company(session, company_id, update_data)
     
     if not updated_company:
         raise HTTPException(status_code=500, detail="Failed to update company")
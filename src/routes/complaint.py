@@ -1,9 +1,10 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import Session
+from fastapi import APIRouter, HTTPException, Depends, Request
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.core.database import get_session
-from src.core.security import check_access_token
-from src.cruds.user import get_user_by_email
+from src.core.database import get_async_session
+from src.core.replicas import get_read_session, read_session_maker
+from src.core.dependencies import CurrentUser, get_current_user
+from src.core.streaming import ndjson_response, wants_stream
 from src.cruds.complaint import (
     create_complaint,
     get_complaint_by_id,
@@ -12,6 +13,7 @@ from src.cruds.complaint import (
     get_escalated_complaints,
     get_complaints_for_manager,
     get_all_complaints_for_company,
+    company_complaints_statement,
     escalate_complaint,
     claim_complaint,
     resolve_complaint,
@@ -31,8 +33,8 @@ router = APIRouter(prefix="/complaints", tags=["Complaints"])
 async def create_complaint_for_order(
     order_id: int,
     complaint_data: CreateComplaint,
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     **Create a complaint for a specific order.**
@@ -55,12 +57,10 @@ async def create_complaint_for_order(
     - `403 Forbidden`: If the user is not the creator of the order.
     - `400 Bad Request`: If there is a validation error (e.g., order not found, no salesman assigned).
     """
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+    user_obj = current_user.user
+
     # Check if order exists
-    order = get_order_by_id(order_id, session)
+    order = await get_order_by_id(order_id, session)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
@@ -72,7 +72,7 @@ async def create_complaint_for_order(
         )
     
     try:
-        complaint, message = create_complaint(session, order_id, user_obj.user_id, complaint_data)
+        complaint, message = await create_complaint(session, order_id, user_obj.user_id, complaint_data)
         
         # Broadcast system message
         if message:
@@ -85,7 +85,7 @@ async def create_complaint_for_order(
                 "sender_name": f"{user_obj.first_name} {user_obj.last_name}",
                 "body": message.body,
                 "message_type": message.type,
-                "sent_at": message.sent_at
+                "sent_at": message.sent_at.isoformat()
             }
             await broadcast_order_message(order_id, broadcast_data)
             
@@ -99,8 +99,8 @@ async def create_complaint_for_order(
 
 @router.get("/my-complaints")
 async def get_my_complaints(
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
 ):
     """
     **Get all complaints created by the current user.**
@@ -116,11 +116,9 @@ async def get_my_complaints(
     **Raises:**
     - `404 Not Found`: If the user does not exist.
     """
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    complaints = get_complaints_for_consumer(session, user_obj.user_id)
+    user_obj = current_user.user
+
+    complaints = await get_complaints_for_consumer(session, user_obj.user_id)
     
     return {
         "complaints": complaints
@@ -129,8 +127,8 @@ async def get_my_complaints(
 
 @router.get("/assigned-to-me")
 async def get_assigned_complaints(
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
 ):
     """
     **Get complaints assigned to the current salesman.**
@@ -148,17 +146,15 @@ async def get_assigned_complaints(
     - `404 Not Found`: If the user does not exist.
     - `403 Forbidden`: If the user does not have the required role.
     """
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+    user_obj = current_user.user
+
     if user_obj.role not in [UserRole.staff, UserRole.manager, UserRole.owner]:
         raise HTTPException(
             status_code=403,
             detail="Only staff members can view assigned complaints"
         )
     
-    complaints = get_complaints_for_salesman(session, user_obj.user_id)
+    complaints = await get_complaints_for_salesman(session, user_obj.user_id)
     
     return {
         "complaints": complaints
@@ -167,8 +163,8 @@ async def get_assigned_complaints(
 
 @router.get("/escalated")
 async def get_escalated_complaints_list(
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
 ):
     """
     **Get a list of escalated complaints (Manager Pool).**
@@ -185,17 +181,15 @@ async def get_escalated_complaints_list(
     - `404 Not Found`: If the user does not exist.
     - `403 Forbidden`: If the user is not a manager or owner.
     """
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+    user_obj = current_user.user
+
     if user_obj.role not in [UserRole.manager, UserRole.owner]:
         raise HTTPException(
             status_code=403,
             detail="Only managers can view escalated complaints"
         )
     
-    complaints = get_escalated_complaints(session)
+    complaints = await get_escalated_complaints(session)
     
     return {
         "complaints": complaints
@@ -204,8 +198,8 @@ async def get_escalated_complaints_list(
 
 @router.get("/my-managed-complaints")
 async def get_my_managed_complaints(
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
 ):
     """
     **Get complaints managed by the current manager.**
@@ -222,17 +216,15 @@ async def get_my_managed_complaints(
     - `404 Not Found`: If the user does not exist.
     - `403 Forbidden`: If the user is not a manager or owner.
     """
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+    user_obj = current_user.user
+
     if user_obj.role not in [UserRole.manager, UserRole.owner]:
         raise HTTPException(
             status_code=403,
             detail="Only managers can view managed complaints"
         )
     
-    complaints = get_complaints_for_manager(session, user_obj.user_id)
+    complaints = await get_complaints_for_manager(session, user_obj.user_id)
     
     return {
         "complaints": complaints
@@ -241,8 +233,10 @@ async def get_my_managed_complaints(
 
 @router.get("/company")
 async def get_company_complaints(
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    request: Request,
+    stream: bool = False,
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
 ):
     """
     **Get all complaints related to the user's company.**
@@ -259,17 +253,18 @@ async def get_company_complaints(
     - `404 Not Found`: If the user does not exist.
     - `403 Forbidden`: If the user is not an owner.
     """
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+    user_obj = current_user.user
+
     if user_obj.role != UserRole.owner:
         raise HTTPException(
             status_code=403,
             detail="Only owners can view all company complaints"
         )
     
-    complaints = get_all_complaints_for_company(session, user_obj.company_id)
+    if wants_stream(request, stream):
+        return ndjson_response(company_complaints_statement(user_obj.company_id), session_maker=read_session_maker(request))
+
+    complaints = await get_all_complaints_for_company(session, user_obj.company_id)
     
     return {
         "complaints": complaints
@@ -279,8 +274,8 @@ async def get_company_complaints(
 @router.get("/{complaint_id}")
 async def get_complaint_details(
     complaint_id: int,
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
 ):
     """
     **Get details of a specific complaint.**
@@ -303,18 +298,16 @@ async def get_complaint_details(
     - `404 Not Found`: If the user or complaint does not exist.
     - `403 Forbidden`: If the user does not have permission to view the complaint.
     """
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+    user_obj = current_user.user
+
     # Check if user can access this complaint
-    if not check_user_can_access_complaint(session, user_obj.user_id, complaint_id):
+    if not await check_user_can_access_complaint(session, user_obj.user_id, complaint_id):
         raise HTTPException(
             status_code=403,
             detail="You don't have permission to view this complaint"
         )
     
-    complaint = get_complaint_by_id(session, complaint_id)
+    complaint = await get_complaint_by_id(session, complaint_id)
     if not complaint:
         raise HTTPException(status_code=404, detail="Complaint not found")
     
@@ -326,8 +319,8 @@ async def get_complaint_details(
 @router.get("/{complaint_id}/history")
 async def get_complaint_history_route(
     complaint_id: int,
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
 ):
     """
     **Get the history of a complaint.**
@@ -347,18 +340,16 @@ async def get_complaint_history_route(
     - `404 Not Found`: If the user does not exist.
     - `403 Forbidden`: If the user does not have permission to view the complaint.
     """
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+    user_obj = current_user.user
+
     # Check if user can access this complaint
-    if not check_user_can_access_complaint(session, user_obj.user_id, complaint_id):
+    if not await check_user_can_access_complaint(session, user_obj.user_id, complaint_id):
         raise HTTPException(
             status_code=403,
             detail="You don't have permission to view this complaint"
         )
     
-    history = get_complaint_history(session, complaint_id)
+    history = await get_complaint_history(session, complaint_id)
     
     return {
         "complaint_id": complaint_id,
@@ -370,8 +361,8 @@ async def get_complaint_history_route(
 async def escalate_complaint_route(
     complaint_id: int,
     update_data: UpdateComplaintStatus,
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     **Escalate a complaint to a manager.**
@@ -394,11 +385,9 @@ async def escalate_complaint_route(
     - `403 Forbidden`: If the user is not the assigned salesman.
     - `400 Bad Request`: If the complaint is not in `open` status or other validation errors.
     """
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    complaint = get_complaint_by_id(session, complaint_id)
+    user_obj = current_user.user
+
+    complaint = await get_complaint_by_id(session, complaint_id)
     if not complaint:
         raise HTTPException(status_code=404, detail="Complaint not found")
     
@@ -410,7 +399,7 @@ async def escalate_complaint_route(
         )
     
     try:
-        updated_complaint, message = escalate_complaint(
+        updated_complaint, message = await escalate_complaint(
             session,
             complaint_id,
             user_obj.user_id,
@@ -428,7 +417,7 @@ async def escalate_complaint_route(
                 "sender_name": f"{user_obj.first_name} {user_obj.last_name}",
                 "body": message.body,
                 "message_type": message.type,
-                "sent_at": message.sent_at
+                "sent_at": message.sent_at.isoformat()
             }
             await broadcast_order_message(complaint.order_id, broadcast_data)
             
@@ -443,8 +432,8 @@ async def escalate_complaint_route(
 @router.put("/{complaint_id}/claim")
 async def claim_complaint_route(
     complaint_id: int,
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     **Claim an escalated complaint.**
@@ -465,10 +454,8 @@ async def claim_complaint_route(
     - `403 Forbidden`: If the user is not a manager or owner.
     - `400 Bad Request`: If the complaint is not in `escalated` status or already claimed.
     """
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+    user_obj = current_user.user
+
     if user_obj.role not in [UserRole.manager, UserRole.owner]:
         raise HTTPException(
             status_code=403,
@@ -476,7 +463,7 @@ async def claim_complaint_route(
         )
     
     try:
-        updated_complaint, message = claim_complaint(session, complaint_id, user_obj.user_id)
+        updated_complaint, message = await claim_complaint(session, complaint_id, user_obj.user_id)
         
         # Broadcast system message
         if message:
@@ -490,7 +477,7 @@ async def claim_complaint_route(
                 "sender_name": f"{user_obj.first_name} {user_obj.last_name}",
                 "body": message.body,
                 "message_type": message.type,
-                "sent_at": message.sent_at
+                "sent_at": message.sent_at.isoformat()
             }
             await broadcast_order_message(updated_complaint.order_id, broadcast_data)
             
@@ -506,8 +493,8 @@ async def claim_complaint_route(
 async def resolve_complaint_route(
     complaint_id: int,
     resolve_data: ResolveComplaint,
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     **Resolve a complaint.**
@@ -533,11 +520,9 @@ async def resolve_complaint_route(
     - `403 Forbidden`: If the user is not assigned or lacks permission to cancel orders.
     - `400 Bad Request`: If the complaint status is invalid for resolution.
     """
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    complaint = get_complaint_by_id(session, complaint_id)
+    user_obj = current_user.user
+
+    complaint = await get_complaint_by_id(session, complaint_id)
     if not complaint:
         raise HTTPException(status_code=404, detail="Complaint not found")
     
@@ -569,7 +554,7 @@ async def resolve_complaint_route(
         )
     
     try:
-        updated_complaint, message = resolve_complaint(
+        updated_complaint, message = await resolve_complaint(
             session,
             complaint_id,
             user_obj.user_id,
@@ -588,7 +573,7 @@ async def resolve_complaint_route(
                 "sender_name": f"{user_obj.first_name} {user_obj.last_name}",
                 "body": message.body,
                 "message_type": message.type,
-                "sent_at": message.sent_at
+                "sent_at": message.sent_at.isoformat()
             }
             await broadcast_order_message(updated_complaint.order_id, broadcast_data)
             
@@ -605,8 +590,8 @@ async def resolve_complaint_route(
 async def close_complaint_route(
     complaint_id: int,
     resolve_data: ResolveComplaint,
-    user: dict = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
 ):
     """
     **Close (Reject) a complaint.**
@@ -631,17 +616,15 @@ async def close_complaint_route(
     - `403 Forbidden`: If the user is not the assigned manager or lacks required role.
     - `400 Bad Request`: If the complaint is not in `in_progress` status.
     """
-    user_obj = get_user_by_email(session, user['sub'])
-    if not user_obj:
-        raise HTTPException(status_code=404, detail="User not found")
-    
+    user_obj = current_user.user
+
     if user_obj.role not in [UserRole.manager, UserRole.owner]:
         raise HTTPException(
             status_code=403,
             detail="Only managers can close complaints"
         )
     
-    complaint = get_complaint_by_id(session, complaint_id)
+    complaint = await get_complaint_by_id(session, complaint_id)
     if not complaint:
         raise HTTPException(status_code=404, detail="Complaint not found")
     
@@ -653,7 +636,7 @@ async def close_complaint_route(
         )
     
     try:
-        updated_complaint, message = close_complaint(
+        updated_complaint, message = await close_complaint(
             session,
             complaint_id,
             user_obj.user_id,
@@ -672,7 +655,7 @@ async def close_complaint_route(
                 "sender_name": f"{user_obj.first_name} {user_obj.last_name}",
                 "body": message.body,
                 "message_type": message.type,
-                "sent_at": message.sent_at
+                "sent_at": message.sent_at.isoformat()
             }
             await broadcast_order_message(updated_complaint.order_id, broadcast_data)
             
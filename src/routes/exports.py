@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.core.config import settings
+from src.core.database import get_async_session
+from src.core.dependencies import CurrentUser, get_current_user
+from src.cruds.exports import create_export_job, get_export_job, retry_export_job
+from src.models.export_jobs import ExportFormat, ExportJobs, ExportStatus
+from src.schemas.exports import ExportJobResponse, OrderExportCreate
+from src.services.order_export import PARQUET_AVAILABLE
+from src.services.s3_service import s3_service
+
+router = APIRouter(prefix="/exports", tags=["Exports"])
+
+
+def export_job_response(job: ExportJobs) -> dict:
+    download_urls = []
+    if job.status == ExportStatus.completed:
+        download_urls = [s3_service.create_download_url(key, settings.EXPORT_URL_EXPIRES_SECONDS) for key in job.files]
+
+    return {
+        "export_id": job.export_id,
+        "format": job.format,
+        "status": job.status,
+        "filters": job.filters,
+        "row_count": job.row_count,
+        "file_count": len(job.files),
+        "error": job.error,
+        "created_at": job.created_at,
+        "completed_at": job.completed_at,
+        "download_urls": download_urls,
+    }
+
+
+async def get_company_export(export_id: int, current_user: CurrentUser, session: AsyncSession) -> ExportJobs:
+    job = await get_export_job(session, export_id)
+    if not job or job.company_id != current_user.user.company_id:
+        raise HTTPException(status_code=404, detail="Export not found")
+    return job
+
+
+@router.post("/orders", status_code=202, response_model=ExportJobResponse)
+async def export_orders(data: OrderExportCreate, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    """
+    Queue an export of the company's order lines (the rows of `GET /orders/`,
+    with the same filters) as CSV or Parquet.
+
+    The export runs in the export worker (`python -m src.scripts.export_worker`),
+    not in the API process. Poll `GET /exports/{export_id}` until the status
+    is `completed`; the response then carries one download link per file.
+    Large exports are split into files of EXPORT_CHUNK_ROWS rows.
+    """
+    user = current_user.user
+
+    if data.format == ExportFormat.parquet and not PARQUET_AVAILABLE:
+        raise HTTPException(status_code=400, detail="Parquet export is not available on this server")
+
+    filters = data.model_dump(mode="json", exclude={"format"}, exclude_none=True)
+    job = await create_export_job(session, user.company_id, user.user_id, data.format, filters)
+    return export_job_response(job)
+
+
+@router.get("/{export_id}", response_model=ExportJobResponse)
+async def get_export(export_id: int, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    job = await get_company_export(export_id, current_user, session)
+    return export_job_response(job)
+
+
+@router.post("/{export_id}/retry", response_model=ExportJobResponse)
+async def retry_export(export_id: int, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    """Queue a failed export again; it continues after the last file it wrote"""
+    job = await get_company_export(export_id, current_user, session)
+
+    try:
+        job = await retry_export_job(session, job)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return export_job_response(job)
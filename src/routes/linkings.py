@@ -1,28 +1,21 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import Session
+from fastapi import APIRouter, HTTPException, Depends, Request
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.core.database import get_session
-from src.core.security import check_access_token
+from src.core.database import get_async_session
+from src.core.dependencies import CurrentUser, get_current_user
+from src.core.streaming import ndjson_response, wants_stream
 from src.cruds.company import get_company_by_id
-from src.cruds.user import get_user_by_email
-from src.cruds.linkings import create_linking, get_linkings_by_company, check_if_exists, update_due_response, get_linking_status
+from src.cruds.linkings import create_linking, get_linkings_by_company, linkings_by_company_statement, check_if_exists, update_due_response, get_linking_status
 from src.schemas.linkings import LinkingSchema
 
 router = APIRouter(prefix="/linkings", tags=["linkings"])
 
 @router.post("/")
-async def add_linking(company_id: int, data: LinkingSchema, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    user = get_user_by_email(session, user['sub'])
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    company = get_company_by_id(session, user.company_id)
+async def add_linking(company_id: int, data: LinkingSchema, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    user = current_user.user
+    company = current_user.company
 
-    if not company:
-        raise HTTPException(status_code=404, detail="Company not found")
-    
-    if check_if_exists(session, company.company_id, company_id):
+    if await check_if_exists(session, company.company_id, company_id):
         raise HTTPException(status_code=400, detail="Already sent request")
     
     if company.company_type == "supplier":
@@ -31,7 +24,7 @@ async def add_linking(company_id: int, data: LinkingSchema, user: str = Depends(
     if company.company_type != "consumer":
         raise HTTPException(status_code=403, detail="Insufficient permissions to send linking request")
     
-    supplier_company = get_company_by_id(session, company_id)
+    supplier_company = await get_company_by_id(session, company_id)
 
     if not supplier_company:
         raise HTTPException(status_code=404, detail="Supplier company not found")
@@ -39,44 +32,33 @@ async def add_linking(company_id: int, data: LinkingSchema, user: str = Depends(
     if supplier_company.company_type != "supplier":
         raise HTTPException(status_code=400, detail="The specified company is not a supplier")
 
-    linking = create_linking(session, data, consumer_company_id=company.company_id, requested_user_id=user.user_id, company_id=company_id)
+    linking = await create_linking(session, data, consumer_company_id=company.company_id, requested_user_id=user.user_id, company_id=company_id)
 
     return {"message": "Linking request created successfully", "linking": linking}
 
 @router.get("/")
-async def get_linkings(user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    user = get_user_by_email(session, user['sub'])
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    company = get_company_by_id(session, user.company_id)
+async def get_linkings(request: Request, stream: bool = False, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    user = current_user.user
+    company = current_user.company
 
-    if not company:
-        raise HTTPException(status_code=404, detail="Company not found")
-    
-    linkings = get_linkings_by_company(session, company.company_id)
+    if wants_stream(request, stream):
+        return ndjson_response(linkings_by_company_statement(company.company_id))
+
+    linkings = await get_linkings_by_company(session, company.company_id)
 
     return {"linkings": linkings}
     
 
 @router.get("/status/{other_company_id}")
-async def get_linking_status_route(other_company_id: int, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    user = get_user_by_email(session, user['sub'])
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    company = get_company_by_id(session, user.company_id)
-    
-    if not company:
-        raise HTTPException(status_code=404, detail="Company not found")
-    
-    other_company = get_company_by_id(session, other_company_id)
+async def get_linking_status_route(other_company_id: int, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    user = current_user.user
+    company = current_user.company
+
+    other_company = await get_company_by_id(session, other_company_id)
     if not other_company:
         raise HTTPException(status_code=404, detail="Other company not found")
     
-    linking = get_linking_status(session, company.company_id, other_company_id)
+    linking = await get_linking_status(session, company.company_id, other_company_id)
     
     if not linking:
         raise HTTPException(status_code=404, detail="No linking found between the companies")
@@ -93,15 +75,14 @@ async def get_linking_status_route(other_company_id: int, user: str = Depends(ch
 
 
 @router.patch("/supplier_response/{linking_id}")
-async def supplier_response(linking_id: int, status: str, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    user = get_user_by_email(session, user['sub'])
-    
-    company = get_company_by_id(session, user.company_id)
-    
+async def supplier_response(linking_id: int, status: str, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    user = current_user.user
+    company = current_user.company
+
     if company.company_type != "supplier":
         raise HTTPException(status_code=403, detail="Insufficient permissions to view linkings")
     
-    linking = update_due_response(session, linking_id, user.user_id, status)
+    linking = await update_due_response(session, linking_id, user.user_id, status)
 
     return {"linking": linking}
 
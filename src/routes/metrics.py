@@ -0,0 +1,49 @@
+import secrets
+
+from fastapi import APIRouter, Depends, Header, HTTPException
+
+from src.core.config import settings
+from src.core.database import engine, async_engine, get_pool_stats
+from src.core.jwt import get_token_cache_stats
+from src.core.replicas import replica_router
+from src.services.catalog_cache import get_cache_stats
+from src.services.chat_hub import get_chat_stats
+from src.services.pricing import get_pricing_stats
+from src.services.message_writer import message_writer
+
+
+async def require_metrics_token(x_metrics_token: str | None = Header(default=None)):
+    # Metrics describe the whole deployment (hosts, pools, caches), so they
+    # are for its operators only, not for any company's users. Without a
+    # METRICS_TOKEN configured they are not served at all.
+    if not settings.METRICS_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if x_metrics_token is None or not secrets.compare_digest(x_metrics_token, settings.METRICS_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid metrics token")
+
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"], dependencies=[Depends(require_metrics_token)])
+
+
+@router.get("/db-pool")
+async def db_pool_metrics():
+    return {
+        "async": get_pool_stats(async_engine.pool),
+        "sync": get_pool_stats(engine.pool),
+        "read_routing": replica_router.stats(),
+    }
+
+
+@router.get("/jwt-cache")
+async def jwt_cache_metrics():
+    return get_token_cache_stats()
+
+
+@router.get("/chat")
+async def chat_metrics():
+    return {**get_chat_stats(), "writer": message_writer.stats()}
+
+
+@router.get("/catalog-cache")
+async def catalog_cache_metrics():
+    return {**get_cache_stats(), "prices": get_pricing_stats()}
@@ -1,10 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session
-from typing import List
+import json
+from datetime import date, datetime
 
-from src.core.database import get_session
-from src.core.security import check_access_token
-from src.schemas.order import OrderCreate, OrderStatusUpdate, OrderRead
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+
+from src.core.database import get_async_session
+from src.core.replicas import get_read_session, read_session_maker
+from src.core.dependencies import CurrentUser, get_current_user
+from src.schemas.order import OrderCreate, OrderStatusUpdate, OrderRead, OrderFeedPage, OrderQuote, OrderStats
 from src.models.orders import OrderStatus
 from src.models.linkings import Linkings
 from src.cruds.order import (
@@ -12,55 +17,208 @@ from src.cruds.order import (
     get_orders_for_company,
     get_order_by_id,
     update_order_status,
-    get_ordered_products_for_company,
+    get_order_feed,
+    order_feed_statement,
     get_products_for_order,
     get_orders_by_linking_id
 )
-from src.cruds.user import get_user_by_email
-from src.cruds.company import get_company_by_id
+from src.cruds.order_stats import get_order_stats
 from src.cruds.linkings import check_if_linked, get_linking
+from src.core.streaming import ndjson_response, wants_stream
+from src.services.bulk_orders import import_orders, read_rows
+from src.services.pricing import quote_cart
+from src.services.uploads import CSV_TYPES, NDJSON_TYPES, BulkImportError
 
 router = APIRouter(prefix="/orders", tags=["Orders"])
 
 
 @router.post("/")
-async def create_new_order(order_data: OrderCreate, supplier_company_id: int, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    user = get_user_by_email(session, user['sub'])
-
-    company = get_company_by_id(session, user.company_id)
+async def create_new_order(order_data: OrderCreate, supplier_company_id: int, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    user = current_user.user
+    company = current_user.company
 
     if company.company_type == "supplier":
         raise HTTPException(status_code=403, detail="Supplier can not order")
     
-    if not check_if_linked(session, user.user_id, supplier_company_id):
+    if not await check_if_linked(session, user.user_id, supplier_company_id):
         raise HTTPException(status_code=403, detail="Companies are not linked")
     
-    linking = get_linking(session, user.company_id, supplier_company_id)
+    linking = await get_linking(session, user.company_id, supplier_company_id)
     
     try:
-        order = create_order(order_data, linking.linking_id, user.user_id, session)
+        order = await create_order(order_data, linking.linking_id, user.user_id, session)
         return {"order": order}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.get("/")
-def get_all_orders(user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    user = get_user_by_email(session, user['sub'])
+@router.post("/quote", response_model=OrderQuote)
+async def quote_order(order_data: OrderCreate, supplier_company_id: int, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_read_session)):
+    """
+    Price a cart the way POST /orders/ would, without placing it. Each
+    line gets its unit price (bulk or retail), line price and the stock
+    available right now; a line that couldn't be ordered as it is (unknown
+    or unavailable product, below minimum_order, not enough stock) carries
+    an error and makes the quote not orderable. Repeated products are
+    merged into one line.
+    """
+    user = current_user.user
+    company = current_user.company
+
+    if company.company_type == "supplier":
+        raise HTTPException(status_code=403, detail="Supplier can not order")
+
+    if not await check_if_linked(session, user.company_id, supplier_company_id):
+        raise HTTPException(status_code=403, detail="Companies are not linked")
+
+    quote = await quote_cart(session, order_data.products, supplier_company_id)
+    return {"lines": quote.lines, "total_price": quote.total_price, "orderable": quote.orderable}
+
+
+@router.post("/bulk")
+async def create_orders_bulk(request: Request, current_user: CurrentUser = Depends(get_current_user)):
+    """
+    Place many orders from one NDJSON or CSV upload.
+
+    Each row is one order line with `supplier_company_id`, `product_id`,
+    `quantity` and an optional `order_ref`. Rows with the same supplier and
+    order_ref become one order; rows without an order_ref become one order
+    per supplier. CSV uploads need a header row naming those columns.
+
+    The response is NDJSON with one result per row
+    (`{"row", "order_ref", "status": "created", "order_id"}` or
+    `{"row", "order_ref", "status": "error", "error"}`), streamed as orders
+    are committed, followed by a summary line.
+    """
+    user = current_user.user
+    company = current_user.company
+
+    if company.company_type == "supplier":
+        raise HTTPException(status_code=403, detail="Supplier can not order")
+
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type not in NDJSON_TYPES | CSV_TYPES:
+        raise HTTPException(status_code=415, detail="Send application/x-ndjson or text/csv")
+
+    # The body is parsed before the response starts: the response can't
+    # stream while the request body is still being received
+    try:
+        rows, errors = await read_rows(request.stream(), content_type)
+    except BulkImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def results():
+        created, failed = set(), len(errors)
+        for result in errors:
+            yield json.dumps(result) + "\n"
+        async for result in import_orders(rows, user.company_id, user.user_id):
+            if result["status"] == "created":
+                created.add(result["order_id"])
+            else:
+                failed += 1
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"summary": {"rows": len(rows) + len(errors), "orders_created": len(created), "rows_failed": failed}}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@router.get("/", response_model=OrderFeedPage)
+async def get_all_orders(
+    request: Request,
+    stream: bool = False,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    sort: str = "-created_at",
+    status: Optional[OrderStatus] = None,
+    created_from: Optional[datetime] = None,
+    created_to: Optional[datetime] = None,
+    linking_id: Optional[int] = None,
+    product_id: Optional[int] = None,
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    Order lines of every order the user's company supplies or places, one
+    page at a time.
+
+    - **sort**: `created_at`, `updated_at`, `total_price` or `order_id`,
+      prefixed with `-` for descending (default `-created_at`)
+    - **cursor**: `next_cursor` of the previous page; it is only valid with
+      the same sort
+    - **created_from** / **created_to**: half-open range on the order's
+      creation time
+    - **stream**: with `stream=true` or `Accept: application/x-ndjson`,
+      every matching line is streamed as NDJSON instead (limit and cursor
+      are ignored)
+    """
+    user = current_user.user
+    filters = {
+        "status": status,
+        "created_from": created_from,
+        "created_to": created_to,
+        "linking_id": linking_id,
+        "product_id": product_id,
+    }
+
+    if wants_stream(request, stream):
+        try:
+            statement = order_feed_statement(user.company_id, sort=sort, **filters)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        return ndjson_response(statement, scalars=False, session_maker=read_session_maker(request))
+
+    try:
+        items, next_cursor = await get_order_feed(
+            user.company_id,
+            session,
+            limit=limit,
+            cursor=cursor,
+            sort=sort,
+            **filters,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"items": items, "limit": limit, "next_cursor": next_cursor}
+
+
+@router.get("/stats", response_model=OrderStats)
+async def get_company_order_stats(
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    linking_id: Optional[int] = None,
+    role: Optional[str] = None,
+    top: int = Query(10, ge=1, le=100),
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    Order totals for the user's company: counts, total_price sums and
+    quantities by status, by linking and by day (UTC day of creation), plus
+    the `top` products by quantity ordered (rejected orders left out).
 
-    return get_ordered_products_for_company(user.company_id, session)
+    - **date_from** / **date_to**: inclusive range of creation days
+    - **role**: `supplier` or `consumer` to count only orders the company
+      supplies or places
+    """
+    user = current_user.user
+
+    try:
+        return await get_order_stats(session, user.company_id, date_from, date_to, linking_id, role, top)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/{order_id}")
-def get_order(order_id: int, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    user = get_user_by_email(session, user['sub'])
-    
-    order = get_order_by_id(order_id, session)
+async def get_order(order_id: int, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_read_session)):
+    user = current_user.user
+
+    order = await get_order_by_id(order_id, session)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     # Get the linking associated with the order
-    linking = session.get(Linkings, order.linking_id)
+    linking = await session.get(Linkings, order.linking_id)
     if not linking:
         raise HTTPException(status_code=404, detail="Linking not found")
     
@@ -69,7 +227,7 @@ def get_order(order_id: int, user: str = Depends(check_access_token), session: S
         raise HTTPException(status_code=403, detail="Access denied")
     
     # Get products for this order
-    products = get_products_for_order(order_id, session)
+    products = await get_products_for_order(order_id, session)
     
     # Return order with products
     return {
@@ -88,18 +246,18 @@ def get_order(order_id: int, user: str = Depends(check_access_token), session: S
 async def change_order_status(
     order_id: int,
     status: str,
-    user: str = Depends(check_access_token),
-    session: Session = Depends(get_session)
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_async_session)
 ):
-    user = get_user_by_email(session, user['sub'])
+    user = current_user.user
 
     # Get the order
-    order = get_order_by_id(order_id, session)
+    order = await get_order_by_id(order_id, session)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
     
     # Get the linking associated with the order
-    linking = session.get(Linkings, order.linking_id)
+    linking = await session.get(Linkings, order.linking_id)
     if not linking:
         raise HTTPException(status_code=404, detail="Linking not found")
     
@@ -111,7 +269,7 @@ async def change_order_status(
         raise HTTPException(status_code=400, detail="Invalid status")
 
     try:
-        order, message = update_order_status(
+        order, message = await update_order_status(
             order_id,
             OrderStatus(status),
             user.user_id,
@@ -130,7 +288,7 @@ async def change_order_status(
                 "sender_name": f"{user.first_name} {user.last_name}",
                 "body": message.body,
                 "message_type": message.type,
-                "sent_at": message.sent_at
+                "sent_at": message.sent_at.isoformat()
             }
             await broadcast_order_message(order.order_id, broadcast_data)
             
@@ -140,14 +298,14 @@ async def change_order_status(
 
 
 @router.get("/linking/{linking_id}", response_model=List[OrderRead])
-def get_orders_by_linking(linking_id: int, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    user = get_user_by_email(session, user['sub'])
-    
-    linking = session.get(Linkings, linking_id)
+async def get_orders_by_linking(linking_id: int, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_read_session)):
+    user = current_user.user
+
+    linking = await session.get(Linkings, linking_id)
     if not linking:
         raise HTTPException(status_code=404, detail="Linking not found")
     
     if user.company_id != linking.consumer_company_id and user.company_id != linking.supplier_company_id:
         raise HTTPException(status_code=403, detail="Access denied")
         
-    return get_orders_by_linking_id(linking_id, session)
\ No newline at end of file
+    return await get_orders_by_linking_id(linking_id, session)
\ No newline at end of file
@@ -1,107 +1,256 @@
-from fastapi import APIRouter, HTTPException, Depends
-from sqlmodel import Session
-
-from src.core.database import get_session
-from src.core.security import check_access_token
-from src.cruds.user import get_user_by_email
-from src.cruds.company import get_company_by_id
-from src.cruds.products import create_product, get_all_products, delete_product, update_product, get_product_by_id
+import json
+
+from fastapi import APIRouter, HTTPException, Depends, File, Query, Request, UploadFile
+from fastapi.responses import StreamingResponse
+from sqlmodel.ext.asyncio.session import AsyncSession
+from typing import List, Optional
+
+from src.core.config import settings
+
+from src.core.database import get_async_session
+from src.core.replicas import get_read_session, read_session_maker
+from src.core.dependencies import CurrentUser, get_current_user
+from src.core.streaming import ndjson_response, wants_stream
+from src.cruds.products import create_product, all_products_statement, delete_product, update_product, search_products, get_products_by_ids
 from src.cruds.linkings import check_if_linked
-from src.schemas.products import ProductSchema
+from src.schemas.products import ProductBatchRequest, ProductSchema, ProductSearchPage
+from src.services.bulk_products import import_products, read_rows
+from src.services.catalog_cache import catalog_response, product_response
+from src.services.uploads import CSV_TYPES, NDJSON_TYPES, XLSX_AVAILABLE, XLSX_TYPES, BulkImportError, upload_type
 
 router = APIRouter(prefix="/products", tags=["Products"])
 
 
 @router.get("/")
-async def all_products(company_id: int, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    email = user.get("sub")
-    user = get_user_by_email(session, email)
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    company = get_company_by_id(session, user.company_id)
+async def all_products(company_id: int, request: Request, stream: bool = False, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_read_session)):
+    user = current_user.user
+    company = current_user.company
 
-    if not company:
-        raise HTTPException(status_code=404, detail="Company not found")
-    
     if company.company_id == company_id and company.company_type == "consumer":
         raise HTTPException(status_code=404, detail="Consumer does not have products")
 
     # if not (check_if_linked(session, user.company_id, company_id) or user.company_id == company_id):
     #     raise HTTPException(status_code=403, detail="Insufficient permissions to view products")
 
-    products = get_all_products(session, company_id)
-    return {"products": products}
+    if wants_stream(request, stream):
+        return ndjson_response(all_products_statement(company_id), session_maker=read_session_maker(request))
+
+    # Served from the per-worker catalog cache, with ETag / If-None-Match
+    return await catalog_response(request, session, company_id)
+
+@router.get("/search", response_model=ProductSearchPage)
+async def search_catalog(
+    q: Optional[str] = Query(None, max_length=200),
+    supplier_company_id: Optional[int] = None,
+    min_price: Optional[int] = None,
+    max_price: Optional[int] = None,
+    unit: Optional[str] = None,
+    in_stock: Optional[bool] = None,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    Search the available products of every supplier the user's company is
+    linked to (a supplier searches its own catalog), one page at a time.
+
+    - **q**: words to look for in name and description; prefixes match
+      ("mil" finds "milk") and names with small typos still match. Results
+      are ranked by relevance. Without q, all products by product_id.
+    - **min_price** / **max_price**: inclusive range on retail_price
+    - **in_stock**: only products with (true) or without (false) stock
+      left to order
+    - **cursor**: `next_cursor` of the previous page, with the same q
+    """
+    company = current_user.company
+
+    try:
+        items, next_cursor = await search_products(
+            session,
+            company.company_id,
+            company.company_type,
+            q=q,
+            supplier_company_id=supplier_company_id,
+            min_price=min_price,
+            max_price=max_price,
+            unit=unit,
+            in_stock=in_stock,
+            limit=limit,
+            cursor=cursor,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {"items": items, "limit": limit, "next_cursor": next_cursor}
+
+
+async def _batch_lookup(session: AsyncSession, ids: list[int], fields: list[str] | None) -> dict:
+    # Repeated ids are answered once; products come back in request order
+    ids = list(dict.fromkeys(ids))
+    if not ids:
+        raise HTTPException(status_code=400, detail="No product ids given")
+    if len(ids) > settings.PRODUCT_BATCH_MAX_IDS:
+        raise HTTPException(status_code=400, detail=f"At most {settings.PRODUCT_BATCH_MAX_IDS} ids per request")
+
+    try:
+        found = {row["product_id"]: row for row in await get_products_by_ids(session, ids, fields)}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "products": [found[product_id] for product_id in ids if product_id in found],
+        "not_found": [product_id for product_id in ids if product_id not in found],
+    }
+
+
+def _split_query_list(values: list[str]) -> list[str]:
+    return [value.strip() for item in values for value in item.split(",") if value.strip()]
+
+
+@router.get("/batch")
+async def get_products_batch(
+    ids: List[str] = Query(..., description="Product ids, comma separated or repeated"),
+    fields: Optional[List[str]] = Query(None, description="Product fields to return, comma separated or repeated"),
+    current_user: CurrentUser = Depends(get_current_user),
+    session: AsyncSession = Depends(get_read_session)
+):
+    """
+    Many products in one request, read with one query: `{"products": [...],
+    "not_found": [ids]}`. Products are returned like GET /products/{id},
+    limited to `fields` if given. For lists too long for a URL, use
+    POST /products/batch.
+    """
+    try:
+        product_ids = [int(value) for value in _split_query_list(ids)]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Product ids must be integers")
+
+    return await _batch_lookup(session, product_ids, _split_query_list(fields) if fields else None)
+
+
+@router.post("/batch")
+async def post_products_batch(data: ProductBatchRequest, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_read_session)):
+    """GET /products/batch with the ids (and fields) in a JSON body"""
+    return await _batch_lookup(session, data.ids, data.fields)
+
 
 @router.get("/{product_id}")
-async def get_product(product_id:int, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    email = user.get("sub")
-    user = get_user_by_email(session, email)
+async def get_product(product_id:int, request: Request, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_read_session)):
+    user = current_user.user
 
-    product = get_product_by_id(session, product_id)
+    response = await product_response(request, session, product_id)
 
-    if not product:
+    if response is None:
         raise HTTPException(status_code=404, detail="Product not found")
-    return {"products": product}
+    return response
 
 
 @router.post("/")
-async def add_product(data: ProductSchema, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    user = get_user_by_email(session, user['sub'])
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    company = get_company_by_id(session, user.company_id)
+async def add_product(data: ProductSchema, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    user = current_user.user
+    company = current_user.company
 
-    if not company:
-        raise HTTPException(status_code=404, detail="Company not found")
-    
     if user.role not in ("owner", "manager") or company.company_type != "supplier":
         raise HTTPException(status_code=403, detail="Insufficient permissions to create product")
     
-    product = create_product(session, data, company.company_id)
+    product = await create_product(session, data, company.company_id)
 
     return {"message": "Product created successfully", "product": product}
+
+
+async def _import_response(chunks, content_type: str, current_user: CurrentUser) -> StreamingResponse:
+    user = current_user.user
+    company = current_user.company
+
+    if user.role not in ("owner", "manager") or company.company_type != "supplier":
+        raise HTTPException(status_code=403, detail="Insufficient permissions to create product")
+
+    if content_type not in NDJSON_TYPES | CSV_TYPES | XLSX_TYPES:
+        raise HTTPException(status_code=415, detail="Send NDJSON, CSV or XLSX")
+    if content_type in XLSX_TYPES and not XLSX_AVAILABLE:
+        raise HTTPException(status_code=415, detail="XLSX uploads are not supported on this server")
+
+    # The upload is parsed before the response starts: the response can't
+    # stream while the request body is still being received
+    try:
+        rows, errors = await read_rows(chunks, content_type)
+    except BulkImportError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def results():
+        counts = {"created": 0, "updated": 0, "error": len(errors)}
+        for result in errors:
+            yield json.dumps(result) + "\n"
+        async for result in import_products(rows, company.company_id):
+            counts[result["status"]] += 1
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"summary": {
+            "rows": len(rows) + len(errors),
+            "products_created": counts["created"],
+            "products_updated": counts["updated"],
+            "rows_failed": counts["error"],
+        }}) + "\n"
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@router.post("/bulk")
+async def add_products_bulk(request: Request, current_user: CurrentUser = Depends(get_current_user)):
+    """
+    Create or update many products from one NDJSON, CSV or XLSX body.
+
+    Each row is a product with the fields of POST /products/ plus a `sku`,
+    the supplier's own code for it: a row whose sku the supplier already
+    has replaces that product's fields, any other row creates a product.
+    `description`, `picture_url` (in CSV and XLSX a JSON array or URLs
+    separated by "|"), `threshold`, `bulk_price` and `minimum_order` may be
+    left out. CSV and XLSX uploads need a header row naming the columns.
+
+    The response is NDJSON with one result per row
+    (`{"row", "sku", "status": "created" | "updated", "product_id"}` or
+    `{"row", "sku", "status": "error", "error"}`), streamed as batches are
+    committed, followed by a summary line.
+    """
+    return await _import_response(request.stream(), upload_type(request.headers.get("content-type", "")), current_user)
+
+
+@router.post("/import")
+async def import_products_file(file: UploadFile = File(...), current_user: CurrentUser = Depends(get_current_user)):
+    """
+    POST /products/bulk for a file sent as multipart/form-data (field
+    `file`); its type is taken from the part's content type or, failing
+    that, the file name's extension.
+    """
+    async def chunks():
+        while chunk := await file.read(64 * 1024):
+            yield chunk
+
+    return await _import_response(chunks(), upload_type(file.content_type or "", file.filename), current_user)
     
 
 @router.delete("/{product_id}")
-async def remove_product(product_id: int, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    user = get_user_by_email(session, user['sub'])
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    company = get_company_by_id(session, user.company_id)
+async def remove_product(product_id: int, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    user = current_user.user
+    company = current_user.company
 
-    if not company:
-        raise HTTPException(status_code=404, detail="Company not found")
-    
     if user.role not in ("owner", "manager") and company.type != "supplier":
         raise HTTPException(status_code=403, detail="Insufficient permissions to delete product")
 
-    delete_product(session, product_id)
+    await delete_product(session, product_id)
 
     return {"message": f"Product with id {product_id} deleted successfully"}
 
 
 @router.put("/{product_id}")
-async def put_product(product_id: int, data: ProductSchema, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    user = get_user_by_email(session, user['sub'])
-    
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    company = get_company_by_id(session, user.company_id)
+async def put_product(product_id: int, data: ProductSchema, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    user = current_user.user
+    company = current_user.company
 
-    if not company:
-        raise HTTPException(status_code=404, detail="Company not found")
-    
     if user.role not in ("owner", "manager") and company.company_type != "supplier":
         raise HTTPException(status_code=403, detail="Insufficient permissions to update product")
     
 
-    product = update_product(session, product_id, data)
+    product = await update_product(session, product_id, data)
 
     return {"message": "Product updated successfully", "product": product}
@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends
-from sqlmodel import Session
-from src.core.database import get_session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from src.core.database import get_async_session
 from src.services.s3_service import s3_service
 from src.core.security import check_access_token
 from src.cruds.uploads import store_company_url
@@ -13,8 +13,8 @@ async def get_upload_url(ext: str, user: str = Depends(check_access_token)):
     return {"put_url": put_url, "finalurl": finalurl}
 
 @router.post("/companies/{company_id}/photo")
-async def store_company_photo(company_id: int, file_url: str, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    updated_company = store_company_url(session, company_id, file_url)
+async def store_company_photo(company_id: int, file_url: str, user: str = Depends(check_access_token), session: AsyncSession = Depends(get_async_session)):
+    updated_company = await store_company_url(session, company_id, file_url)
     return {"message": "Logo stored successfully", "company": updated_company}
 
 @router.delete("/delete-file")
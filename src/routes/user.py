@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlmodel import Session
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlmodel.ext.asyncio.session import AsyncSession
 
-from src.core.database import get_session
+from src.core.database import get_async_session
 from src.core.security import check_access_token
-from src.cruds.user import delete_user, get_user_by_email, get_user_by_id, get_user_by_phone, get_all_users, create_user, update_user
+from src.core.dependencies import CurrentUser, get_current_user
+from src.core.streaming import ndjson_response, wants_stream
+from src.cruds.user import delete_user, get_user_by_email, get_user_by_id, get_user_by_phone, get_all_users, company_users_statement, create_user, update_user
 from src.models.users import UserRole
 from src.schemas.authentication import UserSchema
 from src.schemas.update_user import UpdateUserSchema
@@ -12,19 +14,12 @@ from src.schemas.update_user import UpdateUserSchema
 router = APIRouter(prefix="/user", tags=["User"])
 
 @router.get("/me")
-async def read_current_user(user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    email = user.get("sub")
-
-    user = get_user_by_email(session, email)
-
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
-    return user
+async def read_current_user(current_user: CurrentUser = Depends(get_current_user)):
+    return current_user.user
 
 @router.get("/get-user")
-async def read_all_users(user_id: int, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    user = get_user_by_id(session, user_id)
+async def read_all_users(user_id: int, user: str = Depends(check_access_token), session: AsyncSession = Depends(get_async_session)):
+    user = await get_user_by_id(session, user_id)
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
@@ -33,32 +28,25 @@ async def read_all_users(user_id: int, user: str = Depends(check_access_token),
 
 
 @router.get("/")
-async def all_users(user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    email = user.get("sub")
-    
-    user = get_user_by_email(session, email)
+async def all_users(request: Request, stream: bool = False, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    user = current_user.user
 
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     if user.role not in (UserRole.owner, UserRole.manager):
         raise HTTPException(status_code=403, detail="Insufficient permissions to view all users")
     
-    users = get_all_users(session, user.company_id)
+    if wants_stream(request, stream):
+        return ndjson_response(company_users_statement(user.company_id))
+
+    users = await get_all_users(session, user.company_id)
     
     return {"users": users}
 
 
 
 @router.post("/")
-async def add_user(new_user: UserSchema, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    email = user.get("sub")
-    
-    user = get_user_by_email(session, email)
+async def add_user(new_user: UserSchema, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    user = current_user.user
 
-    if not user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     if user.role == UserRole.staff:
         raise HTTPException(status_code=403, detail="Insufficient permissions to add new users")
     
@@ -68,29 +56,24 @@ async def add_user(new_user: UserSchema, user: str = Depends(check_access_token)
     if new_user.role == UserRole.owner:
         raise HTTPException(status_code=403, detail="Cannot create another owner user")
     
-    if get_user_by_email(session, new_user.email):
+    if await get_user_by_email(session, new_user.email):
         raise HTTPException(status_code=400, detail="A user with this email already exists")
     
-    if get_user_by_phone(session, new_user.phone_number):
+    if await get_user_by_phone(session, new_user.phone_number):
         raise HTTPException(status_code=400, detail="A user with this phone number already exists")
 
-    new_user1 = create_user(session, new_user, user.company_id)
+    new_user1 = await create_user(session, new_user, user.company_id)
 
     return {"users": new_user1}
 
 @router.delete("/{user_id}")
-async def remove_user(user_id: int, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    email = user.get("sub")
-    
-    requesting_user = get_user_by_email(session, email)
+async def remove_user(user_id: int, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    requesting_user = current_user.user
 
-    if not requesting_user:
-        raise HTTPException(status_code=404, detail="User not found")
-    
     if requesting_user.role == UserRole.staff:
         raise HTTPException(status_code=403, detail="Insufficient permissions to delete users")
     
-    user_to_delete = get_user_by_id(session, user_id)
+    user_to_delete = await get_user_by_id(session, user_id)
 
     if not user_to_delete:
         raise HTTPException(status_code=404, detail="User to delete not found")
@@ -101,22 +84,17 @@ async def remove_user(user_id: int, user: str = Depends(check_access_token), ses
     if requesting_user.user_id == user_id:
         raise HTTPException(status_code=400, detail="Users cannot delete themselves")
     
-    success = delete_user(session, user_to_delete)
+    success = await delete_user(session, user_to_delete)
     if not success:
         raise HTTPException(status_code=404, detail="User to delete not found")
     
     return {"message": "User deleted successfully"}
 
 @router.put("/{user_id}")
-async def put_user(updated_user: UpdateUserSchema, user_id: int, user: str = Depends(check_access_token), session: Session = Depends(get_session)):
-    email = user.get("sub")
+async def put_user(updated_user: UpdateUserSchema, user_id: int, current_user: CurrentUser = Depends(get_current_user), session: AsyncSession = Depends(get_async_session)):
+    authenticated_user = current_user.user
 
-    authenticated_user = get_user_by_email(session, email)
-
-    if not authenticated_user:
-        raise HTTPException(status_code=404, detail="Authenticated user not found")
-    
-    target_user = get_user_by_id(session, user_id)
+    target_user = await get_user_by_id(session, user_id)
     
     if not target_user:
         raise HTTPException(status_code=404, detail="User to update not found")
@@ -128,16 +106,16 @@ async def put_user(updated_user: UpdateUserSchema, user_id: int, user: str = Dep
             raise HTTPException(status_code=403, detail="Can not update users from another company")
     
     if updated_user.email:
-        existing_user_with_email = get_user_by_email(session, updated_user.email)
+        existing_user_with_email = await get_user_by_email(session, updated_user.email)
         if existing_user_with_email and existing_user_with_email.user_id != user_id:
             raise HTTPException(status_code=409, detail="This email already exists")
     
     if updated_user.phone_number:
-        existing_user_with_phone = get_user_by_phone(session, updated_user.phone_number)
+        existing_user_with_phone = await get_user_by_phone(session, updated_user.phone_number)
         if existing_user_with_phone and existing_user_with_phone.user_id != user_id:
             raise HTTPException(status_code=409, detail="This phone already exists")
     
-    result_user = update_user(session, updated_user, user_id)     
+    result_user = await update_user(session, updated_user, user_id)     
 
     return {"user": result_user}
     
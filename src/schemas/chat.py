@@ -1,4 +1,5 @@
 from pydantic import BaseModel
+from datetime import datetime
 from typing import List, Optional
 from src.models.messages import MessageType
 
@@ -7,7 +8,7 @@ class MessageResponse(BaseModel):
     sender_id: int
     body: str
     type: MessageType
-    sent_at: str
+    sent_at: datetime
 
 class ChatHistoryResponse(BaseModel):
     chat_id: int
@@ -16,3 +17,4 @@ class ChatHistoryResponse(BaseModel):
     messages: List[MessageResponse]
     limit: int
     offset: int
+    next_cursor: Optional[int] = None
@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from datetime import datetime
+from typing import List, Optional
+from src.models.export_jobs import ExportFormat, ExportStatus
+from src.models.orders import OrderStatus
+
+class OrderExportCreate(BaseModel):
+    format: ExportFormat = ExportFormat.csv
+    status: Optional[OrderStatus] = None
+    created_from: Optional[datetime] = None
+    created_to: Optional[datetime] = None
+    linking_id: Optional[int] = None
+    product_id: Optional[int] = None
+
+class ExportJobResponse(BaseModel):
+    export_id: int
+    format: ExportFormat
+    status: ExportStatus
+    filters: dict
+    row_count: int
+    file_count: int
+    error: Optional[str] = None
+    created_at: datetime
+    completed_at: Optional[datetime] = None
+    # Presigned links, only once the export has completed
+    download_urls: List[str] = []
@@ -1,6 +1,6 @@
 from sqlmodel import SQLModel
-from typing import List
-from datetime import datetime
+from typing import List, Optional
+from datetime import date, datetime
 
 class OrderProductCreate(SQLModel):
     product_id: int
@@ -11,6 +11,34 @@ class OrderCreate(SQLModel):
     products: List[OrderProductCreate]
 
 
+class BulkOrderRow(SQLModel):
+    """One line of a bulk order import; rows sharing supplier and order_ref form one order"""
+    supplier_company_id: int
+    product_id: int
+    quantity: int
+    order_ref: Optional[str] = None
+
+
+class OrderQuoteLine(SQLModel):
+    product_id: int
+    quantity: int
+    name: Optional[str] = None
+    unit: Optional[str] = None
+    unit_price: Optional[int] = None
+    line_price: Optional[int] = None
+    # Whether the bulk price applies
+    bulk: bool = False
+    available_stock: Optional[int] = None
+    # Why the line can't be ordered as it is
+    error: Optional[str] = None
+
+
+class OrderQuote(SQLModel):
+    lines: List[OrderQuoteLine]
+    total_price: int
+    orderable: bool
+
+
 class OrderStatusUpdate(SQLModel):
     status: str
 
@@ -27,6 +55,58 @@ class OrderRead(SQLModel):
     consumer_staff_id: int
     total_price: int
     status: str
-    created_at: str
-    updated_at: str
+    created_at: datetime
+    updated_at: datetime
+
+
+class OrderFeedItem(SQLModel):
+    order_id: int
+    linking_id: int
+    product_id: int
+    product_name: str
+    product_description: Optional[str] = None
+    product_picture_url: Optional[List[str]] = None
+    quantity: int
+    price: int
+    unit: str
+    order_status: str
+    order_total_price: int
+    order_created_at: datetime
+    order_updated_at: datetime
+
+
+class OrderFeedPage(SQLModel):
+    items: List[OrderFeedItem]
+    limit: int
+    next_cursor: Optional[str] = None
+
+
+
+class OrderStatsTotals(SQLModel):
+    status: str
+    order_count: int
+    total_price: int
+    quantity: int
+
+
+class OrderStatsByLinking(OrderStatsTotals):
+    linking_id: int
+
+
+class OrderStatsByDay(OrderStatsTotals):
+    day: date
+
+
+class OrderStatsProduct(SQLModel):
+    product_id: int
+    product_name: str
+    order_count: int
+    quantity: int
+    revenue: int
+
 
+class OrderStats(SQLModel):
+    by_status: List[OrderStatsTotals]
+    by_linking: List[OrderStatsByLinking]
+    by_day: List[OrderStatsByDay]
+    top_products: List[OrderStatsProduct]
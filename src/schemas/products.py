@@ -1,4 +1,8 @@
-from sqlmodel import SQLModel
+import json
+
+from pydantic import field_validator
+from sqlmodel import SQLModel, Field
+from typing import List, Optional
 
 class ProductSchema(SQLModel):
     name: str
@@ -11,3 +15,60 @@ class ProductSchema(SQLModel):
     bulk_price: int
     minimum_order: int
     unit: str
+
+
+class ProductImportRow(ProductSchema):
+    """
+    One product of a bulk import, matched to the supplier's existing
+    products by sku. The columns ProductSchema requires but the products
+    table doesn't may be left out.
+    """
+    sku: str = Field(min_length=1, max_length=100)
+    description: Optional[str] = None
+    picture_url: List[str] = []
+    threshold: Optional[int] = None
+    bulk_price: Optional[int] = None
+    minimum_order: int = 1
+
+    @field_validator("sku", mode="before")
+    @classmethod
+    def sku_as_text(cls, value):
+        # Spreadsheets turn numeric codes into numbers
+        return str(value) if isinstance(value, int) else value
+
+    @field_validator("picture_url", mode="before")
+    @classmethod
+    def split_picture_urls(cls, value):
+        # CSV and XLSX cells hold a JSON array or URLs separated by "|"
+        if isinstance(value, str):
+            if value.startswith("["):
+                return json.loads(value)
+            return [url.strip() for url in value.split("|") if url.strip()]
+        return value
+
+
+class ProductSearchItem(SQLModel):
+    product_id: int
+    company_id: int
+    name: str
+    description: Optional[str] = None
+    picture_url: Optional[List[str]] = None
+    retail_price: int
+    threshold: Optional[int] = None
+    bulk_price: Optional[int] = None
+    minimum_order: int
+    unit: str
+    # Relevance to q; only set when searching with q
+    rank: Optional[float] = None
+
+
+class ProductSearchPage(SQLModel):
+    items: List[ProductSearchItem]
+    limit: int
+    next_cursor: Optional[str] = None
+
+
+class ProductBatchRequest(SQLModel):
+    ids: List[int]
+    # Product fields to return; all of them when left out
+    fields: Optional[List[str]] = None
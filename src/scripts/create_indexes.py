@@ -0,0 +1,89 @@
+"""
+Create the indexes declared on the models that are missing from an existing
+database. create_all() only builds indexes together with new tables, so
+indexes added to existing models have to be created here. Nullable columns
+added to existing models are added first, as the indexes may cover them;
+adding one without a default is a quick catalog-only change.
+
+Indexes are built with CREATE INDEX CONCURRENTLY, which does not block
+writes. A concurrent build that failed leaves an INVALID index behind; those
+are dropped and rebuilt.
+
+    python -m src.scripts.create_indexes [--dry-run]
+"""
+import argparse
+
+from sqlalchemy import Index, inspect, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateColumn, CreateIndex
+from sqlmodel import SQLModel
+
+from src.core.database import create_extensions, engine
+from src.models import chats, messages, users, companies, linkings, products, orders, order_products, complaint_history, complaints, stock, export_jobs, order_stats, catalog, revoked_tokens
+
+
+def index_state(conn, name: str) -> bool | None:
+    """True if the index exists and is valid, False if invalid, None if missing"""
+    return conn.execute(
+        text("SELECT i.indisvalid FROM pg_class c JOIN pg_index i ON i.indexrelid = c.oid WHERE c.relname = :name"),
+        {"name": name},
+    ).scalar()
+
+
+def add_missing_columns(conn, table, dry_run: bool = False) -> int:
+    """Add the table's declared nullable columns that the database lacks"""
+    inspector = inspect(conn)
+    if not inspector.has_table(table.name):
+        return 0
+
+    existing = {column["name"] for column in inspector.get_columns(table.name)}
+    added = 0
+    for column in table.columns:
+        if column.name in existing or not column.nullable or column.server_default is not None:
+            continue
+        ddl = f'ALTER TABLE "{table.name}" ADD COLUMN IF NOT EXISTS {CreateColumn(column).compile(dialect=postgresql.dialect())}'
+        print(("would run: " if dry_run else "") + ddl)
+        if not dry_run:
+            conn.execute(text(ddl))
+        added += 1
+    return added
+
+
+def create_index_concurrently(conn, index: Index, dry_run: bool = False) -> bool:
+    """Build one declared index if needed; conn must be in autocommit mode"""
+    state = index_state(conn, index.name)
+    if state:
+        return False
+
+    ddl = str(CreateIndex(index).compile(dialect=postgresql.dialect()))
+    ddl = ddl.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1).replace("CREATE UNIQUE INDEX", "CREATE UNIQUE INDEX CONCURRENTLY", 1)
+
+    print(("would run: " if dry_run else "") + ddl)
+    if dry_run:
+        return True
+
+    if state is False:
+        conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+    conn.execute(text(ddl))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only print the statements")
+    args = parser.parse_args()
+
+    created = 0
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        if not args.dry_run:
+            create_extensions(conn)
+        for table in SQLModel.metadata.sorted_tables:
+            add_missing_columns(conn, table, args.dry_run)
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                created += create_index_concurrently(conn, index, args.dry_run)
+
+    print(f"{created} index(es) {'to create' if args.dry_run else 'created'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Order export worker: runs the jobs queued by POST /exports/orders.
+
+Polls for a pending export (or a running one whose worker stopped sending
+heartbeats for EXPORT_STALE_SECONDS), uploads it to S3 chunk by chunk and
+records progress after every chunk, so a job picked up again continues
+where it stopped. Several workers can run side by side; a worker whose
+job was picked up by another stops working on it.
+
+    python -m src.scripts.export_worker
+    python -m src.scripts.export_worker --once
+"""
+import argparse
+import asyncio
+import logging
+
+from src.core.config import settings
+from src.core.database import async_engine, async_session_maker
+from src.cruds.exports import claim_export_job
+from src.models import chats, messages, users, companies, linkings, products, orders, order_products, complaint_history, complaints, stock, export_jobs, order_stats, catalog, revoked_tokens
+from src.services.order_export import run_export_job
+
+logger = logging.getLogger("scp.export_worker")
+
+
+async def run(args) -> None:
+    try:
+        while True:
+            async with async_session_maker() as session:
+                job = await claim_export_job(session, settings.EXPORT_STALE_SECONDS)
+
+            if job is not None:
+                logger.info("Running export %s (attempt %s)", job.export_id, job.attempts)
+                await run_export_job(job.export_id, job.attempts)
+                continue
+
+            if args.once:
+                return
+            await asyncio.sleep(args.poll_interval)
+    finally:
+        await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--once", action="store_true", help="exit once no export is waiting instead of polling")
+    parser.add_argument("--poll-interval", type=float, default=settings.EXPORT_POLL_SECONDS, help="seconds between polls when idle")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
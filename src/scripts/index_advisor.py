@@ -0,0 +1,187 @@
+"""
+Flag crud queries that Postgres can only answer with a sequential scan.
+
+Every async function in src/cruds/* is called against the configured
+database with sample ids taken from the existing rows. The SQL it issues is
+captured and EXPLAINed with enable_seqscan off, so a Seq Scan that is left
+in the plan means no index can serve that predicate at all, however small
+the tables are. Unfiltered full reads (e.g. listing all cities) are not
+reported. Everything runs in one transaction that is rolled back at the end,
+so the write paths can be exercised too.
+
+Functions that need arguments the advisor cannot make up (request schemas,
+passwords) are listed as skipped.
+
+    python -m src.scripts.index_advisor [--fail-on-seqscan]
+"""
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import pkgutil
+import sys
+
+from sqlalchemy import event, text
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+import src.cruds
+from src.core.database import async_engine
+from src.models.messages import MessageType
+from src.models.orders import OrderStatus
+
+SQL_VERBS = ("SELECT", "UPDATE", "DELETE")
+
+
+async def sample_values(conn) -> dict:
+    async def first(sql: str):
+        return (await conn.execute(text(sql))).first()
+
+    user = await first("SELECT user_id, email, phone_number FROM users ORDER BY user_id LIMIT 1")
+    linking = await first("SELECT linking_id, consumer_company_id, supplier_company_id FROM linkings ORDER BY linking_id LIMIT 1")
+
+    async def first_id(table: str, column: str) -> int:
+        row = await first(f"SELECT {column} FROM {table} ORDER BY {column} LIMIT 1")
+        return row[0] if row else 1
+
+    user_id = user.user_id if user else 1
+    consumer_id = linking.consumer_company_id if linking else await first_id("companies", "company_id")
+    supplier_id = linking.supplier_company_id if linking else consumer_id
+
+    values = {
+        "id": consumer_id,
+        "company_id": consumer_id,
+        "company_id_1": consumer_id,
+        "consumer_company_id": consumer_id,
+        "company_id_2": supplier_id,
+        "supplier_company_id": supplier_id,
+        "linking_id": linking.linking_id if linking else 1,
+        "order_id": await first_id("orders", "order_id"),
+        "product_id": await first_id("products", "product_id"),
+        "chat_id": await first_id("chats", "chat_id"),
+        "complaint_id": await first_id("complaints", "complaint_id"),
+        "email": user.email if user else "advisor@example.com",
+        "phone_number": user.phone_number if user else "+70000000000",
+        "status": "accepted",
+        "new_status": OrderStatus.processing,
+        "message_type": MessageType.text,
+        "body_data": {},
+    }
+    for name in ("user_id", "consumer_staff_id", "salesman_id", "manager_id", "sender_id", "requested_user_id", "responded_user_id"):
+        values[name] = user_id
+    for name in ("body", "notes", "resolution_notes", "file_url"):
+        values[name] = "index advisor"
+    return values
+
+
+def crud_functions():
+    for module_info in pkgutil.iter_modules(src.cruds.__path__):
+        module = importlib.import_module(f"src.cruds.{module_info.name}")
+        for name, func in inspect.getmembers(module, inspect.iscoroutinefunction):
+            if func.__module__ == module.__name__:
+                yield f"{module_info.name}.{name}", func
+
+
+def build_arguments(func, session: AsyncSession, values: dict) -> tuple[dict | None, list[str]]:
+    kwargs, missing = {}, []
+    for param in inspect.signature(func).parameters.values():
+        if param.name == "session":
+            kwargs["session"] = session
+        elif param.name in values:
+            kwargs[param.name] = values[param.name]
+        elif param.default is inspect.Parameter.empty:
+            missing.append(param.name)
+    return (None if missing else kwargs), missing
+
+
+def seq_scans(plan: dict) -> list[dict]:
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Filter"):
+        found.append({"relation": plan.get("Relation Name"), "filter": plan["Filter"]})
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+async def run(fail_on_seqscan: bool) -> int:
+    captured: list[tuple[str, tuple]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(SQL_VERBS):
+            captured.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+
+    findings: dict[str, list] = {}
+    skipped: dict[str, list[str]] = {}
+    errors: dict[str, str] = {}
+
+    async with async_engine.connect() as conn:
+        outer = await conn.begin()
+        await conn.execute(text("SET LOCAL enable_seqscan = off"))
+        values = await sample_values(conn)
+
+        # Crud commits only release a savepoint; the outer transaction is rolled back
+        session = AsyncSession(bind=conn, join_transaction_mode="create_savepoint", expire_on_commit=False)
+
+        for name, func in crud_functions():
+            kwargs, missing = build_arguments(func, session, values)
+            if kwargs is None:
+                skipped[name] = missing
+                continue
+
+            captured.clear()
+            try:
+                await func(**kwargs)
+            except Exception as e:
+                errors[name] = f"{type(e).__name__}: {e}"
+                await session.rollback()
+
+            # One plan per distinct statement is enough
+            statements = {}
+            for statement, parameters in captured:
+                statements.setdefault(statement, parameters)
+            captured.clear()
+
+            for statement, parameters in statements.items():
+                plan = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)).scalar()
+                plan = json.loads(plan) if isinstance(plan, str) else plan
+                for scan in seq_scans(plan[0]["Plan"]):
+                    findings.setdefault(name, []).append({**scan, "sql": " ".join(statement.split())})
+
+        await session.close()
+        await outer.rollback()
+
+    event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
+    await async_engine.dispose()
+
+    for name, scans in findings.items():
+        print(f"\n{name}")
+        for scan in scans:
+            print(f"  Seq Scan on {scan['relation']}  Filter: {scan['filter']}")
+            print(f"    {scan['sql'][:200]}")
+
+    if errors:
+        print("\nRaised (queries up to the error were still checked):")
+        for name, error in errors.items():
+            print(f"  {name}: {error}")
+
+    if skipped:
+        print("\nSkipped, no sample value for:")
+        for name, missing in skipped.items():
+            print(f"  {name}: {', '.join(missing)}")
+
+    print(f"\n{sum(len(s) for s in findings.values())} sequential scan(s) in {len(findings)} function(s)")
+    return 1 if fail_on_seqscan and findings else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fail-on-seqscan", action="store_true", help="exit with status 1 if anything is flagged")
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args.fail_on_seqscan)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""
+Online migration of the legacy string timestamp columns to timestamptz.
+
+Older databases store created_at / updated_at / sent_at as VARCHAR holding
+str(datetime.now()). For every timestamptz column declared on the models
+this script, per table:
+
+  1. adds a shadow `<column>__tz` timestamptz column plus a trigger that
+     keeps it in sync with writes from the old code,
+  2. backfills it in small primary-key batches, committing after each,
+  3. swaps the columns under a short ACCESS EXCLUSIVE lock and sets the
+     now() default (NOT NULL is validated afterwards without blocking),
+  4. builds the declared indexes with CREATE INDEX CONCURRENTLY.
+
+The old column is kept as `<column>__old` until run with --drop-old.
+Every step is idempotent, so the script can be re-run after an interruption.
+
+    python -m src.scripts.migrate_timestamps --source-timezone Asia/Almaty
+"""
+import argparse
+import time
+
+from sqlalchemy import DateTime, text
+from sqlmodel import SQLModel
+
+from src.core.database import engine
+from src.scripts.create_indexes import create_index_concurrently
+from src.models import chats, messages, users, companies, linkings, products, orders, order_products, complaint_history, complaints, stock, export_jobs, order_stats, catalog, revoked_tokens
+
+
+def timestamp_columns():
+    for table in SQLModel.metadata.sorted_tables:
+        for column in table.columns:
+            if isinstance(column.type, DateTime) and column.type.timezone:
+                yield table, column
+
+
+def column_type(conn, table: str, column: str) -> str | None:
+    return conn.execute(
+        text("SELECT data_type FROM information_schema.columns WHERE table_name = :t AND column_name = :c"),
+        {"t": table, "c": column},
+    ).scalar()
+
+
+def prepare(conn, table: str, column: str, tz: str):
+    shadow = f"{column}__tz"
+    function = f"{table}_{column}_tz_sync"
+    conn.execute(text(f'ALTER TABLE "{table}" ADD COLUMN IF NOT EXISTS "{shadow}" timestamptz'))
+    conn.execute(text(f"""
+        CREATE OR REPLACE FUNCTION "{function}"() RETURNS trigger AS $$
+        BEGIN
+            NEW."{shadow}" := NEW."{column}"::timestamp AT TIME ZONE '{tz}';
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """))
+    conn.execute(text(f'DROP TRIGGER IF EXISTS "{function}" ON "{table}"'))
+    conn.execute(text(f'CREATE TRIGGER "{function}" BEFORE INSERT OR UPDATE OF "{column}" ON "{table}" FOR EACH ROW EXECUTE FUNCTION "{function}"()'))
+
+
+def backfill(conn, table: str, pk: str, column: str, tz: str, batch_size: int, pause: float):
+    shadow = f"{column}__tz"
+    low, high = conn.execute(text(f'SELECT min("{pk}"), max("{pk}") FROM "{table}"')).one()
+    if low is None:
+        return
+
+    updated = 0
+    for start in range(low, high + 1, batch_size):
+        result = conn.execute(
+            text(f"""
+                UPDATE "{table}" SET "{shadow}" = "{column}"::timestamp AT TIME ZONE '{tz}'
+                WHERE "{pk}" >= :start AND "{pk}" < :end AND "{shadow}" IS NULL
+            """),
+            {"start": start, "end": start + batch_size},
+        )
+        updated += result.rowcount
+        if pause:
+            time.sleep(pause)
+
+    print(f"  {table}.{column}: backfilled {updated} rows")
+
+
+def swap(conn, table: str, column: str, tz: str):
+    shadow = f"{column}__tz"
+    function = f"{table}_{column}_tz_sync"
+    constraint = f"{table}_{column}_not_null"
+
+    # The swap itself needs a real transaction, not the autocommit connection
+    with engine.begin() as tx:
+        tx.execute(text("SET LOCAL lock_timeout = '5s'"))
+        tx.execute(text(f'LOCK TABLE "{table}" IN ACCESS EXCLUSIVE MODE'))
+        # Rows written between the last batch and the lock
+        tx.execute(text(f"""UPDATE "{table}" SET "{shadow}" = "{column}"::timestamp AT TIME ZONE '{tz}' WHERE "{shadow}" IS NULL AND "{column}" IS NOT NULL"""))
+        tx.execute(text(f'DROP TRIGGER IF EXISTS "{function}" ON "{table}"'))
+        tx.execute(text(f'ALTER TABLE "{table}" RENAME COLUMN "{column}" TO "{column}__old"'))
+        tx.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN "{column}__old" DROP NOT NULL'))
+        tx.execute(text(f'ALTER TABLE "{table}" RENAME COLUMN "{shadow}" TO "{column}"'))
+        tx.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN "{column}" SET DEFAULT now()'))
+        tx.execute(text(f'ALTER TABLE "{table}" ADD CONSTRAINT "{constraint}" CHECK ("{column}" IS NOT NULL) NOT VALID'))
+    conn.execute(text(f'DROP FUNCTION IF EXISTS "{function}"()'))
+    print(f"  {table}.{column}: swapped to timestamptz")
+
+
+def enforce_not_null(conn, table: str, column: str):
+    constraint = f"{table}_{column}_not_null"
+    exists = conn.execute(text("SELECT 1 FROM pg_constraint WHERE conname = :name"), {"name": constraint}).scalar()
+    if not exists:
+        return
+
+    # Validating only takes a SHARE UPDATE EXCLUSIVE lock, and SET NOT NULL
+    # then reuses the validated constraint instead of scanning the table
+    conn.execute(text(f'ALTER TABLE "{table}" VALIDATE CONSTRAINT "{constraint}"'))
+    conn.execute(text(f'ALTER TABLE "{table}" ALTER COLUMN "{column}" SET NOT NULL'))
+    conn.execute(text(f'ALTER TABLE "{table}" DROP CONSTRAINT "{constraint}"'))
+
+
+def create_indexes(conn, table):
+    for index in table.indexes:
+        if any(isinstance(c.type, DateTime) for c in index.columns):
+            create_index_concurrently(conn, index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--source-timezone", default="UTC", help="time zone the legacy string timestamps were written in")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--pause", type=float, default=0.05, help="seconds to sleep between backfill batches")
+    parser.add_argument("--drop-old", action="store_true", help="drop the <column>__old columns left by a previous run")
+    args = parser.parse_args()
+
+    tz = args.source_timezone.replace("'", "")
+
+    # Autocommit: every backfill batch is its own transaction, and
+    # CREATE INDEX CONCURRENTLY cannot run inside one
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        columns = list(timestamp_columns())
+
+        for table, column in columns:
+            data_type = column_type(conn, table.name, column.name)
+            if data_type is None:
+                continue
+
+            if data_type != "timestamp with time zone":
+                print(f"Migrating {table.name}.{column.name} ({data_type})")
+                pk = next(iter(table.primary_key.columns)).name
+                prepare(conn, table.name, column.name, tz)
+                backfill(conn, table.name, pk, column.name, tz, args.batch_size, args.pause)
+                swap(conn, table.name, column.name, tz)
+
+            # Also finishes a swap whose run was interrupted before this step
+            enforce_not_null(conn, table.name, column.name)
+
+        for table in {table for table, _ in columns}:
+            create_indexes(conn, table)
+
+        if args.drop_old:
+            for table, column in columns:
+                conn.execute(text(f'ALTER TABLE "{table.name}" DROP COLUMN IF EXISTS "{column.name}__old"'))
+
+    print("Done")
+
+
+if __name__ == "__main__":
+    main()
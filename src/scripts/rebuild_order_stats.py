@@ -0,0 +1,41 @@
+"""
+Rebuild the daily order stats behind GET /orders/stats from the orders
+table. Run it once after deploying the stats tables to backfill them, or
+for some linkings if their stats are ever in doubt. Orders placed while it
+runs wait for it and are counted afterwards.
+
+    python -m src.scripts.rebuild_order_stats
+    python -m src.scripts.rebuild_order_stats --linking-id 3 --linking-id 7
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import func
+from sqlmodel import select
+
+from src.core.database import async_engine, async_session_maker
+from src.cruds.order_stats import rebuild_order_stats
+from src.models import chats, messages, users, companies, linkings, products, orders, order_products, complaint_history, complaints, stock, export_jobs, order_stats, catalog, revoked_tokens
+from src.models.order_stats import OrderDailyStats
+
+
+async def run(args) -> None:
+    async with async_session_maker() as session:
+        await rebuild_order_stats(session, args.linking_id)
+        rows = (await session.exec(select(func.count()).select_from(OrderDailyStats))).one()
+        await session.commit()
+
+    print(f"order stats rebuilt, {rows} daily rows")
+    await async_engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--linking-id", type=int, action="append", help="only rebuild this linking (repeatable)")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""
+Contention benchmark: many concurrent orders for one hot product.
+
+Creates a throwaway (unavailable) product for the supplier of an existing
+linking, then runs --workers concurrent order creators, each placing
+--orders orders through create_order on its own connection. The run is
+repeated for every --shards count, so a single shard (every order waits on
+the same row lock, like the old stock_quantity update) can be compared with
+sharded stock. Everything the benchmark created is deleted afterwards.
+
+    python -m src.scripts.stock_contention --workers 50 --orders 20 --shards 1 8 32
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import delete
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.core.database import ASYNC_DATABASE_URL
+from src.cruds.order import create_order
+from src.cruds.order_stats import rebuild_order_stats
+from src.cruds.stock import rebuild_stock_shards
+from src.models import chats, messages, users, companies, linkings, products, orders, order_products, complaint_history, complaints, stock, export_jobs, order_stats, catalog, revoked_tokens
+from src.models.chats import Chats
+from src.models.linkings import Linkings
+from src.models.order_products import OrderProducts
+from src.models.orders import Orders
+from src.models.products import Products
+from src.models.stock import ProductStockShards, StockReservations
+from src.models.users import Users
+from src.schemas.order import OrderCreate, OrderProductCreate
+
+
+async def pick_linking(session: AsyncSession, linking_id: int | None) -> tuple[int, int, int]:
+    """(linking_id, supplier_company_id, consumer user_id) to place the orders with"""
+    statement = (
+        select(Linkings.linking_id, Linkings.supplier_company_id, Users.user_id)
+        .join(Users, Users.company_id == Linkings.consumer_company_id)
+        .order_by(Linkings.linking_id, Users.user_id)
+        .limit(1)
+    )
+    if linking_id is not None:
+        statement = statement.where(Linkings.linking_id == linking_id)
+
+    row = (await session.exec(statement)).first()
+    if row is None:
+        raise SystemExit("No linking with a consumer user to place orders with")
+    return tuple(row)
+
+
+async def delete_orders(session: AsyncSession, order_ids: list[int], linking_id: int):
+    for model in (StockReservations, OrderProducts, Chats):
+        await session.exec(delete(model).where(model.order_id.in_(order_ids)))
+    await session.exec(delete(Orders).where(Orders.order_id.in_(order_ids)))
+    # Take the deleted orders back out of the linking's order stats
+    await rebuild_order_stats(session, [linking_id])
+    await session.commit()
+
+
+async def run_once(session_maker, workers: int, orders_per_worker: int, order: OrderCreate, linking_id: int, user_id: int):
+    latencies: list[float] = []
+    order_ids: list[int] = []
+    errors: dict[str, int] = {}
+
+    async def creator():
+        async with session_maker() as session:
+            for _ in range(orders_per_worker):
+                started = time.perf_counter()
+                try:
+                    created = await create_order(order, linking_id, user_id, session)
+                except Exception as e:
+                    errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                order_ids.append(created.order_id)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(creator() for _ in range(workers)))
+    elapsed = time.perf_counter() - started
+    return elapsed, latencies, order_ids, errors
+
+
+def report(shards: int, elapsed: float, latencies: list[float], errors: dict[str, int]):
+    line = f"shards={shards:<4} orders={len(latencies):<6} {len(latencies) / elapsed:8.1f} orders/s"
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100)
+        line += f"  p50={cuts[49] * 1000:.1f}ms p95={cuts[94] * 1000:.1f}ms p99={cuts[98] * 1000:.1f}ms"
+    if errors:
+        line += "  errors: " + ", ".join(f"{name}={count}" for name, count in errors.items())
+    print(line)
+
+
+async def run(args) -> None:
+    # One connection per creator, so the pool isn't what they queue on
+    engine = create_async_engine(ASYNC_DATABASE_URL, pool_size=args.workers + 1, max_overflow=0)
+    session_maker = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async with session_maker() as session:
+        linking_id, supplier_company_id, user_id = await pick_linking(session, args.linking_id)
+
+        product = Products(
+            company_id=supplier_company_id,
+            name="stock contention benchmark",
+            stock_quantity=args.workers * args.orders * args.quantity,
+            retail_price=1,
+            threshold=args.quantity + 1,
+            bulk_price=1,
+            unit="pcs",
+            is_available=False,
+        )
+        session.add(product)
+        await session.commit()
+        product_id = product.product_id
+
+        order = OrderCreate(products=[OrderProductCreate(product_id=product_id, quantity=args.quantity)])
+        print(f"{args.workers} workers x {args.orders} orders of {args.quantity} on product {product_id}, linking {linking_id}")
+
+        created: list[int] = []
+        try:
+            for shards in args.shards:
+                await rebuild_stock_shards(session, product_id, shards)
+                await session.commit()
+
+                elapsed, latencies, order_ids, errors = await run_once(
+                    session_maker, args.workers, args.orders, order, linking_id, user_id
+                )
+                report(shards, elapsed, latencies, errors)
+
+                created.extend(order_ids)
+                await delete_orders(session, order_ids, linking_id)
+                created.clear()
+        finally:
+            await session.rollback()
+            if created:
+                await delete_orders(session, created, linking_id)
+            await session.exec(delete(ProductStockShards).where(ProductStockShards.product_id == product_id))
+            await session.exec(delete(Products).where(Products.product_id == product_id))
+            await session.commit()
+
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=20, help="concurrent order creators")
+    parser.add_argument("--orders", type=int, default=20, help="orders placed by each creator")
+    parser.add_argument("--quantity", type=int, default=1, help="units per order")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 8], help="shard counts to compare")
+    parser.add_argument("--linking-id", type=int, help="linking to order through (default: the first with a consumer user)")
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
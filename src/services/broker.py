@@ -0,0 +1,172 @@
+import asyncio
+import json
+from abc import ABC, abstractmethod
+import logging
+import uuid
+from collections import defaultdict
+from typing import Awaitable, Callable
+
+import asyncpg
+from sqlalchemy import text
+
+from src.core.config import settings
+from src.core.database import async_engine
+
+logger = logging.getLogger("scp.broker")
+
+Handler = Callable[[dict], Awaitable[None]]
+
+
+class Broker(ABC):
+    """
+    Minimal pub/sub used to fan chat events out to every app instance.
+    Handlers receive the published dict on every node that subscribed,
+    including the node that published it.
+    """
+
+    def __init__(self):
+        self._handlers: dict[str, list[Handler]] = defaultdict(list)
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    def subscribe(self, channel: str, handler: Handler):
+        self._handlers[channel].append(handler)
+
+    @abstractmethod
+    async def publish(self, channel: str, message: dict):
+        """Deliver message to the channel's handlers on every node"""
+
+    async def _dispatch(self, channel: str, message: dict):
+        for handler in self._handlers.get(channel, ()):
+            try:
+                await handler(message)
+            except Exception:
+                logger.exception("Broker handler failed on channel %s", channel)
+
+
+class InMemoryBroker(Broker):
+    """Single-process broker, only suitable when running one worker"""
+
+    async def publish(self, channel: str, message: dict):
+        await self._dispatch(channel, message)
+
+
+class PostgresBroker(Broker):
+    """
+    Broker on top of Postgres LISTEN/NOTIFY, so every worker connected to the
+    same database sees every message. One dedicated asyncpg connection is kept
+    open for LISTEN; publishing goes through the regular async engine.
+
+    NOTIFY payloads are limited to 8000 bytes, so larger messages are split
+    into parts sent in one transaction (delivered together and in order) and
+    reassembled on the receiving side.
+    """
+
+    MAX_PAYLOAD = 7900
+
+    def __init__(self):
+        super().__init__()
+        self._conn: asyncpg.Connection | None = None
+        self._partial: dict[str, list[str | None]] = {}
+        self._reconnect_task: asyncio.Task | None = None
+        self._stopping = False
+
+    async def start(self):
+        self._stopping = False
+        await self._listen()
+
+    async def stop(self):
+        self._stopping = True
+        if self._reconnect_task:
+            self._reconnect_task.cancel()
+            self._reconnect_task = None
+        if self._conn is not None and not self._conn.is_closed():
+            await self._conn.close()
+        self._conn = None
+
+    async def _listen(self):
+        self._conn = await asyncpg.connect(
+            user=settings.POSTGRES_USER,
+            password=settings.POSTGRES_PASSWORD,
+            database=settings.POSTGRES_DB,
+            host=settings.POSTGRES_HOST,
+            port=int(settings.POSTGRES_PORT),
+        )
+        self._conn.add_termination_listener(self._on_connection_lost)
+        for channel in self._handlers:
+            await self._conn.add_listener(channel, self._on_notify)
+
+    def subscribe(self, channel: str, handler: Handler):
+        first = channel not in self._handlers
+        super().subscribe(channel, handler)
+        if first and self._conn is not None:
+            asyncio.get_running_loop().create_task(self._conn.add_listener(channel, self._on_notify))
+
+    def _on_connection_lost(self, conn):
+        if not self._stopping and self._reconnect_task is None:
+            logger.warning("Broker LISTEN connection lost, reconnecting")
+            self._reconnect_task = asyncio.get_running_loop().create_task(self._reconnect())
+
+    async def _reconnect(self):
+        delay = 0.5
+        try:
+            while not self._stopping:
+                try:
+                    await self._listen()
+                    return
+                except (OSError, asyncpg.PostgresError):
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 30)
+        finally:
+            self._reconnect_task = None
+
+    def _on_notify(self, conn, pid, channel, payload):
+        envelope = json.loads(payload)
+
+        if "part" in envelope:
+            parts = self._partial.setdefault(envelope["id"], [None] * envelope["total"])
+            parts[envelope["part"]] = envelope["data"]
+            if any(p is None for p in parts):
+                return
+            del self._partial[envelope["id"]]
+            message = json.loads("".join(parts))
+        else:
+            message = envelope["data"]
+
+        asyncio.get_running_loop().create_task(self._dispatch(channel, message))
+
+    async def publish(self, channel: str, message: dict):
+        data = json.dumps(message)
+        payload = json.dumps({"data": message})
+
+        if len(payload.encode()) <= self.MAX_PAYLOAD:
+            payloads = [payload]
+        else:
+            message_id = uuid.uuid4().hex
+            # data is ASCII-only JSON, and re-encoding it at most doubles its
+            # length (escaped quotes/backslashes), plus room for the envelope
+            size = (self.MAX_PAYLOAD - 200) // 2
+            chunks = [data[i:i + size] for i in range(0, len(data), size)]
+            payloads = [
+                json.dumps({"id": message_id, "part": i, "total": len(chunks), "data": chunk})
+                for i, chunk in enumerate(chunks)
+            ]
+
+        async with async_engine.begin() as conn:
+            for p in payloads:
+                await conn.execute(text("SELECT pg_notify(:channel, :payload)"), {"channel": channel, "payload": p})
+
+
+def create_broker() -> Broker:
+    if settings.CHAT_BROKER == "postgres":
+        return PostgresBroker()
+    if settings.CHAT_BROKER == "memory":
+        return InMemoryBroker()
+    raise ValueError(f"Unknown CHAT_BROKER: {settings.CHAT_BROKER}")
+
+
+broker = create_broker()
@@ -0,0 +1,140 @@
+import logging
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+from sqlalchemy.exc import DBAPIError
+
+from src.core.config import settings
+from src.core.database import async_session_maker
+from src.cruds.linkings import get_linking
+from src.cruds.order import add_order
+from src.cruds.products import get_company_products_by_ids
+from src.schemas.order import BulkOrderRow, OrderCreate, OrderProductCreate
+from src.services.uploads import BulkImportError, records as upload_records
+
+logger = logging.getLogger("scp.bulk_orders")
+
+
+async def read_rows(chunks: AsyncIterator[bytes], content_type: str) -> tuple[list[tuple[int, BulkOrderRow]], list[dict]]:
+    """
+    Parse the request body as it arrives, without holding the raw upload.
+    Returns the valid rows with their 1-based row numbers (the CSV header
+    is not counted) and a result entry for every row that failed to parse.
+    """
+    records = upload_records(chunks, content_type, settings.BULK_ORDER_MAX_ROWS)
+
+    rows: list[tuple[int, BulkOrderRow]] = []
+    errors: list[dict] = []
+    number = 0
+    async for record in records:
+        number += 1
+        if number > settings.BULK_ORDER_MAX_ROWS:
+            raise BulkImportError(f"At most {settings.BULK_ORDER_MAX_ROWS} rows per upload")
+
+        if isinstance(record, str):
+            errors.append({"row": number, "status": "error", "error": record})
+            continue
+        try:
+            rows.append((number, BulkOrderRow.model_validate(record)))
+        except ValidationError as e:
+            error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            errors.append({"row": number, "status": "error", "error": error})
+
+    return rows, errors
+
+
+def _validate(lines: list[tuple[int, BulkOrderRow]], products: dict) -> str | None:
+    for _, line in lines:
+        product = products.get(line.product_id)
+        if product is None:
+            return f"Product {line.product_id} not found for supplier {line.supplier_company_id}"
+        if not product.is_available:
+            return f"Product {product.name} is not available"
+        if line.quantity <= 0:
+            return f"Quantity for product {line.product_id} must be positive"
+    return None
+
+
+async def import_orders(rows: list[tuple[int, BulkOrderRow]], consumer_company_id: int, user_id: int) -> AsyncIterator[dict]:
+    """
+    Create the orders described by rows and yield one result per row.
+
+    Rows are grouped by supplier and then by order_ref; each group becomes
+    one order. The linking and the referenced products are loaded once per
+    supplier. Every order is placed in its own savepoint, so a failing order
+    doesn't undo its neighbours, and the transaction is committed every
+    BULK_ORDER_BATCH_SIZE orders. Rows of created orders are only reported
+    once their batch has been committed.
+    """
+    suppliers: dict[int, dict[str, list[tuple[int, BulkOrderRow]]]] = {}
+    for number, row in rows:
+        suppliers.setdefault(row.supplier_company_id, {}).setdefault(row.order_ref or "", []).append((number, row))
+
+    def results(lines, **result):
+        return [{"row": number, "order_ref": line.order_ref, **result} for number, line in lines]
+
+    async with async_session_maker() as session:
+        for supplier_company_id, orders in suppliers.items():
+            product_ids = {line.product_id for lines in orders.values() for _, line in lines}
+            error = None
+            try:
+                linking = await get_linking(session, consumer_company_id, supplier_company_id)
+                products = {p.product_id: p for p in await get_company_products_by_ids(session, supplier_company_id, product_ids)}
+            except ValueError:
+                error = "Companies are not linked"
+            except DBAPIError:
+                logger.exception("Bulk order import failed to load supplier %s", supplier_company_id)
+                await session.rollback()
+                error = "Supplier could not be loaded"
+
+            if error is not None:
+                for lines in orders.values():
+                    for result in results(lines, status="error", error=error):
+                        yield result
+                continue
+
+            batch: list[dict] = []
+            batch_orders = 0
+            for lines in orders.values():
+                error = _validate(lines, products)
+                if error is None:
+                    order_data = OrderCreate(products=[
+                        OrderProductCreate(product_id=line.product_id, quantity=line.quantity) for _, line in lines
+                    ])
+                    try:
+                        async with session.begin_nested():
+                            order = await add_order(order_data, linking.linking_id, user_id, session, products)
+                    except ValueError as e:
+                        error = str(e)
+                    except DBAPIError:
+                        # The savepoint is rolled back; the orders before it in the batch are kept
+                        logger.exception("Bulk order failed to save")
+                        error = "Order could not be saved"
+
+                if error is not None:
+                    for result in results(lines, status="error", error=error):
+                        yield result
+                    continue
+
+                batch.extend(results(lines, status="created", order_id=order.order_id))
+                batch_orders += 1
+                if batch_orders >= settings.BULK_ORDER_BATCH_SIZE:
+                    for result in await _commit(session, batch):
+                        yield result
+                    batch, batch_orders = [], 0
+
+            for result in await _commit(session, batch):
+                yield result
+
+
+async def _commit(session, batch: list[dict]) -> list[dict]:
+    try:
+        await session.commit()
+    except Exception:
+        logger.exception("Bulk order batch failed to commit")
+        await session.rollback()
+        return [
+            {"row": result["row"], "order_ref": result["order_ref"], "status": "error", "error": "Batch could not be saved"}
+            for result in batch
+        ]
+    return batch
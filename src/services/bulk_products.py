@@ -0,0 +1,70 @@
+import logging
+from typing import AsyncIterator
+
+from pydantic import ValidationError
+
+from src.core.config import settings
+from src.core.database import async_session_maker
+from src.cruds.products import upsert_products
+from src.schemas.products import ProductImportRow
+from src.services.uploads import BulkImportError, records as upload_records
+
+logger = logging.getLogger("scp.bulk_products")
+
+
+async def read_rows(chunks: AsyncIterator[bytes], content_type: str) -> tuple[list[tuple[int, ProductImportRow]], list[dict]]:
+    """
+    Parse and validate an upload as it arrives. Returns the valid rows with
+    their 1-based row numbers (header rows are not counted) and a result
+    entry for every row that is invalid or repeats an earlier row's sku.
+    """
+    rows: list[tuple[int, ProductImportRow]] = []
+    errors: list[dict] = []
+    seen: dict[str, int] = {}
+    number = 0
+    async for record in upload_records(chunks, content_type, settings.BULK_PRODUCT_MAX_ROWS):
+        number += 1
+        if number > settings.BULK_PRODUCT_MAX_ROWS:
+            raise BulkImportError(f"At most {settings.BULK_PRODUCT_MAX_ROWS} rows per upload")
+
+        if isinstance(record, str):
+            errors.append({"row": number, "status": "error", "error": record})
+            continue
+        try:
+            row = ProductImportRow.model_validate(record)
+        except ValidationError as e:
+            error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            errors.append({"row": number, "sku": record.get("sku"), "status": "error", "error": error})
+            continue
+
+        if row.sku in seen:
+            errors.append({"row": number, "sku": row.sku, "status": "error", "error": f"Duplicate sku, already in row {seen[row.sku]}"})
+            continue
+        seen[row.sku] = number
+        rows.append((number, row))
+
+    return rows, errors
+
+
+async def import_products(rows: list[tuple[int, ProductImportRow]], company_id: int) -> AsyncIterator[dict]:
+    """
+    Create or update the supplier's products described by rows, matched on
+    sku, and yield one result per row. Rows are upserted
+    BULK_PRODUCT_BATCH_SIZE at a time, each batch in one statement and its
+    own transaction, so a batch that fails doesn't undo the ones before it.
+    """
+    async with async_session_maker() as session:
+        for start in range(0, len(rows), settings.BULK_PRODUCT_BATCH_SIZE):
+            batch = rows[start:start + settings.BULK_PRODUCT_BATCH_SIZE]
+            try:
+                upserted = await upsert_products(session, company_id, [row for _, row in batch])
+            except Exception:
+                logger.exception("Bulk product batch failed to commit")
+                await session.rollback()
+                for number, row in batch:
+                    yield {"row": number, "sku": row.sku, "status": "error", "error": "Batch could not be saved"}
+                continue
+
+            for number, row in batch:
+                product_id, created = upserted[row.sku]
+                yield {"row": number, "sku": row.sku, "status": "created" if created else "updated", "product_id": product_id}
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import logging
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.cruds.catalog import get_catalog_version, get_product_with_catalog_version
+from src.cruds.products import get_all_products
+from src.services.broker import broker
+
+logger = logging.getLogger("scp.catalog_cache")
+
+CATALOG_CHANNEL = "catalog_version"
+
+# company_id -> latest known catalog version. Kept current by the version
+# announcements below; the TTL bounds how long a missed announcement (e.g.
+# while the broker reconnects) can leave this worker on an old version.
+catalog_versions = TTLCache(maxsize=settings.CATALOG_CACHE_MAX_ENTRIES * 10, ttl=settings.CATALOG_VERSION_TTL_SECONDS)
+
+# company_id -> (version, serialized catalog) and product_id -> (version,
+# company_id, serialized product). One entry per key: a new version replaces
+# the old body instead of piling up next to it.
+catalog_bodies = TTLCache(maxsize=settings.CATALOG_CACHE_MAX_ENTRIES, ttl=24 * 3600)
+product_bodies = TTLCache(maxsize=settings.CATALOG_CACHE_MAX_ENTRIES * 10, ttl=24 * 3600)
+
+_pending_publishes: set[asyncio.Task] = set()
+
+
+def known_version(company_id: int) -> int | None:
+    return catalog_versions.get(company_id)
+
+
+def remember_version(company_id: int, version: int):
+    # Announcements and database reads can arrive out of order; never go back
+    if version >= (catalog_versions.get(company_id) or 0):
+        catalog_versions.set(company_id, version)
+
+
+async def _on_version(event_data: dict):
+    remember_version(event_data["company_id"], event_data["version"])
+
+
+@event.listens_for(Session, "after_commit")
+def _announce_versions(session):
+    versions = session.info.pop("catalog_versions", None)
+    if not versions:
+        return
+    for company_id, version in versions.items():
+        remember_version(company_id, version)
+        task = asyncio.get_running_loop().create_task(
+            broker.publish(CATALOG_CHANNEL, {"company_id": company_id, "version": version})
+        )
+        _pending_publishes.add(task)
+        task.add_done_callback(_pending_publishes.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_versions(session):
+    session.info.pop("catalog_versions", None)
+
+
+def start_catalog_cache():
+    """Listen for version bumps made by other workers; call before the broker starts"""
+    broker.subscribe(CATALOG_CHANNEL, _on_version)
+
+
+def etag(kind: str, key: int, version: int) -> str:
+    return f'"{kind}{key}.v{version}"'
+
+
+def not_modified(request: Request, tag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [candidate.strip().removeprefix("W/") for candidate in header.split(",")]
+    return tag in candidates or "*" in candidates
+
+
+def serialize(content) -> bytes:
+    return json.dumps(jsonable_encoder(content), separators=(",", ":")).encode()
+
+
+def cached_response(body: bytes, tag: str) -> Response:
+    # no-cache: clients may keep the body but must revalidate it every time
+    return Response(content=body, media_type="application/json", headers={"ETag": tag, "Cache-Control": "private, no-cache"})
+
+
+def not_modified_response(tag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": "private, no-cache"})
+
+
+async def current_version(session: AsyncSession, company_id: int) -> int:
+    version = known_version(company_id)
+    if version is None:
+        version = await get_catalog_version(session, company_id)
+        remember_version(company_id, version)
+    return version
+
+
+async def catalog_response(request: Request, session: AsyncSession, company_id: int) -> Response:
+    """
+    GET /products/ for a company. Answered from this worker's memory while
+    the catalog is unchanged: 304 when the client's If-None-Match already
+    names the current version, otherwise the cached serialized body. Only a
+    new version is read from the database and serialized, once per worker.
+    """
+    version = await current_version(session, company_id)
+    tag = etag("c", company_id, version)
+    if not_modified(request, tag):
+        return not_modified_response(tag)
+
+    cached = catalog_bodies.get(company_id)
+    if cached is not None and cached[0] == version:
+        return cached_response(cached[1], tag)
+
+    # The version is read before the products, so the products are at least
+    # that new (a replica may still be behind the announced version; the
+    # body is then labelled with the version it really has)
+    version = await get_catalog_version(session, company_id)
+    body = serialize({"products": await get_all_products(session, company_id)})
+    catalog_bodies.set(company_id, (version, body))
+    return cached_response(body, etag("c", company_id, version))
+
+
+async def product_response(request: Request, session: AsyncSession, product_id: int) -> Response | None:
+    """GET /products/{product_id}, cached like catalog_response; None if there is no such product"""
+    cached = product_bodies.get(product_id)
+    if cached is not None:
+        cached_version, company_id, body = cached
+        version = await current_version(session, company_id)
+        tag = etag("p", product_id, version)
+        if not_modified(request, tag):
+            return not_modified_response(tag)
+        if cached_version == version:
+            return cached_response(body, tag)
+
+    loaded = await get_product_with_catalog_version(session, product_id)
+    if loaded is None:
+        return None
+    product, version = loaded
+    remember_version(product.company_id, version)
+
+    body = serialize({"products": product})
+    product_bodies.set(product_id, (version, product.company_id, body))
+    tag = etag("p", product_id, version)
+    if not_modified(request, tag):
+        return not_modified_response(tag)
+    return cached_response(body, tag)
+
+
+def get_cache_stats() -> dict:
+    return {
+        "versions": catalog_versions.stats(),
+        "catalogs": catalog_bodies.stats(),
+        "products": product_bodies.stats(),
+    }
@@ -0,0 +1,189 @@
+import asyncio
+import json
+from typing import Dict
+
+from fastapi import WebSocket
+
+from src.core.config import settings
+from src.services.broker import broker
+
+LINKING_CHANNEL = "chat_linking"
+ORDER_CHANNEL = "chat_order"
+
+
+class ClientConnection:
+    """
+    One connected socket with its own bounded outbound queue. A writer task
+    drains the queue, so a slow client only ever delays itself; once its
+    queue is full the configured policy either drops its oldest pending frame
+    or disconnects it.
+    """
+
+    def __init__(self, websocket: WebSocket, registry: "ConnectionRegistry"):
+        self.websocket = websocket
+        self.registry = registry
+        self.queue: asyncio.Queue[str | None] = asyncio.Queue(maxsize=settings.CHAT_SEND_QUEUE_SIZE)
+        self.closed = False
+        self._writer = asyncio.get_running_loop().create_task(self._write())
+
+    def send(self, message_data: dict):
+        self.offer(json.dumps(message_data))
+
+    def offer(self, message_json: str):
+        if self.closed:
+            return
+
+        try:
+            self.queue.put_nowait(message_json)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        if settings.CHAT_SLOW_CONSUMER_POLICY == "disconnect":
+            self.registry.slow_consumer_disconnects += 1
+            self.close(code=1013)
+            return
+
+        self.queue.get_nowait()
+        self.queue.put_nowait(message_json)
+        self.registry.dropped_frames += 1
+
+    def close(self, code: int | None = None):
+        """Stop the writer; pending frames are flushed first unless a close code is given"""
+        if self.closed:
+            return
+        self.closed = True
+
+        if code is not None:
+            self._writer.cancel()
+            asyncio.get_running_loop().create_task(self._close_socket(code))
+            return
+
+        try:
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            self._writer.cancel()
+
+    async def wait_closed(self):
+        try:
+            await self._writer
+        except (asyncio.CancelledError, Exception):
+            pass
+
+    async def _close_socket(self, code: int):
+        try:
+            await self.websocket.close(code=code, reason="Client too slow")
+        except Exception:
+            pass
+
+    async def _write(self):
+        try:
+            while True:
+                message_json = await self.queue.get()
+                if message_json is None:
+                    return
+                await self.websocket.send_text(message_json)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self.closed = True
+
+
+class ConnectionRegistry:
+    """WebSockets connected to this process: {room_id: {user_id: connection}}"""
+
+    def __init__(self):
+        self.connections: Dict[int, Dict[int, ClientConnection]] = {}
+        self.dropped_frames = 0
+        self.slow_consumer_disconnects = 0
+
+    def connect(self, room_id: int, user_id: int, websocket: WebSocket) -> ClientConnection:
+        client = ClientConnection(websocket, self)
+
+        if room_id not in self.connections:
+            self.connections[room_id] = {}
+        previous = self.connections[room_id].get(user_id)
+        self.connections[room_id][user_id] = client
+
+        if previous is not None:
+            previous.close()
+        return client
+
+    def disconnect(self, room_id: int, user_id: int, client: ClientConnection | None = None):
+        room = self.connections.get(room_id)
+        if room is None:
+            return
+
+        current = room.get(user_id)
+        # A newer socket of the same user may have replaced this one already
+        if current is None or (client is not None and current is not client):
+            return
+
+        current.close()
+        del room[user_id]
+        if not room:
+            del self.connections[room_id]
+
+    async def deliver(self, room_id: int, message_data: dict, exclude_user_id: int = None):
+        if room_id not in self.connections:
+            return
+
+        message_json = json.dumps(message_data)
+        disconnected_users = []
+
+        for user_id, client in self.connections[room_id].items():
+            if client.closed:
+                disconnected_users.append(user_id)
+            elif user_id != exclude_user_id:
+                client.offer(message_json)
+
+        for user_id in disconnected_users:
+            self.disconnect(room_id, user_id)
+
+    def stats(self) -> dict:
+        depths = [client.queue.qsize() for room in self.connections.values() for client in room.values()]
+        return {
+            "rooms": len(self.connections),
+            "connections": len(depths),
+            "queued_frames": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "queue_size": settings.CHAT_SEND_QUEUE_SIZE,
+            "dropped_frames": self.dropped_frames,
+            "slow_consumer_disconnects": self.slow_consumer_disconnects,
+        }
+
+
+# Linking chats are keyed by linking_id, order chats by order_id
+linking_connections = ConnectionRegistry()
+order_connections = ConnectionRegistry()
+
+
+async def publish(channel: str, room_id: int, message_data: dict, exclude_user_id: int = None):
+    await broker.publish(channel, {
+        "room_id": room_id,
+        "exclude_user_id": exclude_user_id,
+        "message": message_data,
+    })
+
+
+def _deliver_to(registry: ConnectionRegistry):
+    async def handler(event: dict):
+        await registry.deliver(event["room_id"], event["message"], event.get("exclude_user_id"))
+    return handler
+
+
+async def start_chat_hub():
+    broker.subscribe(LINKING_CHANNEL, _deliver_to(linking_connections))
+    broker.subscribe(ORDER_CHANNEL, _deliver_to(order_connections))
+    await broker.start()
+
+
+async def stop_chat_hub():
+    await broker.stop()
+
+
+def get_chat_stats() -> dict:
+    return {
+        "linking": linking_connections.stats(),
+        "order": order_connections.stats(),
+    }
@@ -0,0 +1,134 @@
+import asyncio
+import logging
+
+from sqlalchemy import insert
+
+from src.core.config import settings
+from src.core.database import async_engine
+from src.models.messages import Messages, MessageType
+
+logger = logging.getLogger("scp.message_writer")
+
+
+class MessageWriter:
+    """
+    Write-behind persistence for chat messages. Messages from every socket
+    on this node are queued and inserted together with one multi-row
+    INSERT ... RETURNING per batch, instead of a commit and refresh per
+    message. Callers await write() and get the stored row back, so acks
+    still carry the real message_id.
+    """
+
+    def __init__(self, batch_size: int, max_delay: float, queue_size: int):
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self._queue: asyncio.Queue[tuple[dict, asyncio.Future] | None] = asyncio.Queue(maxsize=queue_size)
+        self._task: asyncio.Task | None = None
+        self._stopping = False
+        self.batches = 0
+        self.messages = 0
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        # The stop marker queues up behind every pending write; _run flushes
+        # all of them, including a batch it is still holding, before it exits
+        if not self._task.done():
+            await self._queue.put(None)
+        await self._task
+        self._task = None
+
+        # Persist writes queued after the stop marker
+        while not self._queue.empty():
+            await self._flush(self._drain([]))
+
+    async def write(
+        self,
+        chat_id: int,
+        sender_id: int,
+        body: str,
+        message_type: MessageType = MessageType.text
+    ) -> Messages:
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put(({"chat_id": chat_id, "sender_id": sender_id, "body": body, "type": message_type}, future))
+        return await future
+
+    def _drain(self, batch: list) -> list:
+        while len(batch) < self.batch_size:
+            try:
+                item = self._queue.get_nowait()
+            except asyncio.QueueEmpty:
+                break
+            if item is None:
+                self._stopping = True
+                break
+            batch.append(item)
+        return batch
+
+    async def _run(self):
+        self._stopping = False
+        while not self._stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = self._drain([item])
+
+            # Give concurrent writers a few milliseconds to join the batch
+            if not self._stopping and len(batch) < self.batch_size and self.max_delay > 0:
+                await asyncio.sleep(self.max_delay)
+                self._drain(batch)
+
+            await self._flush(batch)
+
+    async def _flush(self, batch: list):
+        try:
+            rows = await self._insert([values for values, _ in batch])
+        except Exception as e:
+            if len(batch) == 1:
+                self._resolve(batch[0][1], exception=e)
+                return
+
+            # Retry one by one so a single bad row (e.g. a deleted chat)
+            # doesn't fail everyone else's message
+            logger.warning("Batched message insert failed, retrying individually: %s", e)
+            for item in batch:
+                await self._flush([item])
+            return
+
+        self.batches += 1
+        self.messages += len(rows)
+        for (_, future), row in zip(batch, rows):
+            self._resolve(future, result=Messages(**row._mapping))
+
+    async def _insert(self, values: list[dict]) -> list:
+        statement = insert(Messages).returning(*Messages.__table__.c, sort_by_parameter_order=True)
+        async with async_engine.begin() as conn:
+            return (await conn.execute(statement, values)).all()
+
+    @staticmethod
+    def _resolve(future: asyncio.Future, result=None, exception: Exception | None = None):
+        if future.done():
+            return
+        if exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self._queue.qsize(),
+            "batches": self.batches,
+            "messages": self.messages,
+            "avg_batch_size": round(self.messages / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+message_writer = MessageWriter(
+    batch_size=settings.CHAT_WRITE_BATCH_SIZE,
+    max_delay=settings.CHAT_WRITE_MAX_DELAY_MS / 1000,
+    queue_size=settings.CHAT_WRITE_QUEUE_SIZE,
+)
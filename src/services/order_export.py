@@ -0,0 +1,177 @@
+import asyncio
+import csv
+import io
+import json
+import logging
+from datetime import datetime, timezone
+
+from src.core.config import settings
+from src.core.database import async_session_maker
+from src.cruds.exports import save_export_progress
+from src.cruds.order import get_order_feed
+from src.models.export_jobs import ExportFormat, ExportJobs, ExportStatus
+from src.models.orders import OrderStatus
+from src.services.s3_service import s3_service
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet exports are optional
+    pa = pq = None
+
+logger = logging.getLogger("scp.order_export")
+
+PARQUET_AVAILABLE = pa is not None
+
+COLUMNS = [
+    "order_id", "linking_id", "order_status", "order_total_price", "order_created_at", "order_updated_at",
+    "product_id", "product_name", "product_description", "product_picture_url", "quantity", "price", "unit",
+]
+
+CONTENT_TYPES = {
+    ExportFormat.csv: "text/csv",
+    ExportFormat.parquet: "application/vnd.apache.parquet",
+}
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, OrderStatus):
+        return value.value
+    if isinstance(value, list):
+        return json.dumps(value)
+    return value
+
+
+def encode_csv(rows: list[dict]) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMNS)
+    for row in rows:
+        writer.writerow([_csv_value(row[column]) for column in COLUMNS])
+    return buffer.getvalue().encode()
+
+
+def encode_parquet(rows: list[dict]) -> bytes:
+    schema = pa.schema([
+        ("order_id", pa.int64()),
+        ("linking_id", pa.int64()),
+        ("order_status", pa.string()),
+        ("order_total_price", pa.int64()),
+        ("order_created_at", pa.timestamp("us", tz="UTC")),
+        ("order_updated_at", pa.timestamp("us", tz="UTC")),
+        ("product_id", pa.int64()),
+        ("product_name", pa.string()),
+        ("product_description", pa.string()),
+        ("product_picture_url", pa.list_(pa.string())),
+        ("quantity", pa.int64()),
+        ("price", pa.int64()),
+        ("unit", pa.string()),
+    ])
+    table = pa.Table.from_pylist(
+        [{**row, "order_status": OrderStatus(row["order_status"]).value} for row in rows],
+        schema=schema,
+    )
+    buffer = io.BytesIO()
+    pq.write_table(table, buffer)
+    return buffer.getvalue()
+
+
+def _feed_filters(filters: dict) -> dict:
+    decoded = dict(filters)
+    for key in ("created_from", "created_to"):
+        if decoded.get(key):
+            decoded[key] = datetime.fromisoformat(decoded[key])
+    if decoded.get("status"):
+        decoded["status"] = OrderStatus(decoded["status"])
+    return decoded
+
+
+async def _keep_alive(export_id: int, attempt: int, lost: asyncio.Event):
+    """Refresh the job's heartbeat while a chunk is queried or uploaded"""
+    while True:
+        await asyncio.sleep(settings.EXPORT_STALE_SECONDS / 3)
+        try:
+            async with async_session_maker() as session:
+                if not await save_export_progress(session, export_id, attempt):
+                    lost.set()
+                    return
+        except Exception:
+            logger.exception("Export %s heartbeat failed", export_id)
+
+
+async def run_export_job(export_id: int, attempt: int):
+    """
+    Export the job's order lines to S3 in files of EXPORT_CHUNK_ROWS rows.
+
+    Chunks are consecutive pages of the order feed sorted by order_id, so
+    the feed cursor saved after each upload is enough to resume: a restarted
+    job reads on from there, and a chunk that was uploaded but not recorded
+    is simply written again under the same key.
+
+    attempt is the claim from claim_export_job. The heartbeat is refreshed
+    in the background, and once another worker has claimed the job this one
+    stops without saving anything more.
+    """
+    lost = asyncio.Event()
+    heartbeat = asyncio.get_running_loop().create_task(_keep_alive(export_id, attempt, lost))
+    try:
+        await _export(export_id, attempt, lost)
+    finally:
+        heartbeat.cancel()
+
+
+async def _export(export_id: int, attempt: int, lost: asyncio.Event):
+    async with async_session_maker() as session:
+        job = await session.get(ExportJobs, export_id)
+        if job.format == ExportFormat.parquet and not PARQUET_AVAILABLE:
+            await _fail(export_id, attempt, "Parquet export needs pyarrow installed on the export worker")
+            return
+
+        encode = encode_parquet if job.format == ExportFormat.parquet else encode_csv
+        filters = _feed_filters(job.filters)
+        files, cursor, row_count = list(job.files), job.cursor, job.row_count
+        try:
+            while not lost.is_set():
+                rows, next_cursor = await get_order_feed(
+                    job.company_id,
+                    session,
+                    limit=settings.EXPORT_CHUNK_ROWS,
+                    cursor=cursor,
+                    sort="order_id",
+                    **filters,
+                )
+
+                # An empty export still gets one (header-only) file
+                if rows or not files:
+                    key = f"exports/{job.export_id}/orders-{job.export_id}-{len(files) + 1:05d}.{job.format.value}"
+                    data = await asyncio.to_thread(encode, rows)
+                    await asyncio.to_thread(s3_service.upload_bytes, key, data, CONTENT_TYPES[job.format])
+                    files = [*files, key]
+                    row_count += len(rows)
+
+                progress = {"files": files, "row_count": row_count}
+                if next_cursor is None:
+                    progress.update(status=ExportStatus.completed, completed_at=datetime.now(timezone.utc))
+                else:
+                    progress["cursor"] = cursor = next_cursor
+                if not await save_export_progress(session, export_id, attempt, **progress):
+                    break
+
+                if next_cursor is None:
+                    logger.info("Export %s completed: %s rows in %s files", export_id, row_count, len(files))
+                    return
+
+            logger.warning("Export %s was claimed by another worker, stopping", export_id)
+        except Exception as e:
+            logger.exception("Export %s failed", export_id)
+            await session.rollback()
+            await _fail(export_id, attempt, f"{type(e).__name__}: {e}")
+
+
+async def _fail(export_id: int, attempt: int, error: str):
+    async with async_session_maker() as session:
+        await save_export_progress(session, export_id, attempt, status=ExportStatus.failed, error=error[:1000])
@@ -0,0 +1,174 @@
+from dataclasses import dataclass, field
+
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.core.cache import TTLCache
+from src.core.config import settings
+from src.cruds.catalog import get_products_with_catalog_versions
+from src.cruds.stock import get_available_stock
+from src.models.products import Products
+from src.services.catalog_cache import current_version, remember_version
+
+# product_id -> (catalog version, PriceEntry). An entry is used only while
+# its company's catalog is still at that version, so price changes show up
+# as soon as the version bump is announced.
+price_entries = TTLCache(maxsize=settings.CATALOG_CACHE_MAX_ENTRIES * 10, ttl=24 * 3600)
+
+
+@dataclass(frozen=True)
+class PriceEntry:
+    """What pricing needs to know about a product"""
+    product_id: int
+    company_id: int
+    name: str
+    unit: str
+    retail_price: int
+    threshold: int | None
+    bulk_price: int | None
+    minimum_order: int
+    is_available: bool
+
+    @classmethod
+    def from_product(cls, product: Products) -> "PriceEntry":
+        return cls(
+            product_id=product.product_id,
+            company_id=product.company_id,
+            name=product.name,
+            unit=product.unit,
+            retail_price=product.retail_price,
+            threshold=product.threshold,
+            bulk_price=product.bulk_price,
+            minimum_order=product.minimum_order,
+            is_available=product.is_available,
+        )
+
+    def is_bulk(self, quantity: int) -> bool:
+        # The bulk price applies from threshold units on, if the product has one
+        return self.threshold is not None and self.bulk_price is not None and quantity >= self.threshold
+
+    def unit_price(self, quantity: int) -> int:
+        return self.bulk_price if self.is_bulk(quantity) else self.retail_price
+
+
+@dataclass(frozen=True)
+class QuoteLine:
+    product_id: int
+    quantity: int
+    name: str | None = None
+    unit: str | None = None
+    unit_price: int | None = None
+    line_price: int | None = None
+    bulk: bool = False
+    available_stock: int | None = None
+    error: str | None = None
+
+
+@dataclass(frozen=True)
+class Quote:
+    lines: list[QuoteLine] = field(default_factory=list)
+    # Sum of the lines that could be priced
+    total_price: int = 0
+
+    @property
+    def errors(self) -> list[str]:
+        return [line.error for line in self.lines if line.error]
+
+    @property
+    def orderable(self) -> bool:
+        return not self.errors
+
+
+def merge_quantities(items) -> dict[int, int]:
+    """{product_id: quantity} of order lines; repeated lines for a product are added up"""
+    quantities: dict[int, int] = {}
+    for item in items:
+        quantities[item.product_id] = quantities.get(item.product_id, 0) + item.quantity
+    return quantities
+
+
+def price_cart(
+    quantities: dict[int, int],
+    entries: dict[int, PriceEntry],
+    supplier_company_id: int | None = None,
+    available: dict[int, int] | None = None,
+) -> Quote:
+    """
+    Price a cart in one pass. Every line is priced and checked: the product
+    must exist (and belong to supplier_company_id, if given), be available,
+    and be ordered in a positive quantity of at least its minimum_order and,
+    when available stock is passed in, at most that. A line failing a check
+    carries the reason in error.
+    """
+    lines: list[QuoteLine] = []
+    total_price = 0
+    for product_id, quantity in quantities.items():
+        entry = entries.get(product_id)
+        if entry is None or (supplier_company_id is not None and entry.company_id != supplier_company_id):
+            lines.append(QuoteLine(product_id=product_id, quantity=quantity, error=f"Product {product_id} not found"))
+            continue
+
+        unit_price = entry.unit_price(quantity)
+        stock = None if available is None else available.get(product_id, 0)
+
+        error = None
+        if not entry.is_available:
+            error = f"Product {entry.name} is not available"
+        elif quantity <= 0:
+            error = f"Quantity for product {product_id} must be positive"
+        elif quantity < entry.minimum_order:
+            error = f"Product {entry.name} must be ordered in at least {entry.minimum_order} {entry.unit}"
+        elif stock is not None and quantity > stock:
+            error = f"Product {product_id} does not have enough stock"
+
+        lines.append(QuoteLine(
+            product_id=product_id,
+            quantity=quantity,
+            name=entry.name,
+            unit=entry.unit,
+            unit_price=unit_price,
+            line_price=unit_price * quantity,
+            bulk=entry.is_bulk(quantity),
+            available_stock=stock,
+            error=error,
+        ))
+        total_price += unit_price * quantity
+
+    return Quote(lines=lines, total_price=total_price)
+
+
+async def load_price_entries(session: AsyncSession, product_ids) -> dict[int, PriceEntry]:
+    """
+    PriceEntries of the given products. Entries whose catalog version is
+    still current come from this worker's memory; the rest are read in one
+    query, together with their catalog version.
+    """
+    entries: dict[int, PriceEntry] = {}
+    missing = []
+    for product_id in product_ids:
+        cached = price_entries.get(product_id)
+        if cached is not None and cached[0] == await current_version(session, cached[1].company_id):
+            entries[product_id] = cached[1]
+        else:
+            missing.append(product_id)
+
+    if missing:
+        for product, version in await get_products_with_catalog_versions(session, missing):
+            remember_version(product.company_id, version)
+            entry = PriceEntry.from_product(product)
+            price_entries.set(product.product_id, (version, entry))
+            entries[product.product_id] = entry
+
+    return entries
+
+
+async def quote_cart(session: AsyncSession, items, supplier_company_id: int) -> Quote:
+    """Price a cart of one supplier's products, with stock as it is right now"""
+    quantities = merge_quantities(items)
+    entries = await load_price_entries(session, list(quantities))
+    # Stock changes with every order, without a new catalog version
+    available = await get_available_stock(session, list(quantities))
+    return price_cart(quantities, entries, supplier_company_id, available)
+
+
+def get_pricing_stats() -> dict:
+    return price_entries.stats()
@@ -32,6 +32,20 @@ class S3Service:
 
         return url, finalurl
     
+    def upload_bytes(self, key: str, data: bytes, content_type: str = "application/octet-stream"):
+        self.s3.put_object(Bucket=self.bucket_name, Key=key, Body=data, ContentType=content_type)
+
+    def create_download_url(self, key: str, expires_in: int = 3600) -> str:
+        return self.s3.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket_name,
+                "Key": key,
+                "ResponseContentDisposition": f'attachment; filename="{key.rsplit("/", 1)[-1]}"',
+            },
+            ExpiresIn=expires_in
+        )
+
     def delete_file_by_url(self, url: str):
         try:
             url_splitted = url.split("/")
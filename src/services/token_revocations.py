@@ -0,0 +1,104 @@
+import asyncio
+import logging
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from src.core.config import settings
+from src.core.database import async_session_maker
+from src.core.jwt import deny_token, deny_user, prune_denied_tokens
+from src.cruds.revocations import delete_expired_revocations, get_revocations
+from src.services.broker import broker
+
+logger = logging.getLogger("scp.token_revocations")
+
+REVOCATION_CHANNEL = "token_revocations"
+
+_pending_publishes: set[asyncio.Task] = set()
+
+
+def apply_revocation(revocation: dict):
+    if "digest" in revocation:
+        deny_token(bytes.fromhex(revocation["digest"]), revocation["expires_at"])
+    else:
+        deny_user(revocation["user_id"], revocation.get("email"))
+
+
+async def _on_revocation(revocation: dict):
+    apply_revocation(revocation)
+
+
+@event.listens_for(Session, "after_commit")
+def _announce_revocations(session):
+    revocations = session.info.pop("token_revocations", None)
+    if not revocations:
+        return
+    for revocation in revocations:
+        # This worker rejects the token right away, the others once they hear
+        apply_revocation(revocation)
+        task = asyncio.get_running_loop().create_task(broker.publish(REVOCATION_CHANNEL, revocation))
+        _pending_publishes.add(task)
+        task.add_done_callback(_pending_publishes.discard)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_revocations(session):
+    session.info.pop("token_revocations", None)
+
+
+async def load_revocations():
+    """
+    Add every revocation stored in the database to this worker's denylist.
+    Only adds: a token or user revoked here is never let back in, so an
+    announcement that arrives while this runs can't be undone by it.
+    """
+    async with async_session_maker() as session:
+        await delete_expired_revocations(session)
+        await session.commit()
+        tokens, users = await get_revocations(session)
+
+    for digest, expires_at in tokens:
+        deny_token(bytes.fromhex(digest), expires_at.timestamp())
+    for user_id, email in users:
+        deny_user(user_id, email)
+    prune_denied_tokens()
+
+
+class RevocationSync:
+    """
+    Keeps this worker's denylist complete: loads the stored revocations at
+    startup and again every JWT_REVOCATION_RELOAD_SECONDS, which also
+    covers announcements missed while the broker was reconnecting.
+    """
+
+    def __init__(self):
+        self._task: asyncio.Task | None = None
+
+    def subscribe(self):
+        """Listen for revocations made by other workers; call before the broker starts"""
+        broker.subscribe(REVOCATION_CHANNEL, _on_revocation)
+
+    async def start(self):
+        await load_revocations()
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(settings.JWT_REVOCATION_RELOAD_SECONDS)
+            try:
+                await load_revocations()
+            except Exception:
+                logger.exception("Reloading token revocations failed")
+
+
+revocation_sync = RevocationSync()
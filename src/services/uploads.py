@@ -0,0 +1,158 @@
+import asyncio
+import codecs
+import csv
+import json
+import tempfile
+from typing import AsyncIterator
+
+try:
+    import openpyxl
+except ImportError:  # XLSX uploads are optional
+    openpyxl = None
+
+NDJSON_TYPES = {"application/x-ndjson", "application/ndjson", "application/jsonl", "application/json"}
+CSV_TYPES = {"text/csv", "application/csv"}
+XLSX_TYPES = {"application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"}
+
+XLSX_AVAILABLE = openpyxl is not None
+
+# XLSX is a zip archive and can't be read front to back; uploads are spooled
+# to disk past this size
+_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+class BulkImportError(ValueError):
+    """The upload as a whole can't be read (bad encoding, too many rows, no CSV header)"""
+
+
+def upload_type(content_type: str, filename: str | None = None) -> str:
+    """Media type of an upload, without parameters; a file's extension decides for generic types"""
+    content_type = content_type.split(";")[0].strip().lower()
+    if filename and content_type in ("", "application/octet-stream", "text/plain"):
+        extension = filename.rsplit(".", 1)[-1].lower()
+        return {
+            "csv": "text/csv",
+            "ndjson": "application/x-ndjson",
+            "jsonl": "application/x-ndjson",
+            "xlsx": next(iter(XLSX_TYPES)),
+        }.get(extension, content_type)
+    return content_type
+
+
+async def _lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    buffer = ""
+    try:
+        async for chunk in chunks:
+            buffer += decoder.decode(chunk)
+            *lines, buffer = buffer.split("\n")
+            for line in lines:
+                yield line.rstrip("\r")
+        buffer += decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        raise BulkImportError("Body is not valid UTF-8")
+    if buffer.strip():
+        yield buffer.rstrip("\r")
+
+
+async def ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict | str]:
+    async for line in _lines(chunks):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            yield f"Invalid JSON: {e.msg}"
+            continue
+        yield record if isinstance(record, dict) else "Each line must be a JSON object"
+
+
+async def csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[dict | str]:
+    header: list[str] | None = None
+    pending = ""
+    async for line in _lines(chunks):
+        # A quoted field may span lines; the record is complete once its quotes pair up
+        pending = f"{pending}\n{line}" if pending else line
+        if pending.count('"') % 2:
+            continue
+        record, pending = pending, ""
+        if not record.strip():
+            continue
+
+        values = next(csv.reader([record]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        yield {name: value.strip() for name, value in zip(header, values) if value.strip()}
+
+    if pending:
+        yield "Unterminated quoted field"
+    if header is None:
+        raise BulkImportError("CSV body needs a header row")
+
+
+def _xlsx_value(value):
+    if isinstance(value, str):
+        return value.strip() or None
+    if isinstance(value, float) and value.is_integer():
+        # Spreadsheets store every number as a float
+        return int(value)
+    return value
+
+
+def _read_xlsx(file, max_rows: int) -> list[dict]:
+    try:
+        workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    except Exception:
+        raise BulkImportError("Body is not a valid XLSX workbook")
+
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            raise BulkImportError("The first sheet needs a header row")
+        header = [str(name).strip() if name is not None else "" for name in header]
+
+        records = []
+        for values in rows:
+            record = {
+                name: value
+                for name, value in zip(header, map(_xlsx_value, values))
+                if name and value is not None
+            }
+            if not record:
+                continue
+            if len(records) >= max_rows:
+                raise BulkImportError(f"At most {max_rows} rows per upload")
+            records.append(record)
+        return records
+    finally:
+        workbook.close()
+
+
+async def xlsx_records(chunks: AsyncIterator[bytes], max_rows: int) -> AsyncIterator[dict | str]:
+    """Rows of the workbook's first sheet, keyed by its header row; needs openpyxl"""
+    with tempfile.SpooledTemporaryFile(max_size=_SPOOL_BYTES) as file:
+        async for chunk in chunks:
+            file.write(chunk)
+        file.seek(0)
+        # openpyxl parses in Python; keep it off the event loop
+        records = await asyncio.to_thread(_read_xlsx, file, max_rows)
+
+    for record in records:
+        yield record
+
+
+def records(chunks: AsyncIterator[bytes], content_type: str, max_rows: int) -> AsyncIterator[dict | str]:
+    """
+    The upload's rows as dicts, parsed as the body arrives (XLSX only once
+    it has been received). A row that can't be parsed comes through as the
+    error message instead, so it can be reported under its row number.
+    """
+    if content_type in XLSX_TYPES:
+        if not XLSX_AVAILABLE:
+            raise BulkImportError("XLSX uploads need openpyxl installed on the server")
+        return xlsx_records(chunks, max_rows)
+    if content_type in CSV_TYPES:
+        return csv_records(chunks)
+    return ndjson_records(chunks)